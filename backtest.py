@@ -0,0 +1,298 @@
+# backtest.py
+
+"""
+Rejeu hors ligne (backtest) des règles STATIQUES et INTER.
+
+Le flux de jeux est rejoué à travers la vraie logique de CardPredictor
+(collecte -> should_predict -> make_prediction -> vérification), dans le même
+ordre que TelegramHandlers.handle_update, mais en temps simulé : aucun appel
+Telegram, aucune lecture ni écriture d'état (CardPredictor(persist=False)).
+Le reset quotidien de 00h59 WAT suit la date des messages, ou un changement
+de jour déduit du retour à zéro des numéros de jeu.
+
+Sources acceptées :
+- journal de messages : texte brut (un message par ligne), JSONL
+  ({"text", "date"?, "edited"?}) ou export JSON de Telegram ({"messages": [...]}) ;
+- dump `sequential_history.json`, `inter_data.bin` ou `inter_data.json` : seule la première
+  carte de chaque jeu est connue, la vérification ne voit donc que l'offset 0
+  (les gains ✅1/✅2 comptent comme pertes : taux de gain minorant).
+
+Usage : python backtest.py <fichier> [--rules smart_rules.json] [--format n] [--output rapport.json]
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Union
+
+import pytz
+
+from card_predictor import CardPredictor, SYMBOL_MAP
+from cards import as_card_id
+from game_message import GameMessageParser, ParsedGameMessage, GAME_NUMBER_N
+from inter_stats import InterColumns
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+WAT = pytz.timezone('Africa/Lagos')
+# Horloge simulée quand les messages ne sont pas datés (après le reset de 00h59)
+SIMULATED_START = WAT.localize(datetime(2000, 1, 1, 1, 0))
+# Recul du numéro de jeu au-delà duquel on considère qu'une nouvelle journée a commencé
+DAY_WRAP_THRESHOLD = 10
+
+_OFFSET_BY_SYMBOL = {symbol: offset for offset, symbol in SYMBOL_MAP.items()}
+
+
+class ReplayEvent(NamedTuple):
+    """Un message du canal source à rejouer."""
+    message: Union[str, ParsedGameMessage]
+    edited: bool = False
+    date: Optional[datetime] = None
+
+
+# --- Chargement des sources ---
+
+def _parse_date(value: Any) -> Optional[datetime]:
+    if not value: return None
+    if isinstance(value, float):
+        # Colonne epoch d'InterColumns (NaN = date absente)
+        return datetime.fromtimestamp(value, WAT) if value == value else None
+    try:
+        date = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    return WAT.localize(date) if date.tzinfo is None else date
+
+
+def _export_text(text: Any) -> str:
+    """Texte d'un message d'export Telegram (chaîne ou liste d'entités)."""
+    if isinstance(text, list):
+        return ''.join(part if isinstance(part, str) else part.get('text', '') for part in text)
+    return text or ''
+
+
+def _first_card_message(game_number: int, card: int) -> ParsedGameMessage:
+    """
+    Message final reconstruit à partir de la seule première carte d'un jeu.
+    Le second groupe (la même carte) ne sert qu'à rendre le résultat structurellement
+    final (>= 3 cartes) ; la vérification ne lit que le premier groupe.
+    """
+    return ParsedGameMessage(text='', game_number=game_number, groups=((card,), (card, card)),
+                             has_completion=True, has_pending=False, has_final_tag=True)
+
+
+def events_from_history(first_cards: Dict[int, Any], dates: Optional[Dict[int, Any]] = None) -> List[ReplayEvent]:
+    """Événements synthétiques {numéro: première carte} dans l'ordre des numéros."""
+    events = []
+    for game_number in sorted(first_cards):
+        card = as_card_id(first_cards[game_number])
+        if card is None: continue
+        date = _parse_date((dates or {}).get(game_number))
+        events.append(ReplayEvent(_first_card_message(game_number, card), date=date))
+    return events
+
+
+def load_events(path: str) -> List[ReplayEvent]:
+    """Charge un journal de messages ou un dump d'état et renvoie les événements à rejouer."""
+    # Fichier colonnaire inter_data.bin : lu directement depuis ses colonnes
+    if path.endswith('.bin'):
+        columns = InterColumns.read(path)
+        games = columns['numero_declencheur']
+        return events_from_history(dict(zip(games, columns['declencheur'])), dict(zip(games, columns['epoch'])))
+
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = f.read()
+
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        data = None
+
+    # Export Telegram : les messages sont dans leur état final
+    if isinstance(data, dict) and isinstance(data.get('messages'), list):
+        return [ReplayEvent(_export_text(m.get('text')), date=_parse_date(m.get('date')))
+                for m in data['messages'] if m.get('type', 'message') == 'message' and m.get('text')]
+
+    # Dump inter_data.json : la carte N-2 de chaque entrée est la première carte du jeu déclencheur
+    if isinstance(data, list):
+        first_cards, dates = {}, {}
+        for entry in data:
+            if not isinstance(entry, dict) or entry.get('numero_declencheur') is None: continue
+            game = int(entry['numero_declencheur'])
+            first_cards[game] = entry.get('declencheur')
+            dates[game] = entry.get('date')
+        return events_from_history(first_cards, dates)
+
+    # Dump sequential_history.json : {numéro: {'carte', 'date'}}
+    if isinstance(data, dict):
+        first_cards, dates = {}, {}
+        for key, value in data.items():
+            if not str(key).isdigit() or not isinstance(value, dict): continue
+            first_cards[int(key)] = value.get('carte')
+            dates[int(key)] = value.get('date')
+        return events_from_history(first_cards, dates)
+
+    # Journal texte : JSONL ou un message brut par ligne
+    events = []
+    for line in raw.splitlines():
+        line = line.strip()
+        if not line: continue
+        if line.startswith('{'):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict):
+                events.append(ReplayEvent(record.get('text') or '', bool(record.get('edited')),
+                                          _parse_date(record.get('date'))))
+                continue
+        events.append(ReplayEvent(line))
+    return events
+
+
+# --- Moteur ---
+
+class Backtest:
+    """Rejoue des événements à travers un CardPredictor en mémoire et compte les résultats."""
+
+    def __init__(self, smart_rules: Optional[List[Dict]] = None, game_number_format: str = 'trb'):
+        self.predictor = CardPredictor(persist=False)
+        if game_number_format == 'n':
+            self.predictor.parser = GameMessageParser(GAME_NUMBER_N)
+        if smart_rules:
+            self.predictor.smart_rules = smart_rules
+            self.predictor.is_inter_mode_active = True
+
+        self.clock = SIMULATED_START
+        self._last_game = None
+        self.games = 0
+        self.results: Dict[str, Dict[str, int]] = {
+            source: {'predictions': 0, 'won': 0, 'lost': 0, **{f'won_{offset}': 0 for offset in SYMBOL_MAP}}
+            for source in ('INTER', 'STATIC')
+        }
+        self.switches: List[Dict[str, Any]] = []
+
+    def run(self, events: Iterable[ReplayEvent]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        for event in events:
+            self.step(event)
+        return self.report(time.perf_counter() - started)
+
+    def step(self, event: ReplayEvent) -> None:
+        predictor = self.predictor
+        parsed = predictor.parse(event.message)
+        game_num = parsed.game_number
+        if not game_num: return
+
+        if self._advance_clock(game_num, event.date):
+            predictor.check_and_reset_predictions(self.clock)
+        inter_before = predictor.is_inter_mode_active
+
+        # Même enchaînement que TelegramHandlers.handle_update
+        if not event.edited:
+            if game_num in predictor.processed_messages: return
+            self.games += 1
+            predictor.collect_inter_data(game_num, parsed)
+            prediction_data = predictor.should_predict(parsed)
+            if prediction_data:
+                predicted_suit, is_inter = prediction_data
+                if predictor.make_prediction(game_num, predicted_suit, is_inter):
+                    self.results['INTER' if is_inter else 'STATIC']['predictions'] += 1
+            self._count(predictor.verify_prediction(parsed))
+            predictor.processed_messages.add(game_num)
+        else:
+            if game_num not in predictor.collected_games:
+                predictor.collect_inter_data(game_num, parsed)
+            if parsed.has_completion:
+                self._count(predictor.verify_prediction_from_edit(parsed))
+
+        if predictor.is_inter_mode_active != inter_before:
+            self.switches.append({
+                'game': game_num,
+                'date': self.clock.isoformat(),
+                'mode': 'INTER' if predictor.is_inter_mode_active else 'STATIC',
+                'rules': len(predictor.smart_rules),
+            })
+
+    def _advance_clock(self, game_num: int, date: Optional[datetime]) -> bool:
+        """Avance l'horloge simulée ; True si elle a changé (reset quotidien à vérifier)."""
+        first = self._last_game is None
+        previous = self.clock
+        if date is not None:
+            self.clock = date
+        elif not first and game_num < self._last_game - DAY_WRAP_THRESHOLD:
+            # Les numéros repartent de 1 chaque jour : journée suivante, après le reset
+            self.clock += timedelta(days=1)
+        self._last_game = game_num
+        return first or self.clock != previous
+
+    def _count(self, result: Optional[Dict[str, Any]]) -> None:
+        if not result or result.get('type') != 'edit_message': return
+        prediction = self.predictor.predictions.get(int(result['predicted_game']))
+        if prediction is None: return
+        stats = self.results['INTER' if prediction.get('is_inter') else 'STATIC']
+        status = prediction['status']
+        stats[status] = stats.get(status, 0) + 1
+        if status == 'won':
+            offset = _OFFSET_BY_SYMBOL.get(result['new_message'].rsplit(':', 1)[-1])
+            if offset is not None:
+                stats[f'won_{offset}'] += 1
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        def summary(stats: Dict[str, int]) -> Dict[str, Any]:
+            settled = stats['won'] + stats['lost']
+            return {**stats, 'pending': stats['predictions'] - settled,
+                    'win_rate': round(stats['won'] / settled, 4) if settled else None}
+
+        total = {key: sum(stats[key] for stats in self.results.values()) for key in self.results['STATIC']}
+        return {
+            'games': self.games,
+            'elapsed_s': round(elapsed, 3),
+            'games_per_s': round(self.games / elapsed, 1) if elapsed else None,
+            'total': summary(total),
+            'by_source': {source: summary(stats) for source, stats in self.results.items()},
+            'switch_count': len(self.switches),
+            'switches': self.switches,
+            'final_mode': 'INTER' if self.predictor.is_inter_mode_active else 'STATIC',
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Backtest hors ligne des règles STATIQUES et INTER")
+    parser.add_argument('source', help="Journal de messages, export Telegram, sequential_history.json, inter_data.bin ou inter_data.json")
+    parser.add_argument('--rules', help="smart_rules.json de départ (mode INTER actif au début)")
+    parser.add_argument('--format', choices=('trb', 'n'), default='trb',
+                        help="Numéros de jeu : '#T/#R/🔵' (défaut) ou '#N123.'")
+    parser.add_argument('--output', help="Fichier JSON du rapport (sinon sortie standard)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger('card_predictor').setLevel(logging.WARNING)
+
+    smart_rules = None
+    if args.rules:
+        with open(args.rules, 'r', encoding='utf-8') as f:
+            smart_rules = json.load(f)
+
+    events = load_events(args.source)
+    report = Backtest(smart_rules, args.format).run(events)
+
+    total = report['total']
+    print(f"{report['games']} jeux en {report['elapsed_s']}s : {total['predictions']} prédictions, "
+          f"✅0={total['won_0']} ✅1={total['won_1']} ✅2={total['won_2']} ❌={total['lost']} "
+          f"(taux {total['win_rate']}), {report['switch_count']} bascule(s) INTER/STATIQUE", file=sys.stderr)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return report
+
+
+if __name__ == '__main__':
+    main()
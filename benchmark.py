@@ -0,0 +1,228 @@
+# benchmark.py
+
+"""
+Banc de mesure de bout en bout : débit et latence par update de
+`TelegramHandlers.handle_update` sur un flux synthétique du canal source.
+
+Le flux imite le canal réel : un post par jeu (⏰, numéros '#N123.',
+'#T'/'#R' ou '🔵123🔵', groupes de cartes entre parenthèses) suivi de son
+édition finalisée (✅ ou 🔰). Les envois Telegram sont remplacés par un
+client factice qui enregistre les appels ; l'état est écrit dans un
+répertoire temporaire par taille d'historique.
+
+Pour chaque taille d'historique INTER (par défaut 1k, 10k, 100k jeux), le
+résultat donne le débit (updates/s) et les latences p50/p95/p99 en JSON,
+pour suivre les régressions d'une version à l'autre.
+
+Usage : python benchmark.py [--sizes 1000,10000,100000] [--games 2000] [--output bench.json]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Les tailles d'historique demandées ne doivent pas être tronquées par la fenêtre INTER
+os.environ.setdefault('INTER_WINDOW_GAMES', '0')
+
+from cards import CARD_COUNT, SUITS, card_text  # noqa: E402
+import card_predictor  # noqa: E402
+from handlers import TelegramHandlers  # noqa: E402
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_GAMES = 2000
+SOURCE_CHANNEL_ID = -1001000000001
+PREDICTION_CHANNEL_ID = -1001000000002
+BENCH_TOKEN = '123456:BENCHMARK'
+
+
+class RecordingTelegram:
+    """Remplaçant de TelegramClient : aucune E/S réseau, chaque appel est compté."""
+
+    def __init__(self):
+        self.calls: Dict[str, int] = {}
+        self._next_message_id = 1
+        self.pending = 0
+
+    def _result(self, method: str, payload: Dict[str, Any]) -> Any:
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if method == 'sendMessage':
+            self._next_message_id += 1
+            return {'message_id': self._next_message_id, 'chat': {'id': payload.get('chat_id')}}
+        return True
+
+    def call(self, method: str, payload: Dict[str, Any]) -> Any:
+        return self._result(method, payload)
+
+    def submit(self, method: str, payload: Dict[str, Any],
+               callback: Optional[Callable[[Optional[Any]], None]] = None,
+               priority: Optional[int] = None) -> Future:
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(lambda f: callback(f.result()))
+        future.set_result(self._result(method, payload))
+        return future
+
+    def close(self, timeout: float = 0) -> None:
+        pass
+
+
+def _cards(rng: random.Random, count: int) -> str:
+    return ''.join(card_text(rng.randrange(CARD_COUNT)) for _ in range(count))
+
+
+def game_stream(start: int, games: int, seed: int = 0) -> Iterator[Tuple[str, str]]:
+    """
+    (type d'update, texte) pour `games` jeux : post en cours puis édition finalisée.
+    Les balises de numéro alternent entre les formats rencontrés sur les canaux sources.
+    """
+    rng = random.Random(seed)
+    for n in range(start, start + games):
+        player, banker = _cards(rng, rng.choice((2, 3))), _cards(rng, rng.choice((2, 3)))
+        tag = (f'#T{n}', f'#R{n}', f'🔵{n}🔵')[n % 3]
+        points = rng.randrange(10), rng.randrange(10)
+        yield 'channel_post', f"⏰#N{n}. {points[0]}({player}) - {points[1]}({banker}) {tag}"
+        done = '✅' if n % 4 else '🔰'
+        yield 'edited_channel_post', f"#N{n}. {done}{points[0]}({player}) - {points[1]}({banker}) {tag}"
+
+
+def seed_history(handlers: TelegramHandlers, size: int, first_game: int, seed: int = 0) -> None:
+    """Remplit l'historique INTER avec `size` jeux puis calcule les règles (hors mesure)."""
+    predictor = handlers.card_predictor
+    rng = random.Random(seed)
+    now = datetime.now().isoformat()
+    for i in range(size):
+        game = first_game + i
+        predictor.inter_data.append({
+            'numero_resultat': game,
+            'declencheur': rng.randrange(CARD_COUNT),
+            'numero_declencheur': game - 2,
+            'result_suit': rng.randrange(len(SUITS)),
+            'date': now,
+        })
+    predictor.analyze_and_set_smart_rules(force_activate=True)
+    predictor._save_all_data()
+    predictor.flush_state()
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentile au rang le plus proche (valeurs déjà triées)."""
+    if not sorted_values: return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_size(history_size: int, games: int, seed: int = 0) -> Dict[str, Any]:
+    """Mesure un flux de `games` jeux sur un historique de `history_size` jeux."""
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        handlers = TelegramHandlers(BENCH_TOKEN)
+        handlers.telegram.close()
+        handlers.telegram = fake = RecordingTelegram()
+        predictor = handlers.card_predictor
+        predictor.set_channel_id(SOURCE_CHANNEL_ID, 'source')
+        predictor.set_channel_id(PREDICTION_CHANNEL_ID, 'prediction')
+
+        first_game = 1000
+        seed_history(handlers, history_size, first_game - history_size, seed)
+
+        latencies: List[float] = []
+        started = time.perf_counter()
+        for update_id, (kind, text) in enumerate(game_stream(first_game, games, seed), start=1):
+            update = {'update_id': update_id,
+                      kind: {'message_id': update_id, 'chat': {'id': SOURCE_CHANNEL_ID}, 'text': text}}
+            t0 = time.perf_counter()
+            handlers.handle_update(update)
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+
+        t0 = time.perf_counter()
+        predictor.flush_state()
+        flush_time = time.perf_counter() - t0
+        predictor._store.close()
+        # Prédictions tranchées sorties de l'état vivant (PREDICTION_KEEP_SETTLED) : comptées depuis l'archive
+        archived = sum(1 for _ in predictor.archive.iter_records())
+
+        latencies.sort()
+        return {
+            'history_size': history_size,
+            'games': games,
+            'updates': len(latencies),
+            'elapsed_s': round(elapsed, 4),
+            'throughput_updates_per_s': round(len(latencies) / elapsed, 1) if elapsed else None,
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50) * 1000, 4),
+                'p95': round(percentile(latencies, 95) * 1000, 4),
+                'p99': round(percentile(latencies, 99) * 1000, 4),
+                'max': round(latencies[-1] * 1000, 4) if latencies else 0.0,
+                'mean': round(sum(latencies) / len(latencies) * 1000, 4) if latencies else 0.0,
+            },
+            'final_flush_ms': round(flush_time * 1000, 3),
+            'predictions': len(predictor.predictions) + archived,
+            'predictions_archived': archived,
+            'telegram_calls': dict(fake.calls),
+        }
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Débit et latence de TelegramHandlers.handle_update")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="Tailles d'historique INTER, séparées par des virgules")
+    parser.add_argument('--games', type=int, default=DEFAULT_GAMES, help="Jeux simulés par taille (2 updates par jeu)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Fichier JSON de résultat (sinon sortie standard)")
+    args = parser.parse_args(argv)
+
+    # Les logs INFO par update fausseraient la mesure
+    logging.basicConfig(level=logging.WARNING)
+    for name in ('handlers', 'card_predictor', 'state_flusher', 'telegram_client', 'prediction_archive'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(',') if s.strip()):
+        result = run_size(size, args.games, args.seed)
+        results.append(result)
+        print(f"history={size:>7}  {result['throughput_updates_per_s']:>9} upd/s  "
+              f"p50={result['latency_ms']['p50']}ms  p95={result['latency_ms']['p95']}ms  "
+              f"p99={result['latency_ms']['p99']}ms", file=sys.stderr)
+
+    report = {
+        'benchmark': 'handle_update',
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'STATE_BACKEND': card_predictor.STATE_BACKEND,
+            'STATE_FLUSH_INTERVAL': card_predictor.STATE_FLUSH_INTERVAL,
+            'INTER_WINDOW_GAMES': card_predictor.INTER_WINDOW_GAMES,
+            'INTER_DECAY': card_predictor.INTER_DECAY,
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return report
+
+
+if __name__ == '__main__':
+    main()
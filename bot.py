@@ -7,15 +7,24 @@ import os
 import logging
 import requests
 import json
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from typing import Dict, Any, Optional
 
 # Importation des classes de logique métier
 from handlers import TelegramHandlers
-from card_predictor import CardPredictor 
+from card_predictor import CardPredictor, STATE_DB_FILE
+from update_dedup import UpdateDedup, SQLiteUpdateDedup
+from telegram_client import bot_api_url
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Attente maximale de l'envoi par send_message (file d'envoi comprise)
+SEND_MESSAGE_TIMEOUT = 60
+
+# Types d'updates demandés à Telegram (webhook comme getUpdates)
+ALLOWED_UPDATES = ['message', 'edited_message', 'channel_post', 'edited_channel_post', 'callback_query', 'my_chat_member']
+
 class TelegramBot:
     """
     Classe de haut niveau pour gérer les interactions avec l'API Telegram
@@ -24,11 +33,19 @@ class TelegramBot:
 
     def __init__(self, token: str):
         self.token = token
-        self.base_url = f"https://api.telegram.org/bot{token}"
+        self.base_url = bot_api_url(token)
         self.deployment_file_path = "final2025.zip" 
         
         # Initialize advanced handlers
         self.handlers = TelegramHandlers(token)
+
+        # update_id déjà traités : absorbe les renvois du webhook par Telegram
+        # (dans la base partagée quand plusieurs workers reçoivent les updates)
+        predictor = self.handlers.card_predictor
+        if predictor and predictor.shared:
+            self.dedup = SQLiteUpdateDedup(os.path.join(predictor.state_dir, STATE_DB_FILE))
+        else:
+            self.dedup = UpdateDedup()
         
         if not self.handlers.card_predictor:
             logger.error("🚨 Le moteur de prédiction n'a pas pu être initialisé.")
@@ -49,8 +66,8 @@ class TelegramBot:
 
             logger.debug(f"Received update: {json.dumps(update, indent=2)}")
 
-            # Délégation du traitement complet aux handlers
-            self.handlers.handle_update(update)
+            # Délégation du traitement complet aux handlers (renvois écartés sous leur verrou)
+            self.handlers.handle_update(update, dedup=self.dedup)
             
             logger.info(f"✅ Update traité avec succès via webhook")
 
@@ -60,9 +77,14 @@ class TelegramBot:
     # --- Méthodes API Directes (Pour setWebhook et autres) ---
 
     def send_message(self, chat_id: int, text: str, parse_mode: str = 'Markdown') -> bool:
-        """Send text message to user (méthode de secours/utilitaire)"""
+        """Send text message to user (méthode de secours/utilitaire) ; attend l'envoi, True s'il a abouti"""
         # Utilisation de la méthode du handler pour la cohérence
-        return self.handlers.send_message(chat_id, text, parse_mode) is not None
+        future = self.handlers.send_message(chat_id, text, parse_mode=parse_mode)
+        try:
+            return bool(future.result(timeout=SEND_MESSAGE_TIMEOUT))
+        except FutureTimeoutError:
+            logger.error(f"❌ Envoi à {chat_id} non confirmé après {SEND_MESSAGE_TIMEOUT}s")
+            return False
 
     def send_document(self, chat_id: int, file_path: str) -> bool:
         """Send document file to user (Méthode incluse pour respecter le schéma)"""
@@ -95,7 +117,7 @@ class TelegramBot:
             # MISE À JOUR CRITIQUE: Inclure 'callback_query' et 'my_chat_member'
             data = {
                 'url': webhook_url,
-                'allowed_updates': ['message', 'edited_message', 'channel_post', 'edited_channel_post', 'callback_query', 'my_chat_member']
+                'allowed_updates': ALLOWED_UPDATES
             }
 
             response = requests.post(url, json=data, timeout=10)
@@ -114,6 +136,15 @@ class TelegramBot:
             logger.error(f"Error setting webhook: {e}")
             return False
 
+    def delete_webhook(self) -> bool:
+        """Supprime le webhook (obligatoire avant getUpdates) sans perdre les updates en attente"""
+        try:
+            response = requests.post(f"{self.base_url}/deleteWebhook", json={'drop_pending_updates': False}, timeout=10)
+            return bool(response.json().get('ok'))
+        except Exception as e:
+            logger.error(f"Error deleting webhook: {e}")
+            return False
+
     def get_bot_info(self) -> Dict[str, Any]:
         """Get bot information"""
         try:
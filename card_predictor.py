@@ -1,16 +1,29 @@
 # card_predictor.py - Version FINALE CORRIGÉE (IA, Collecte et Reset)
 
-import re
 import logging
 import time
 import os
 import json
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, Dict, List, Tuple, Any
+from typing import Optional, Dict, List, Tuple, Any, Union
 from collections import defaultdict
 import pytz 
 import sys 
 
+from state_journal import StateJournal, OP_SET, OP_PUT, OP_DEL, OP_ADD, OP_APPEND, OP_PRUNE
+from sqlite_store import SQLiteStateStore
+from state_flusher import StateFlusher, DiscardingFlusher, snapshot_copy
+from inter_stats import InterColumns, InterDataWindow
+from interval_set import IntervalSet
+from game_ring import GameRing, GameRingSet
+from prediction_archive import PredictionArchive, settled_overflow
+from process_lock import ProcessLock
+from rule_table import compile_rules, normalize_rules, SOURCE_INTER
+from cards import Suit, as_card_id, as_suit, card_suit, card_text, suit_id
+from game_message import GameMessageParser, ParsedGameMessage, GAME_NUMBER_TRB
+
 logger = logging.getLogger(__name__)
 # Mis à jour à INFO. Passez à DEBUG si vous voulez suivre la collecte dans les logs.
 logger.setLevel(logging.INFO) 
@@ -29,27 +42,89 @@ STATIC_RULES = {
 # Symboles pour les status de vérification (Offset)
 SYMBOL_MAP = {0: '✅0️⃣', 1: '✅1️⃣', 2: '✅2️⃣'}
 
+# Champs persistés -> fichier du snapshot
+STATE_FILES = {
+    'predictions': 'predictions.json',
+    'processed_messages': 'processed.json',
+    'inter_data': 'inter_data.bin',  # Colonnes binaires (InterColumns)
+    'smart_rules': 'smart_rules.json',
+    'channels_config': 'channels_config.json',
+    'sequential_history': 'sequential_history.json',
+    'is_inter_mode_active': 'is_inter_mode_active.json',
+    'last_prediction_time': 'last_prediction_time.json',
+    'last_predicted_game_number': 'last_predicted_game_number.json',
+    'last_analysis_time': 'last_analysis_time.json',
+    'consecutive_fails': 'consecutive_fails.json',
+    'collected_games': 'collected_games.json',
+    'last_reset_date': 'last_reset_date.json',
+}
+
+# Journal des mutations (rejoué au démarrage, compacté toutes les N mutations)
+JOURNAL_FILE = 'state_journal.log'
+JOURNAL_COMPACT_EVERY = int(os.getenv('JOURNAL_COMPACT_EVERY') or 500)
+
+# Backend de persistance : 'json' (snapshot + journal, défaut) ou 'sqlite'
+STATE_BACKEND = (os.getenv('STATE_BACKEND') or 'json').lower()
+STATE_DB_FILE = os.getenv('STATE_DB_FILE') or 'bot_state.sqlite3'
+
+# État partagé entre plusieurs processus (gunicorn --workers N) : base SQLite imposée,
+# une update à la fois sous verrou de fichier, rechargement si un autre worker a écrit
+SHARED_STATE = os.getenv('SHARED_STATE', 'False').lower() == 'true'
+STATE_LOCK_FILE = 'state.lock'
+
+# Écriture différée : lot écrit toutes les N secondes ou après N mutations (0 = synchrone)
+STATE_FLUSH_INTERVAL = float(os.getenv('STATE_FLUSH_INTERVAL') or 0.5)
+STATE_FLUSH_MAX_PENDING = int(os.getenv('STATE_FLUSH_MAX_PENDING') or 50)
+
+# Fenêtre d'apprentissage INTER : N derniers jeux et/ou D derniers jours (0 = illimité),
+# avec décroissance exponentielle optionnelle des compteurs par jeu (1.0 = aucune)
+INTER_WINDOW_GAMES = int(os.getenv('INTER_WINDOW_GAMES') or 10000)
+INTER_WINDOW_DAYS = float(os.getenv('INTER_WINDOW_DAYS') or 0)
+INTER_DECAY = float(os.getenv('INTER_DECAY') or 1.0)
+
+# Derniers jeux gardés pour la collecte N-2 -> N (sequential_history, collected_games) ;
+# augmenter pour analyser des décalages plus longs (minimum 3)
+GAME_HISTORY_SIZE = max(3, int(os.getenv('GAME_HISTORY_SIZE') or 51))
+
+# Prédictions tranchées gardées en mémoire (au moins 1) ; les plus anciennes partent
+# dans l'archive quotidienne compressée (prediction_archive.py)
+PREDICTION_KEEP_SETTLED = max(1, int(os.getenv('PREDICTION_KEEP_SETTLED') or 20))
+PREDICTION_ARCHIVE_DIR = os.getenv('PREDICTION_ARCHIVE_DIR') or 'prediction_archive'
+
+_NO_LOCK = threading.Lock()
+
 class CardPredictor:
     """Gère la logique de prédiction d'ENSEIGNE (Couleur) et la vérification, 
     incluant l'IA (Top 2), le reset quotidien (00h59 WAT) et le format de prédiction exact."""
 
-    def __init__(self, telegram_message_sender=None):
+    def __init__(self, telegram_message_sender=None, persist: bool = True, state_dir: Optional[str] = None):
         
         # <<< CONFIGURATION >>>
         # ⚠️ REMPLACEZ CES IDs PAR VOS VALEURS RÉELLES
         self.HARDCODED_SOURCE_ID = -1002682552255  
         self.HARDCODED_PREDICTION_ID = -1002682552255
         self.telegram_message_sender = telegram_message_sender
+        # persist=False : état vierge en mémoire, aucune lecture ni écriture disque (backtest)
+        self.persist = persist
+        # Sérialise le traitement d'un canal et les commandes admin (workers parallèles)
+        self.lock = threading.RLock()
+        # Répertoire des fichiers d'état (répertoire courant par défaut, un par shard multi-canaux)
+        self.state_dir = state_dir or os.getcwd()
+        if persist: os.makedirs(self.state_dir, exist_ok=True)
+        self.shared = persist and SHARED_STATE
+        self._process_lock = ProcessLock(os.path.join(self.state_dir, STATE_LOCK_FILE)) if self.shared else None
         self.BENIN_TIMEZONE = pytz.timezone('Africa/Lagos') # Fuseau horaire du Bénin (WAT/UTC+1)
+        self.parser = GameMessageParser(GAME_NUMBER_TRB) # Analyse unique des messages du canal source
 
         # --- A. Chargement des Données Persistantes ---
         self.predictions: Dict[int, Dict] = self._load_data('predictions.json') 
-        self.processed_messages: set = self._load_data('processed.json', is_set=True) 
-        self.inter_data: List[Dict] = self._load_data('inter_data.json', is_list=True) # Liste des dicts de collecte N-2->N
+        self.processed_messages = IntervalSet(self._load_data('processed.json', is_list=True)) # Jeux traités, en intervalles
+        self.inter_data = InterDataWindow(INTER_WINDOW_GAMES, INTER_WINDOW_DAYS, INTER_DECAY,
+                                          self._load_inter_data()) # Fenêtre colonnaire des jeux collectés N-2->N
         self.smart_rules: List[Dict] = self._load_data('smart_rules.json', is_list=True) # Liste des règles Top 2
         self.channels_config: Dict[str, int] = self._load_data('channels_config.json') 
-        self.sequential_history: Dict[int, Dict[str, str]] = self._load_data('sequential_history.json') # {game_num: {'carte': 'X♠️', 'date': '...'}
-        self.collected_games: set = self._load_data('collected_games.json', is_set=True) 
+        self.sequential_history = GameRing(GAME_HISTORY_SIZE, self._load_data('sequential_history.json')) # {game_num: {'carte': id_carte, 'date': '...'}
+        self.collected_games = GameRingSet(GAME_HISTORY_SIZE, self._load_data('collected_games.json', is_list=True))
         
         # Scalaires
         self.is_inter_mode_active = self._load_data('is_inter_mode_active.json', is_scalar=True) or False
@@ -59,33 +134,83 @@ class CardPredictor:
         self.consecutive_fails = self._load_data('consecutive_fails.json', is_scalar=True) or 0
         self.last_reset_date = self._load_data('last_reset_date.json', is_scalar=True) or None 
 
-        # --- B. Configuration Canaux (AVEC FALLBACK SÉCURISÉ) ---
+        # Rejeu des mutations journalisées depuis le dernier snapshot (ou chargement SQLite)
+        self._store = self._open_store()
+
+        # Archive des prédictions tranchées (l'état vivant ne garde que les récentes)
+        self.archive = PredictionArchive(os.path.join(self.state_dir, PREDICTION_ARCHIVE_DIR)) if persist else None
+
+        # Écritures de démarrage : sous verrou (en SHARED_STATE, un worker à la fois, sur l'état le plus récent)
+        with self.exclusive():
+            self._retire_settled()
+
+            # Compteurs déclencheur -> enseigne, tenus à jour par la fenêtre d'apprentissage
+            self._record_inter_evictions(len(self.inter_data.evict_expired()))
+            self.result_counts = self.inter_data.counts
+
+            # --- B. Configuration Canaux (AVEC FALLBACK SÉCURISÉ) ---
+            self._apply_channels_config()
+
+            # Si des règles existent mais que le mode IA est désactivé (erreur), on le réactive au démarrage
+            if self.smart_rules and not self.is_inter_mode_active:
+                 self.is_inter_mode_active = True
+                 self._record_set('is_inter_mode_active')
+             
+    def _apply_channels_config(self):
         self.target_channel_id = self.channels_config.get('source', self.HARDCODED_SOURCE_ID)
         self.prediction_channel_id = self.channels_config.get('prediction', self.HARDCODED_PREDICTION_ID)
         self.active_admin_chat_id = self.channels_config.get('admin')
 
-        # Si des règles existent mais que le mode IA est désactivé (erreur), on le réactive au démarrage
-        if self.smart_rules and not self.is_inter_mode_active:
-             self.is_inter_mode_active = True
-             self._save_data(self.is_inter_mode_active, 'is_inter_mode_active.json')
-             
+    # --- Table de règles compilée (priorité INTER > STATIQUE résolue à la compilation) ---
+    @property
+    def smart_rules(self) -> List[Dict]:
+        return self._smart_rules
+
+    @smart_rules.setter
+    def smart_rules(self, rules: List[Dict]):
+        # Règles encodées (ids de cartes, Suit) : les anciennes règles en emoji sont converties
+        self._smart_rules = normalize_rules(rules)
+        self._compile_rules()
+
+    @property
+    def is_inter_mode_active(self) -> bool:
+        return self._is_inter_mode_active
+
+    @is_inter_mode_active.setter
+    def is_inter_mode_active(self, active: bool):
+        self._is_inter_mode_active = active
+        self._compile_rules()
+
+    def _compile_rules(self):
+        """Recompile la table de 52 cases ; l'affectation du tuple est atomique."""
+        self._rule_table = compile_rules(getattr(self, '_smart_rules', None),
+                                         STATIC_RULES,
+                                         bool(getattr(self, '_is_inter_mode_active', False)))
+
     # --- Gestion des Fichiers (Sauvegarde/Chargement) ---
     def _save_data(self, data, filename: str):
-        filepath = os.path.join(os.getcwd(), filename)
+        filepath = os.path.join(self.state_dir, filename)
         try:
+            if isinstance(data, InterColumns):
+                data.write(filepath)
+                return
             if isinstance(data, set): data = list(data)
             # Les clés de sequential_history sont des int, on doit les convertir pour le JSON
             if filename == 'sequential_history.json':
                  data = {str(k): v for k, v in data.items()}
             
-            with open(filepath, 'w', encoding='utf-8') as f:
+            # Écriture atomique : un arrêt brutal ne laisse jamais un snapshot à moitié écrit
+            tmp_path = filepath + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, filepath)
         except Exception as e:
             logger.error(f"Erreur de sauvegarde {filename}: {e}")
 
     def _load_data(self, filename: str, is_set=False, is_list=False, is_scalar=False) -> Any:
-        filepath = os.path.join(os.getcwd(), filename)
+        filepath = os.path.join(self.state_dir, filename)
         default_value = set() if is_set else [] if is_list else {} if not is_scalar else None
+        if not self.persist: return default_value
 
         try:
             if os.path.exists(filepath):
@@ -106,26 +231,132 @@ class CardPredictor:
         
         return default_value
 
+    def _load_inter_data(self) -> Union[InterColumns, List[Dict]]:
+        """Colonnes binaires si présentes, sinon l'ancien inter_data.json (converti au prochain snapshot)."""
+        filepath = os.path.join(self.state_dir, STATE_FILES['inter_data'])
+        if self.persist and os.path.exists(filepath):
+            try:
+                return InterColumns.read(filepath)
+            except Exception as e:
+                logger.error(f"Erreur de chargement {STATE_FILES['inter_data']}: {e}")
+        return self._load_data('inter_data.json', is_list=True)
+
     def _save_all_data(self):
-        """Sauvegarde l'intégralité de l'état du bot."""
-        self._save_data(self.predictions, 'predictions.json')
-        self._save_data(self.processed_messages, 'processed.json')
-        self._save_data(self.inter_data, 'inter_data.json')
-        self._save_data(self.smart_rules, 'smart_rules.json')
-        self._save_data(self.channels_config, 'channels_config.json')
-        self._save_data(self.sequential_history, 'sequential_history.json')
-        self._save_data(self.is_inter_mode_active, 'is_inter_mode_active.json')
-        self._save_data(self.last_prediction_time, 'last_prediction_time.json')
-        self._save_data(self.last_predicted_game_number, 'last_predicted_game_number.json')
-        self._save_data(self.last_analysis_time, 'last_analysis_time.json')
-        self._save_data(self.consecutive_fails, 'consecutive_fails.json')
-        self._save_data(self.collected_games, 'collected_games.json')
-        self._save_data(self.last_reset_date, 'last_reset_date.json') 
+        """Demande un snapshot complet de l'état (écrit en arrière-plan, compacte le journal)."""
+        self._store.request_snapshot()
+
+    def flush_state(self):
+        """Force l'écriture immédiate des mutations en attente (arrêt, fin de lot)."""
+        self._store.flush()
+
+    def _capture_state(self) -> Dict[str, Any]:
+        return {field: snapshot_copy(getattr(self, field)) for field in STATE_FILES}
+
+    def _write_snapshot(self, state: Dict[str, Any]):
+        backend = self._store.backend
+        if isinstance(backend, SQLiteStateStore):
+            backend.save_all(state)
+            return
+        for field, value in state.items():
+            self._save_data(value, STATE_FILES[field])
+        backend.reset()
+
+    def _open_store(self) -> StateFlusher:
+        """Ouvre le backend d'état configuré, y charge l'état courant et démarre le flusher."""
+        if not self.persist:
+            return DiscardingFlusher()
+        backend = StateJournal(os.path.join(self.state_dir, JOURNAL_FILE), compact_every=JOURNAL_COMPACT_EVERY)
+        if STATE_BACKEND != 'sqlite' and not self.shared:
+            backend.replay(self)
+        else:
+            if STATE_BACKEND != 'sqlite':
+                logger.warning("⚠️ SHARED_STATE : le backend JSON n'est pas sûr entre processus, SQLite est utilisé.")
+            journal, backend = backend, SQLiteStateStore(os.path.join(self.state_dir, STATE_DB_FILE))
+            # Un seul worker migre l'état JSON ; les autres chargent ensuite la base
+            with self._process_lock or _NO_LOCK:
+                if backend.has_state():
+                    backend.replay(self)
+                else:
+                    # Première utilisation : migration de l'état JSON (+ journal) vers SQLite
+                    journal.replay(self)
+                    backend.save_all(self._capture_state())
+                    logger.info(f"🗄️ État JSON migré vers SQLite ({STATE_DB_FILE}).")
+
+        return StateFlusher(backend, self._capture_state, self._write_snapshot,
+                            interval=STATE_FLUSH_INTERVAL, max_pending=STATE_FLUSH_MAX_PENDING,
+                            state_lock=self.lock)
+
+    # --- Section critique d'une update (threads et, en SHARED_STATE, processus) ---
+    @contextmanager
+    def exclusive(self):
+        """
+        Verrou du predictor ; en état partagé, aussi le verrou de fichier : l'état est
+        rechargé si un autre worker a écrit, puis écrit avant de rendre la main.
+        """
+        with self.lock:
+            if self._process_lock is None:
+                yield
+                return
+            with self._process_lock:
+                self._sync_shared_state()
+                try:
+                    yield
+                finally:
+                    self.flush_state()
+
+    def _sync_shared_state(self):
+        """Recharge les seuls champs qu'un autre processus a modifiés dans la base."""
+        backend = self._store.backend
+        self._store.flush()
+        changes = backend.external_changes()
+        if not changes: return
+        backend.reload(self, changes)
+        if 'channels_config' in changes:
+            self._apply_channels_config()
+
+    def _claim_prediction(self, game: int) -> bool:
+        """Réservation atomique d'un jeu à prédire (un seul worker publie la prédiction)."""
+        if not self.shared: return True
+        return self._store.backend.claim_prediction(self.last_reset_date or '', game)
+
+    def set_prediction_message_id(self, game: int, message_id: int):
+        """
+        Mémorise le message Telegram d'une prédiction (callback d'envoi). En état partagé,
+        la section critique recharge d'abord la prédiction, dont le statut a pu être
+        tranché par un autre worker, puis l'écrit avant de rendre le verrou.
+        """
+        with self.exclusive():
+            prediction = self.predictions.get(game)
+            if prediction is None: return
+            prediction['message_id'] = message_id
+            self._record_put('predictions', game)
+
+    # --- Journalisation des mutations (marquées en mémoire, écrites par lot) ---
+    def _record(self, op: str, field: str, key: Any = None, value: Any = None):
+        self._store.append(op, field, key=key, value=value)
+
+    def _record_set(self, field: str):
+        """Journalise la valeur complète d'un champ (scalaires, config, règles)."""
+        self._record(OP_SET, field, value=getattr(self, field))
+
+    def _record_put(self, field: str, key: Any):
+        """Journalise une seule entrée d'un dict indexé (ex: predictions[N])."""
+        self._record(OP_PUT, field, key=key, value=getattr(self, field)[key])
+
+    def _record_add(self, field: str, value: Any):
+        self._record(OP_ADD, field, value=value)
+
+    def _record_inter_evictions(self, count: int):
+        """Entrées sorties de la fenêtre INTER : les plus anciennes lignes sont supprimées (SQLite)."""
+        if count: self._record(OP_PRUNE, 'inter_data', value=count)
 
     # --- RESET QUOTIDIEN (00:59 WAT) ---
-    def check_and_reset_predictions(self):
-        """Réinitialise les stocks de prédiction (uniquement) à 00h59 WAT (Bénin)."""
-        current_date_time_wat = datetime.now(self.BENIN_TIMEZONE)
+    def check_and_reset_predictions(self, now: Optional[datetime] = None):
+        """
+        Réinitialise les stocks de prédiction (uniquement) à 00h59 WAT (Bénin).
+        `now` (datetime avec fuseau) remplace l'horloge réelle lors d'un rejeu.
+        """
+        current_date_time_wat = now.astimezone(self.BENIN_TIMEZONE) if now else datetime.now(self.BENIN_TIMEZONE)
         current_date_str = current_date_time_wat.strftime("%Y-%m-%d")
         current_time_str = current_date_time_wat.strftime("%H:%M")
 
@@ -133,13 +364,11 @@ class CardPredictor:
             if current_time_str >= "00:59": 
                 logger.info(f"⌚️ Déclenchement du reset à {current_time_str} WAT.")
                 
-                self.predictions = {}
-                self.processed_messages = set() 
-                self.last_prediction_time = 0
-                self.last_predicted_game_number = 0
-                self.consecutive_fails = 0
+                self._clear_prediction_stock()
                 self.last_reset_date = current_date_str
                 self._save_all_data()
+                if self.shared:
+                    self._store.backend.release_claims_before(current_date_str)
                 
                 logger.info("✅ Reset quotidien des stocks de prédiction effectué (00h59 WAT).")
                 
@@ -148,100 +377,128 @@ class CardPredictor:
                                                  "⚙️ **Reset Quotidien** : Stocks de prédiction réinitialisés (00h59 WAT). Les données de l'IA sont conservées.")
         return
 
+    def reset_prediction_stock(self):
+        """Reset manuel (/r) : vide les stocks du jour et libère leurs réservations (la source a relancé sa numérotation)."""
+        with self.exclusive():
+            self._clear_prediction_stock()
+            self._save_all_data()
+            if self.shared:
+                self._store.backend.release_claims(self.last_reset_date or '')
+
+    def _clear_prediction_stock(self):
+        self.archive_all_predictions()
+        self.predictions = {}
+        self.processed_messages.clear()
+        self.last_prediction_time = 0
+        self.last_predicted_game_number = 0
+        self.consecutive_fails = 0
+
+    # --- ARCHIVE DES PRÉDICTIONS TRANCHÉES ---
+    def _archive_day(self) -> str:
+        """Journée de prédiction en cours (celle du dernier reset), date du jour à défaut."""
+        return self.last_reset_date or datetime.now(self.BENIN_TIMEZONE).strftime("%Y-%m-%d")
+
+    def _archive_batch(self, predictions: Dict[int, Dict]) -> bool:
+        """Ajoute des prédictions au segment du jour ; False si l'archive n'a pas pu être écrite."""
+        if self.archive is None or not predictions: return True
+        try:
+            self.archive.append(self._archive_day(), predictions)
+            return True
+        except OSError as e:
+            logger.error(f"❌ Archivage des prédictions impossible : {e}")
+            return False
+
+    def _retire_settled(self):
+        """Sort de l'état vivant les prédictions tranchées au-delà des PREDICTION_KEEP_SETTLED plus récentes."""
+        games = settled_overflow(self.predictions, PREDICTION_KEEP_SETTLED)
+        if not games or not self._archive_batch({game: self.predictions[game] for game in games}): return
+        for game in games:
+            del self.predictions[game]
+            self._record(OP_DEL, 'predictions', key=game)
+
+    def archive_all_predictions(self):
+        """Archive tout le stock (en attente compris) avant sa remise à zéro."""
+        self._archive_batch(self.predictions)
+
     # --- FONCTIONS UTILITAIRES D'EXTRACTION et CONFIG ---
     def set_channel_id(self, channel_id: int, channel_type: str):
         if channel_type == 'source': self.target_channel_id = channel_id
         elif channel_type == 'prediction': self.prediction_channel_id = channel_id
         elif channel_type == 'admin': self.active_admin_chat_id = channel_id
         self.channels_config[channel_type] = channel_id
-        self._save_data(self.channels_config, 'channels_config.json')
-
-    def extract_game_number(self, message: str) -> Optional[int]:
-        match = re.search(r'#T(\d+)|#R(\d+)|🔵(\d+)🔵', message)
-        if match:
-            for group in match.groups():
-                if group:
-                    try: return int(group)
-                    except ValueError: pass
-        return None
+        self._record_set('channels_config')
+
+    # --- ANALYSE DES MESSAGES (une seule passe par message) ---
+    def parse(self, message: Union[str, ParsedGameMessage]) -> ParsedGameMessage:
+        return self.parser.parse(message)
+
+    def extract_game_number(self, message: Union[str, ParsedGameMessage]) -> Optional[int]:
+        return self.parse(message).game_number
     
-    def get_all_cards_in_first_group(self, message: str) -> List[str]:
+    def get_all_cards_in_first_group(self, message: Union[str, ParsedGameMessage]) -> List[str]:
         """Extrait toutes les cartes du premier groupe de cartes."""
-        cards = []
-        # Recherche du contenu entre parenthèses
-        match = re.search(r'\(([^)]+)\)', message)
-        if match:
-            content = match.group(1).strip()
-            # Recherche de toutes les cartes (Val+Symbole)
-            cards = re.findall(r'(\d+[♣️♠️♦️❤️]|A[♣️♠️♦️❤️]|K[♣️♠️♦️❤️]|Q[♣️♠️♦️❤️]|J[♣️♠️♦️❤️])', content)
-            # Remplacement des cœurs par le symbole correct si nécessaire
-            cards = [c.replace("♥️", "❤️") for c in cards]
-        return cards
+        return [card_text(cid) for cid in self.parse(message).first_group]
     
-    def get_first_card_info(self, message: str) -> Optional[str]:
+    def get_first_card_info(self, message: Union[str, ParsedGameMessage]) -> Optional[str]:
         """Extrait la première carte de la première parenthèse pour la prédiction."""
-        cards = self.get_all_cards_in_first_group(message)
-        return cards[0] if cards else None
+        first_card = self.parse(message).first_card
+        return card_text(first_card) if first_card is not None else None
 
-    def check_costume_in_first_parentheses(self, message: str, predicted_costume: str) -> int:
+    def check_costume_in_first_parentheses(self, message: Union[str, ParsedGameMessage], predicted_costume: str) -> int:
         """Vérifie si l'enseigne prédite est présente dans les cartes du premier groupe (offset 0, 1, 2)."""
-        cards = self.get_all_cards_in_first_group(message)
-        if not cards: return -1
+        target_suit = suit_id(predicted_costume)
 
-        # Utiliser le symbole correct pour la vérification
-        target_suit = predicted_costume.replace("♥️", "❤️")
-
-        for i, card in enumerate(cards[:3]): # Limiter la recherche aux 3 premières cartes
-            if card.endswith(target_suit):
+        for i, cid in enumerate(self.parse(message).first_group[:3]): # Limiter la recherche aux 3 premières cartes
+            if card_suit(cid) == target_suit:
                 return i # Retourne l'index (0, 1, ou 2)
         
         return -1 # Non trouvé
 
-    def has_completion_indicators(self, text: str) -> bool:
-        return '✅' in text or '🔰' in text
+    def has_completion_indicators(self, text: Union[str, ParsedGameMessage]) -> bool:
+        return self.parse(text).has_completion
 
-    def is_final_result_structurally_valid(self, text: str) -> bool:
+    def is_final_result_structurally_valid(self, text: Union[str, ParsedGameMessage]) -> bool:
         """Vérifie si le message est un résultat de jeu (au moins 3 cartes trouvées)."""
-        card_count = len(re.findall(r'(\d+[♣️♠️♦️❤️]|A[♣️♠️♦️❤️]|K[♣️♠️♦️❤️]|Q[♣️♠️♦️❤️]|J[♣️♠️♦️❤️])', text))
-        return card_count >= 3
+        return self.parse(text).card_count >= 3
 
     # --- IA (MODE INTER) ---
-    def collect_inter_data(self, game_number: int, message: str):
+    def collect_inter_data(self, game_number: int, message: Union[str, ParsedGameMessage]):
         """
         Collecte la première carte du jeu actuel (N) et prépare l'entrée pour l'apprentissage N-2 -> N.
         """
-        first_card_n = self.get_first_card_info(message) 
-        if not first_card_n: return
+        first_card_n = self.parse(message).first_card
+        if first_card_n is None: return
         
         # Le résultat (Enseigne) est l'enseigne de la carte N
-        result_suit_n = first_card_n[-1].replace("❤️", "♥️") # Utiliser ♥️ pour la collecte
+        result_suit_n = card_suit(first_card_n)
         
-        # 1. Mise à jour de l'historique séquentiel
-        self.sequential_history[game_number] = {'carte': first_card_n, 'date': datetime.now().isoformat()}
-        self.collected_games.add(game_number)
-
-        # Suppression des anciennes entrées pour garder l'historique propre
-        limit = game_number - 50
-        self.sequential_history = {k:v for k,v in self.sequential_history.items() if k >= limit}
-        self.collected_games = {g for g in self.collected_games if g >= limit}
+        # 1. Mise à jour de l'historique séquentiel (anneau : le jeu N - GAME_HISTORY_SIZE est évincé)
+        evicted = self.sequential_history.put(game_number, {'carte': first_card_n, 'date': datetime.now().isoformat()})
+        evicted_collected = self.collected_games.add(game_number)
+        self._record_put('sequential_history', game_number)
+        self._record_add('collected_games', game_number)
+        if evicted is not None: self._record(OP_DEL, 'sequential_history', key=evicted)
+        if evicted_collected is not None: self._record(OP_DEL, 'collected_games', key=evicted_collected)
         
         # 2. Vérification du jeu N-2 pour l'apprentissage (N-2 est le déclencheur)
         game_n_minus_2 = game_number - 2
         
-        if game_n_minus_2 in self.sequential_history:
-            card_n_minus_2 = self.sequential_history[game_n_minus_2]['carte']
+        card_n_minus_2 = as_card_id(self.sequential_history.get(game_n_minus_2, {}).get('carte'))
+        if card_n_minus_2 is not None:
             
-            # Ajout à la liste des données collectées (l'apprentissage réel)
-            self.inter_data.append({
+            # Ajout à la fenêtre des données collectées (l'apprentissage réel) ;
+            # les entrées trop anciennes sont évincées et décomptées
+            expired = self.inter_data.evict_expired()
+            evicted_entry = self.inter_data.append({
                 'numero_resultat': game_number,
                 'declencheur': card_n_minus_2, 
                 'numero_declencheur': game_n_minus_2,
-                'result_suit': result_suit_n, 
+                'result_suit': int(result_suit_n), 
                 'date': datetime.now().isoformat()
             })
-            logger.debug(f"🧠 Jeu {game_number} collecté : {card_n_minus_2} (N-2) -> {result_suit_n} (N)")
-
-        self._save_all_data()
+            self._record_inter_evictions(len(expired) + (evicted_entry is not None))
+            self._record(OP_APPEND, 'inter_data', value=self.inter_data[-1])
+            logger.debug(f"🧠 Jeu {game_number} collecté : {card_text(card_n_minus_2)} (N-2) -> {result_suit_n} (N)")
 
 
     def analyze_and_set_smart_rules(self, chat_id: int = None, force_activate: bool = False):
@@ -253,43 +510,27 @@ class CardPredictor:
                   self.telegram_message_sender(chat_id, "⚠️ **Analyse INTER impossible** : Aucune donnée de jeu collectée.")
              return
 
-        result_counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
-        
-        # Compter les occurrences de chaque (déclencheur -> résultat)
-        for entry in self.inter_data:
-            trigger_card = entry['declencheur'] 
-            result_suit = entry['result_suit']   
-            result_counts[result_suit][trigger_card] += 1
-
         new_smart_rules: List[Dict] = []
         
         # Pour chaque enseigne de résultat possible (♥️, ♣️, ♠️, ♦️)
-        for result_suit in ['♥️', '♣️', '♠️', '♦️']:
-            triggers_for_this_suit = result_counts.get(result_suit, {})
-            
-            if not triggers_for_this_suit: continue
+        for result_suit in (Suit.HEARTS, Suit.CLUBS, Suit.SPADES, Suit.DIAMONDS):
+            # Les compteurs (déclencheur -> résultat) sont tenus à jour par collect_inter_data
+            top_triggers = self.result_counts.top(result_suit, 2)
             
-            # Trier par fréquence et prendre le TOP 2
-            top_triggers = sorted(
-                triggers_for_this_suit.items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:2]
+            if not top_triggers: continue
             
             for trigger_card, count in top_triggers:
-                # Utiliser le symbole ❤️ pour l'affichage et la prédiction
-                predict_suit = result_suit.replace("♥️", "❤️") 
-                
                 new_smart_rules.append({
                     'trigger': trigger_card,
-                    'predict': predict_suit,
+                    'predict': result_suit,
                     'count': count,
-                    'result_suit': predict_suit  
+                    'result_suit': result_suit  
                 })
         
         self.smart_rules = new_smart_rules
         self.last_analysis_time = time.time()
-        self._save_all_data()
+        self._record_set('smart_rules')
+        self._record_set('last_analysis_time')
 
         # Activation/Désactivation
         if force_activate or self.smart_rules:
@@ -297,7 +538,7 @@ class CardPredictor:
         else:
             self.is_inter_mode_active = False
 
-        self._save_data(self.is_inter_mode_active, 'is_inter_mode_active.json')
+        self._record_set('is_inter_mode_active')
 
         if chat_id and self.telegram_message_sender:
              if self.smart_rules:
@@ -308,31 +549,30 @@ class CardPredictor:
 
     # --- PRÉDICTION ---
     
-    def should_predict(self, message: str) -> Optional[Tuple[str, bool]]:
+    def should_predict(self, message: Union[str, ParsedGameMessage]) -> Optional[Tuple[Suit, bool]]:
         """Retourne (enseigne_prédite, is_inter_mode) ou None."""
-        first_card = self.get_first_card_info(message)
-        if not first_card: return None
-
-        # 1. Mode INTER (PRIORITAIRE)
-        if self.is_inter_mode_active and self.smart_rules:
-            for rule in self.smart_rules:
-                if first_card == rule['trigger']:
-                    # rule['predict'] contient le symbole de prédiction (♠️, ❤️, ♦️, ♣️)
-                    return rule['predict'], True
+        first_card = self.parse(message).first_card
+        if first_card is None: return None
 
-        # 2. Mode STATIQUE
-        if first_card in STATIC_RULES:
-            return STATIC_RULES[first_card], False
+        # Une seule lecture dans la table compilée (INTER prioritaire, puis STATIQUE)
+        rule = self._rule_table[first_card]
+        if rule is None: return None
 
-        return None
+        predicted_suit, source = rule
+        return predicted_suit, source == SOURCE_INTER
 
-    def make_prediction(self, game_number_source: int, predicted_suit: str, is_inter: bool) -> Optional[Dict[str, Any]]:
+    def make_prediction(self, game_number_source: int, predicted_suit: Suit, is_inter: bool) -> Optional[Dict[str, Any]]:
         """Enregistre la prédiction N+2 et génère le message de statut."""
         
         predicted_game_number = game_number_source + 2
+        # La prédiction publiée garde l'emoji (texte du message Telegram)
+        predicted_suit = str(as_suit(predicted_suit))
 
         if predicted_game_number in self.predictions or predicted_game_number <= self.last_predicted_game_number:
             return None
+        if not self._claim_prediction(predicted_game_number):
+            logger.info(f"⏭️ Prédiction du jeu {predicted_game_number} déjà réservée par un autre worker.")
+            return None
 
         # FORMAT DE PRÉDICTION EXACT : 🔵[NUMÉRO]🔵:[SUIT] statut :⏳
         prediction_message = f"🔵{predicted_game_number}🔵:{predicted_suit} statut :⏳"
@@ -350,7 +590,10 @@ class CardPredictor:
         self.last_predicted_game_number = predicted_game_number
         self.last_prediction_time = time.time()
         self.consecutive_fails = 0 
-        self._save_all_data()
+        self._record_put('predictions', predicted_game_number)
+        self._record_set('last_predicted_game_number')
+        self._record_set('last_prediction_time')
+        self._record_set('consecutive_fails')
 
         return {
             'type': 'send_message',
@@ -360,10 +603,10 @@ class CardPredictor:
 
     # --- VÉRIFICATION ---
 
-    def _verify_prediction_common(self, message: str) -> Optional[Dict[str, Any]]:
+    def _verify_prediction_common(self, message: Union[str, ParsedGameMessage]) -> Optional[Dict[str, Any]]:
         """Logique commune de vérification pour les messages et messages édités."""
-        
-        game_num_verification = self.extract_game_number(message)
+        message = self.parse(message)
+        game_num_verification = message.game_number
         if not game_num_verification: return None
 
         game_num_predicted = game_num_verification - 2
@@ -388,7 +631,8 @@ class CardPredictor:
 
             prediction['status'] = 'won'
             self.consecutive_fails = 0 
-            self._save_all_data()
+            self._record_put('predictions', predicted_game)
+            self._record_set('consecutive_fails')
 
             verification_result = {
                 'type': 'edit_message',
@@ -409,7 +653,7 @@ class CardPredictor:
             # Gestion des échecs (Failover)
             if prediction.get('is_inter'):
                 self.is_inter_mode_active = False 
-                self._save_data(self.is_inter_mode_active, 'is_inter_mode_active.json')
+                self._record_set('is_inter_mode_active')
                 if self.active_admin_chat_id:
                      self.telegram_message_sender(self.active_admin_chat_id, "⚠️ **Échec IA** : Mode intelligent désactivé. Revert aux règles statiques.")
             else:
@@ -417,7 +661,8 @@ class CardPredictor:
                 if self.consecutive_fails >= 2:
                     self.analyze_and_set_smart_rules(chat_id=self.active_admin_chat_id, force_activate=True) 
             
-            self._save_all_data()
+            self._record_put('predictions', predicted_game)
+            self._record_set('consecutive_fails')
 
             verification_result = {
                 'type': 'edit_message',
@@ -426,12 +671,14 @@ class CardPredictor:
                 'message_id_to_edit': prediction.get('message_id')
             }
 
+        if verification_result:
+            self._retire_settled()
         return verification_result
 
-    def verify_prediction(self, message: str) -> Optional[Dict[str, Any]]:
+    def verify_prediction(self, message: Union[str, ParsedGameMessage]) -> Optional[Dict[str, Any]]:
         return self._verify_prediction_common(message)
 
-    def verify_prediction_from_edit(self, message: str) -> Optional[Dict[str, Any]]:
+    def verify_prediction_from_edit(self, message: Union[str, ParsedGameMessage]) -> Optional[Dict[str, Any]]:
         return self._verify_prediction_common(message)
     
     # --- FONCTION D'ÉTAT IA (POUR /INTER STATUS) ---
@@ -461,14 +708,14 @@ class CardPredictor:
         for rule in self.smart_rules:
              rules_by_result[rule['result_suit']].append(rule)
 
-        for result_suit in ['❤️', '♣️', '♠️', '♦️']:
+        for result_suit in (Suit.HEARTS, Suit.CLUBS, Suit.SPADES, Suit.DIAMONDS):
             if result_suit in rules_by_result:
                 output += f"🔸 **Pour prédire {result_suit} (N)** :\n"
                 
                 rules = rules_by_result[result_suit]
                 
                 for i, rule in enumerate(rules):
-                    output += f"  • Top {i+1} : **{rule['trigger']}** ({rule['count']}x)\n"
+                    output += f"  • Top {i+1} : **{card_text(rule['trigger'])}** ({rule['count']}x)\n"
                 
                 output += "\n"
         
@@ -1,13 +1,24 @@
 # card_predictor.py
 
-import re
 import logging
 import time
 import os
 import json
+import threading
 from datetime import datetime
-from typing import Optional, Dict, List, Tuple, Any
-from collections import defaultdict
+from typing import Optional, Dict, List, Tuple, Any, Union
+
+from state_journal import StateJournal, OP_SET, OP_PUT, OP_DEL, OP_ADD, OP_APPEND, OP_PRUNE
+from sqlite_store import SQLiteStateStore
+from state_flusher import StateFlusher, snapshot_copy
+from inter_stats import InterColumns, InterDataWindow
+from interval_set import IntervalSet
+from game_ring import GameRing, GameRingSet
+from pending_index import PendingIndex
+from prediction_archive import PredictionArchive, settled_overflow
+from rule_table import compile_rules, normalize_rules, SOURCE_INTER
+from cards import Suit, as_card_id, as_suit, card_suit, card_text, suit_id
+from game_message import GameMessageParser, ParsedGameMessage, GAME_NUMBER_N
 
 logger = logging.getLogger(__name__)
 # Mis à jour à DEBUG pour vous aider à tracer la collecte.
@@ -27,6 +38,53 @@ STATIC_RULES = {
 
 # Symboles pour les status de vérification
 SYMBOL_MAP = {0: '✅0️⃣', 1: '✅1️⃣', 2: '✅2️⃣'}
+# Dernier décalage auquel une prédiction en attente est tranchée (gain jusqu'à 2, perte au-delà)
+VERIFICATION_MAX_OFFSET = 5
+
+# Champs persistés -> fichier du snapshot (la config des canaux reste un fichier à part)
+STATE_FILES = {
+    'predictions': 'predictions.json',
+    'processed_messages': 'processed.json',
+    'last_prediction_time': 'last_prediction_time.json',
+    'last_predicted_game_number': 'last_predicted_game_number.json',
+    'consecutive_fails': 'consecutive_fails.json',
+    'inter_data': 'inter_data.bin',  # Colonnes binaires (InterColumns)
+    'sequential_history': 'sequential_history.json',
+    'is_inter_mode_active': 'inter_mode_status.json',
+    'smart_rules': 'smart_rules.json',
+    'active_admin_chat_id': 'active_admin_chat_id.json',
+    'last_analysis_time': 'last_analysis_time.json',
+    'pending_edits': 'pending_edits.json',
+    'collected_games': 'collected_games.json',
+    'last_daily_reset_date': 'last_daily_reset_date.json',
+}
+
+# Journal des mutations (rejoué au démarrage, compacté toutes les N mutations)
+JOURNAL_FILE = 'state_journal.log'
+JOURNAL_COMPACT_EVERY = int(os.getenv('JOURNAL_COMPACT_EVERY') or 500)
+
+# Backend de persistance : 'json' (snapshot + journal, défaut) ou 'sqlite'
+STATE_BACKEND = (os.getenv('STATE_BACKEND') or 'json').lower()
+STATE_DB_FILE = os.getenv('STATE_DB_FILE') or 'bot_state.sqlite3'
+
+# Écriture différée : lot écrit toutes les N secondes ou après N mutations (0 = synchrone)
+STATE_FLUSH_INTERVAL = float(os.getenv('STATE_FLUSH_INTERVAL') or 0.5)
+STATE_FLUSH_MAX_PENDING = int(os.getenv('STATE_FLUSH_MAX_PENDING') or 50)
+
+# Fenêtre d'apprentissage INTER : N derniers jeux et/ou D derniers jours (0 = illimité),
+# avec décroissance exponentielle optionnelle des compteurs par jeu (1.0 = aucune)
+INTER_WINDOW_GAMES = int(os.getenv('INTER_WINDOW_GAMES') or 10000)
+INTER_WINDOW_DAYS = float(os.getenv('INTER_WINDOW_DAYS') or 0)
+INTER_DECAY = float(os.getenv('INTER_DECAY') or 1.0)
+
+# Derniers jeux gardés pour la collecte N-2 -> N (sequential_history, collected_games) ;
+# augmenter pour analyser des décalages plus longs (minimum 3)
+GAME_HISTORY_SIZE = max(3, int(os.getenv('GAME_HISTORY_SIZE') or 51))
+
+# Prédictions tranchées gardées en mémoire (au moins 1) ; les plus anciennes partent
+# dans l'archive quotidienne compressée (prediction_archive.py)
+PREDICTION_KEEP_SETTLED = max(1, int(os.getenv('PREDICTION_KEEP_SETTLED') or 20))
+PREDICTION_ARCHIVE_DIR = os.getenv('PREDICTION_ARCHIVE_DIR') or 'prediction_archive'
 
 class CardPredictor:
     """Gère la logique de prédiction d'ENSEIGNE (Couleur) et la vérification."""
@@ -38,10 +96,13 @@ class CardPredictor:
         self.HARDCODED_SOURCE_ID = -1002682552255  # <--- ID du canal SOURCE/DÉCLENCHEUR
         self.HARDCODED_PREDICTION_ID = -1003341134749 # <--- ID du canal PRÉDICTION/RÉSULTAT
         # <<<<<<<<<<<<<<<< FIN ZONE CRITIQUE >>>>>>>>>>>>>>>>
+        self.parser = GameMessageParser(GAME_NUMBER_N) # Analyse unique des messages du canal source
+        # Tenu pendant le traitement d'une update et la copie d'un snapshot (flusher)
+        self.lock = threading.RLock()
 
         # --- A. Chargement des Données ---
         self.predictions = self._load_data('predictions.json') 
-        self.processed_messages = self._load_data('processed.json', is_set=True) 
+        self.processed_messages = IntervalSet(self._load_data('processed.json')) # Jeux traités, en intervalles
         self.last_prediction_time = self._load_data('last_prediction_time.json', is_scalar=True) or 0
         self.last_predicted_game_number = self._load_data('last_predicted_game_number.json', is_scalar=True) or 0
         self.consecutive_fails = self._load_data('consecutive_fails.json', is_scalar=True) or 0
@@ -66,12 +127,27 @@ class CardPredictor:
         self.telegram_message_sender = telegram_message_sender
         self.active_admin_chat_id = self._load_data('active_admin_chat_id.json', is_scalar=True)
         
-        self.sequential_history: Dict[int, Dict] = self._load_data('sequential_history.json') 
-        self.inter_data: List[Dict] = self._load_data('inter_data.json') 
+        self.sequential_history = GameRing(GAME_HISTORY_SIZE, self._load_data('sequential_history.json'))
+        self.inter_data = InterDataWindow(INTER_WINDOW_GAMES, INTER_WINDOW_DAYS, INTER_DECAY, self._load_inter_data())
         self.is_inter_mode_active = self._load_data('inter_mode_status.json', is_scalar=True)
         self.smart_rules = self._load_data('smart_rules.json')
         self.last_analysis_time = self._load_data('last_analysis_time.json', is_scalar=True) or 0
-        self.collected_games = self._load_data('collected_games.json', is_set=True)
+        self.collected_games = GameRingSet(GAME_HISTORY_SIZE, self._load_data('collected_games.json'))
+
+        # Rejeu des mutations journalisées depuis le dernier snapshot (ou chargement SQLite)
+        self._store = self._open_store()
+
+        # Prédictions en attente indexées par numéro de jeu de vérification
+        self.pending_index = PendingIndex(VERIFICATION_MAX_OFFSET)
+        self.pending_index.rebuild(self.predictions)
+
+        # Archive des prédictions tranchées (l'état vivant ne garde que les récentes)
+        self.archive = PredictionArchive(os.path.join(os.getcwd(), PREDICTION_ARCHIVE_DIR))
+        self._retire_settled()
+
+        # Compteurs déclencheur -> enseigne, tenus à jour par la fenêtre d'apprentissage
+        self._record_inter_evictions(len(self.inter_data.evict_expired()))
+        self.result_counts = self.inter_data.counts
         
         if self.is_inter_mode_active is None:
             self.is_inter_mode_active = True
@@ -81,6 +157,32 @@ class CardPredictor:
         if self.inter_data and not self.is_inter_mode_active and not self.smart_rules:
              self.analyze_and_set_smart_rules(initial_load=True)
 
+    # --- Table de règles compilée (priorité INTER > STATIQUE résolue à la compilation) ---
+    @property
+    def smart_rules(self) -> List[Dict]:
+        return self._smart_rules
+
+    @smart_rules.setter
+    def smart_rules(self, rules: List[Dict]):
+        # Règles encodées (ids de cartes, Suit) : les anciennes règles en emoji sont converties
+        self._smart_rules = normalize_rules(rules)
+        self._compile_rules()
+
+    @property
+    def is_inter_mode_active(self) -> bool:
+        return self._is_inter_mode_active
+
+    @is_inter_mode_active.setter
+    def is_inter_mode_active(self, active: bool):
+        self._is_inter_mode_active = active
+        self._compile_rules()
+
+    def _compile_rules(self):
+        """Recompile la table de 52 cases ; l'affectation du tuple est atomique."""
+        self._rule_table = compile_rules(getattr(self, '_smart_rules', None),
+                                         STATIC_RULES,
+                                         bool(getattr(self, '_is_inter_mode_active', False)))
+
     # --- Persistance ---
     def _load_data(self, filename: str, is_set: bool = False, is_scalar: bool = False) -> Any:
         try:
@@ -103,6 +205,9 @@ class CardPredictor:
 
     def _save_data(self, data: Any, filename: str):
         try:
+            if isinstance(data, InterColumns):
+                data.write(filename)
+                return
             if isinstance(data, set): data = list(data)
             if filename == 'channels_config.json' and isinstance(data, dict):
                 if 'target_channel_id' in data and data['target_channel_id'] is not None:
@@ -110,26 +215,76 @@ class CardPredictor:
                 if 'prediction_channel_id' in data and data['prediction_channel_id'] is not None:
                     data['prediction_channel_id'] = int(data['prediction_channel_id'])
             
-            with open(filename, 'w') as f: json.dump(data, f, indent=4)
+            # Écriture atomique (fichier temporaire puis renommage)
+            with open(filename + '.tmp', 'w') as f: json.dump(data, f, indent=4)
+            os.replace(filename + '.tmp', filename)
         except Exception as e: logger.error(f"❌ Erreur sauvegarde {filename}: {e}")
 
+    def _load_inter_data(self) -> Union[InterColumns, List[Dict]]:
+        """Colonnes binaires si présentes, sinon l'ancien inter_data.json (converti au prochain snapshot)."""
+        filename = STATE_FILES['inter_data']
+        if os.path.exists(filename):
+            try:
+                return InterColumns.read(filename)
+            except Exception as e:
+                logger.error(f"⚠️ Erreur chargement {filename}: {e}")
+        return self._load_data('inter_data.json')
+
     def _save_all_data(self):
-        self._save_data(self.predictions, 'predictions.json')
-        self._save_data(self.processed_messages, 'processed.json')
-        self._save_data(self.last_prediction_time, 'last_prediction_time.json')
-        self._save_data(self.last_predicted_game_number, 'last_predicted_game_number.json')
-        self._save_data(self.consecutive_fails, 'consecutive_fails.json')
-        self._save_data(self.inter_data, 'inter_data.json')
-        self._save_data(self.sequential_history, 'sequential_history.json')
-        self._save_data(self.is_inter_mode_active, 'inter_mode_status.json')
-        self._save_data(self.smart_rules, 'smart_rules.json')
-        self._save_data(self.active_admin_chat_id, 'active_admin_chat_id.json')
-        self._save_data(self.last_analysis_time, 'last_analysis_time.json')
-        self._save_data(self.pending_edits, 'pending_edits.json')
-        self._save_data(self.collected_games, 'collected_games.json')
-        
-        # NOUVEAU: Sauvegarde de la date de réinitialisation
-        self._save_data(self.last_daily_reset_date, 'last_daily_reset_date.json') 
+        """Demande un snapshot complet de l'état (écrit en arrière-plan, compacte le journal)."""
+        self._store.request_snapshot()
+
+    def flush_state(self):
+        """Force l'écriture immédiate des mutations en attente (arrêt, fin de lot)."""
+        self._store.flush()
+
+    def _capture_state(self) -> Dict[str, Any]:
+        return {field: snapshot_copy(getattr(self, field)) for field in STATE_FILES}
+
+    def _write_snapshot(self, state: Dict[str, Any]):
+        backend = self._store.backend
+        if isinstance(backend, SQLiteStateStore):
+            backend.save_all(state)
+            return
+        for field, value in state.items():
+            self._save_data(value, STATE_FILES[field])
+        backend.reset()
+
+    def _open_store(self) -> StateFlusher:
+        """Ouvre le backend d'état configuré, y charge l'état courant et démarre le flusher."""
+        backend = StateJournal(JOURNAL_FILE, compact_every=JOURNAL_COMPACT_EVERY)
+        if STATE_BACKEND != 'sqlite':
+            backend.replay(self)
+        else:
+            journal, backend = backend, SQLiteStateStore(STATE_DB_FILE)
+            if backend.has_state():
+                backend.replay(self)
+            else:
+                # Première utilisation : migration de l'état JSON (+ journal) vers SQLite
+                journal.replay(self)
+                backend.save_all(self._capture_state())
+                logger.info(f"🗄️ État JSON migré vers SQLite ({STATE_DB_FILE}).")
+
+        return StateFlusher(backend, self._capture_state, self._write_snapshot,
+                            interval=STATE_FLUSH_INTERVAL, max_pending=STATE_FLUSH_MAX_PENDING,
+                            state_lock=self.lock)
+
+    # --- Journalisation des mutations (marquées en mémoire, écrites par lot) ---
+    def _record(self, op: str, field: str, key: Any = None, value: Any = None):
+        self._store.append(op, field, key=key, value=value)
+
+    def _record_set(self, field: str):
+        self._record(OP_SET, field, value=getattr(self, field))
+
+    def _record_put(self, field: str, key: Any):
+        self._record(OP_PUT, field, key=key, value=getattr(self, field)[key])
+
+    def _record_add(self, field: str, value: Any):
+        self._record(OP_ADD, field, value=value)
+
+    def _record_inter_evictions(self, count: int):
+        """Entrées sorties de la fenêtre INTER : les plus anciennes lignes sont supprimées (SQLite)."""
+        if count: self._record(OP_PRUNE, 'inter_data', value=count)
 
     def set_channel_id(self, channel_id: int, channel_type: str):
         if not isinstance(self.config_data, dict): self.config_data = {}
@@ -144,47 +299,37 @@ class CardPredictor:
 
     # --- Outils d'Extraction/Comptage ---
     
-    def _extract_parentheses_content(self, text: str) -> List[str]:
-        """Extrait le contenu de toutes les sections de parenthèses (non incluses)."""
-        pattern = r'\(([^)]+)\)'
-        return re.findall(pattern, text)
+    def parse(self, message: Union[str, ParsedGameMessage]) -> ParsedGameMessage:
+        """Analyse le message en une seule passe (réutilisée si déjà analysé)."""
+        return self.parser.parse(message)
 
-    def _count_cards_in_content(self, content: str) -> int:
-        """Compte les symboles de cartes (♠️, ♥️, ♦️, ♣️) dans une chaîne, en normalisant ❤️ vers ♥️."""
-        normalized_content = content.replace("❤️", "♥️")
-        return len(re.findall(r'(\d+|[AKQJ])(♠️|♥️|♦️|♣️)', normalized_content, re.IGNORECASE))
         
-    def has_pending_indicators(self, text: str) -> bool:
+    def has_pending_indicators(self, text: Union[str, ParsedGameMessage]) -> bool:
         """Vérifie si le message contient des indicateurs suggérant qu'il sera édité (temporaire)."""
-        indicators = ['⏰', '▶', '🕐', '➡️']
-        return any(indicator in text for indicator in indicators)
+        return self.parse(text).has_pending
 
-    def has_completion_indicators(self, text: str) -> bool:
+    def has_completion_indicators(self, text: Union[str, ParsedGameMessage]) -> bool:
         """Vérifie si le message contient des indicateurs de complétion après édition (✅ ou 🔰)."""
-        completion_indicators = ['✅', '🔰']
-        return any(indicator in text for indicator in completion_indicators)
+        return self.parse(text).has_completion
         
-    def is_final_result_structurally_valid(self, text: str) -> bool:
+    def is_final_result_structurally_valid(self, text: Union[str, ParsedGameMessage]) -> bool:
         """
         Vérifie si la structure du message correspond à un format de résultat final connu.
         Gère les messages #T, #R et les formats édités basés sur le compte de cartes.
         """
-        matches = self._extract_parentheses_content(text)
-        num_sections = len(matches)
+        parsed = self.parse(text)
+        num_sections = len(parsed.groups)
 
         if num_sections < 2: return False
 
         # Règle pour les messages finalisés (#T) ou normaux (#R)
-        if ('#T' in text or '🔵#R' in text) and num_sections >= 2:
+        if parsed.has_final_tag and num_sections >= 2:
             return True
 
         # Messages Édités (basé sur le compte de cartes)
         if num_sections == 2:
-            content_1 = matches[0]
-            content_2 = matches[1]
-            
-            count_1 = self._count_cards_in_content(content_1)
-            count_2 = self._count_cards_in_content(content_2)
+            count_1 = len(parsed.groups[0])
+            count_2 = len(parsed.groups[1])
 
             # Formats acceptés: 3/2, 3/3, 2/3 (3 cartes dans le premier groupe sont supportées)
             if (count_1 == 3 and count_2 == 2) or \
@@ -195,87 +340,69 @@ class CardPredictor:
         return False
         
     # --- Outils d'Extraction (Continuation) ---
-    def extract_game_number(self, message: str) -> Optional[int]:
-        match = re.search(r'#N(\d+)\.', message, re.IGNORECASE) 
-        if not match: match = re.search(r'🔵(\d+)🔵', message)
-        return int(match.group(1)) if match else None
-
-    def extract_card_details(self, content: str) -> List[Tuple[str, str]]:
-        # Normalise ♥️ en ❤️
-        normalized_content = content.replace("♥️", "❤️")
-        # Cherche Valeur + Enseigne (ex: 10♦️, A♠️)
-        return re.findall(r'(\d+|[AKQJ])(♠️|❤️|♦️|♣️)', normalized_content, re.IGNORECASE)
-
-    def get_first_card_info(self, message: str) -> Optional[Tuple[str, str]]:
+    def extract_game_number(self, message: Union[str, ParsedGameMessage]) -> Optional[int]:
+        return self.parse(message).game_number
+
+    def get_first_card_info(self, message: Union[str, ParsedGameMessage]) -> Optional[Tuple[str, str]]:
         """
         Retourne la PREMIÈRE carte du PREMIER groupe (déclencheur INTER/STATIQUE).
         """
-        match = re.search(r'\(([^)]*)\)', message)
-        if not match: return None
-        
-        details = self.extract_card_details(match.group(1))
-        if details:
-            v, c = details[0]
-            if c == "❤️": c = "♥️" 
-            return f"{v.upper()}{c}", c 
-        return None
+        first_card = self.parse(message).first_card
+        if first_card is None: return None
+        return card_text(first_card), card_suit(first_card).emoji
     
-    def get_all_cards_in_first_group(self, message: str) -> List[str]:
+    def get_all_cards_in_first_group(self, message: Union[str, ParsedGameMessage]) -> List[str]:
         """
         Retourne TOUTES les cartes du PREMIER groupe pour la vérification.
         """
-        match = re.search(r'\(([^)]*)\)', message)
-        if not match: return []
-        
-        details = self.extract_card_details(match.group(1))
-        cards = []
-        for v, c in details:
-            normalized_c = "♥️" if c == "❤️" else c
-            cards.append(f"{v.upper()}{normalized_c}")
-        return cards
+        return [card_text(cid) for cid in self.parse(message).first_group]
         
     # --- Logique INTER (Collecte et Analyse) ---
-    def collect_inter_data(self, game_number: int, message: str):
+    def collect_inter_data(self, game_number: int, message: Union[str, ParsedGameMessage]):
         """Collecte les données (N-2 -> N) même sur messages temporaires (⏰)."""
-        info = self.get_first_card_info(message)
-        if not info: return
+        full_card = self.parse(message).first_card
+        if full_card is None: return
         
-        full_card, suit = info
-        result_suit_normalized = suit.replace("❤️", "♥️")
+        result_suit = card_suit(full_card)
         
         # Vérifier si déjà dans collected_games
         if game_number in self.collected_games:
             existing_data = self.sequential_history.get(game_number)
-            if existing_data and existing_data.get('carte') == full_card:
+            existing_card = as_card_id(existing_data.get('carte')) if existing_data else None
+            if existing_card == full_card:
                 logger.debug(f"🧠 Jeu {game_number} déjà collecté, ignoré.")
                 return
             else:
                 # Mise à jour de la carte (cas rare mais possible)
-                logger.info(f"🧠 Jeu {game_number} mis à jour: {existing_data.get('carte') if existing_data else 'N/A'} -> {full_card}")
-                self.inter_data = [e for e in self.inter_data if e.get('numero_resultat') != game_number]
+                logger.info(f"🧠 Jeu {game_number} mis à jour: {card_text(existing_card) if existing_card is not None else 'N/A'} -> {card_text(full_card)}")
+                self.inter_data.remove_where(lambda e: e.get('numero_resultat') == game_number)
+                self._record_set('inter_data')
 
-        self.sequential_history[game_number] = {'carte': full_card, 'date': datetime.now().isoformat()}
-        self.collected_games.add(game_number)
+        # Anneau : le jeu N - GAME_HISTORY_SIZE est évincé
+        evicted = self.sequential_history.put(game_number, {'carte': full_card, 'date': datetime.now().isoformat()})
+        evicted_collected = self.collected_games.add(game_number)
         
         n_minus_2 = game_number - 2
         trigger_entry = self.sequential_history.get(n_minus_2)
+        trigger_card = as_card_id(trigger_entry['carte']) if trigger_entry else None
         
-        if trigger_entry:
-            trigger_card = trigger_entry['carte']
-            self.inter_data.append({
+        if trigger_card is not None:
+            expired = self.inter_data.evict_expired()
+            evicted_entry = self.inter_data.append({
                 'numero_resultat': game_number,
                 'declencheur': trigger_card, 
                 'numero_declencheur': n_minus_2,
-                'result_suit': result_suit_normalized, 
+                'result_suit': int(result_suit), 
                 'date': datetime.now().isoformat()
             })
-            logger.info(f"🧠 Jeu {game_number} collecté pour INTER: {trigger_card} -> {result_suit_normalized}")
+            self._record_inter_evictions(len(expired) + (evicted_entry is not None))
+            self._record(OP_APPEND, 'inter_data', value=self.inter_data[-1])
+            logger.info(f"🧠 Jeu {game_number} collecté pour INTER: {card_text(trigger_card)} -> {result_suit}")
 
-        limit = game_number - 50
-        self.sequential_history = {k:v for k,v in self.sequential_history.items() if k >= limit}
-        self.collected_games = {g for g in self.collected_games if g >= limit}
-        
-        self._save_all_data()
+        self._record_put('sequential_history', game_number)
+        self._record_add('collected_games', game_number)
+        if evicted is not None: self._record(OP_DEL, 'sequential_history', key=evicted)
+        if evicted_collected is not None: self._record(OP_DEL, 'collected_games', key=evicted_collected)
 
     
     def analyze_and_set_smart_rules(self, chat_id: int = None, initial_load: bool = False, force_activate: bool = False):
@@ -283,42 +410,27 @@ class CardPredictor:
         Analyse les données pour trouver les Top 2 déclencheurs par ENSEIGNE DE RÉSULTAT.
         Crée des règles même avec peu de données (minimum 1 occurrence).
         """
-        # Grouper par enseigne de RÉSULTAT (♠️, ♥️, ♦️, ♣️)
-        result_suit_groups = defaultdict(lambda: defaultdict(int))
-        
-        for entry in self.inter_data:
-            trigger_card = entry['declencheur']  # Ex: 6♦️
-            result_suit = entry['result_suit']   # Ex: ♣️
-            
-            # Compter combien de fois ce déclencheur mène à cette enseigne de résultat
-            result_suit_groups[result_suit][trigger_card] += 1
-        
-        self.smart_rules = []
+        new_smart_rules = []
         
         # Pour chaque enseigne de résultat (♠️, ♥️, ♦️, ♣️)
-        for result_suit in ['♠️', '♥️', '♦️', '♣️']:
-            result_normalized = "❤️" if result_suit == "♥️" else result_suit
-            
-            triggers_for_this_suit = result_suit_groups.get(result_suit, {})
+        for result_suit in Suit:
+            # Compteurs tenus à jour par collect_inter_data : jusqu'à 2 meilleurs (même avec 1 seule occurrence)
+            top_triggers = self.result_counts.top(result_suit, 2)
             
-            if not triggers_for_this_suit:
+            if not top_triggers:
                 continue
             
-            # Trier par fréquence et prendre jusqu'à 2 meilleurs (même avec 1 seule occurrence)
-            top_triggers = sorted(
-                triggers_for_this_suit.items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:2]
-            
             for trigger_card, count in top_triggers:
-                self.smart_rules.append({
+                new_smart_rules.append({
                     'trigger': trigger_card,
-                    'predict': result_normalized,
+                    'predict': result_suit,
                     'count': count,
-                    'result_suit': result_normalized  # Pour affichage
+                    'result_suit': result_suit  # Pour affichage
                 })
         
+        # Remplacement atomique des règles (recompile la table)
+        self.smart_rules = new_smart_rules
+        
         # Activer le mode INTER si on a au moins 1 règle
         if force_activate:
             self.is_inter_mode_active = True
@@ -330,7 +442,10 @@ class CardPredictor:
             self.is_inter_mode_active = False
             
         self.last_analysis_time = time.time()
-        self._save_all_data()
+        self._record_set('smart_rules')
+        self._record_set('is_inter_mode_active')
+        self._record_set('active_admin_chat_id')
+        self._record_set('last_analysis_time')
 
         logger.info(f"🧠 Analyse terminée. Règles trouvées: {len(self.smart_rules)}. Mode actif: {self.is_inter_mode_active}")
         
@@ -374,8 +489,10 @@ class CardPredictor:
                 logger.info("⏰ Réinitialisation QUOTIDIENNE du stock de prédictions (après 00h59 WAT).")
                 
                 # --- RÉINITIALISATION DES STOCKS DE PRÉDICTIONS EN COURS ---
+                self._archive_batch(self.predictions)
                 self.predictions = {}
-                self.processed_messages = set() 
+                self.pending_index.clear()
+                self.processed_messages.clear()
                 self.pending_edits = {}
                 self.last_prediction_time = 0
                 
@@ -395,29 +512,55 @@ class CardPredictor:
             logger.error(f"❌ Erreur lors de la réinitialisation quotidienne (00h59): {e}")
 
 
+    # --- ARCHIVE DES PRÉDICTIONS TRANCHÉES ---
+    def _archive_day(self) -> str:
+        """Journée de prédiction en cours (celle du dernier reset), date du jour à défaut."""
+        return self.last_daily_reset_date or datetime.now().strftime("%Y-%m-%d")
+
+    def _archive_batch(self, predictions: Dict[int, Dict]) -> bool:
+        """Ajoute des prédictions au segment du jour ; False si l'archive n'a pas pu être écrite."""
+        if not predictions: return True
+        try:
+            self.archive.append(self._archive_day(), predictions)
+            return True
+        except OSError as e:
+            logger.error(f"❌ Archivage des prédictions impossible : {e}")
+            return False
+
+    def _retire_settled(self):
+        """Sort de l'état vivant les prédictions tranchées au-delà des PREDICTION_KEEP_SETTLED plus récentes."""
+        games = settled_overflow(self.predictions, PREDICTION_KEEP_SETTLED)
+        if not games or not self._archive_batch({game: self.predictions[game] for game in games}): return
+        for game in games:
+            del self.predictions[game]
+            self._record(OP_DEL, 'predictions', key=game)
+
+
     # --- CŒUR DU SYSTÈME : PRÉDICTION ---
     
-    def should_wait_for_edit(self, text: str, message_id: int) -> bool:
-        if self.has_pending_indicators(text):
-            game_number = self.extract_game_number(text)
+    def should_wait_for_edit(self, text: Union[str, ParsedGameMessage], message_id: int) -> bool:
+        parsed = self.parse(text)
+        if parsed.has_pending:
+            game_number = parsed.game_number
             if message_id not in self.pending_edits:
                 self.pending_edits[message_id] = {
                     'game_number': game_number,
-                    'original_text': text,
+                    'original_text': parsed.text,
                     'timestamp': datetime.now().isoformat()
                 }
-                self._save_data(self.pending_edits, 'pending_edits.json')
+                self._record_put('pending_edits', message_id)
             return True
         return False
 
-    def should_predict(self, message: str) -> Tuple[bool, Optional[int], Optional[str]]:
+    def should_predict(self, message: Union[str, ParsedGameMessage]) -> Tuple[bool, Optional[int], Optional[Suit]]:
         
         # Le reset du stock de prédictions se produit une fois que 00h59 est passé (à 01hxx)
         self._daily_reset_stocks_at_00h59() 
         
         self.check_and_update_rules()
         
-        game_number = self.extract_game_number(message)
+        parsed = self.parse(message)
+        game_number = parsed.game_number
         if not game_number: return False, None, None
         
         # Règle : Ecart de 3 jeux
@@ -425,24 +568,16 @@ class CardPredictor:
             return False, None, None
             
         # 3. Décision
-        info = self.get_first_card_info(message)
-        if not info: return False, None, None
-        first_card, _ = info 
+        first_card = parsed.first_card
+        if first_card is None: return False, None, None
         
         predicted_suit = None
 
-        # A. PRIORITÉ 1 : MODE INTER
-        if self.is_inter_mode_active and self.smart_rules:
-            for rule in self.smart_rules:
-                if rule['trigger'] == first_card:
-                    predicted_suit = rule['predict']
-                    logger.info(f"🔮 INTER: Déclencheur {first_card} -> Prédit {predicted_suit}")
-                    break
-            
-        # B. PRIORITÉ 2 : MODE STATIQUE
-        if not predicted_suit and first_card in STATIC_RULES:
-            predicted_suit = STATIC_RULES[first_card]
-            logger.info(f"🔮 STATIQUE: Déclencheur {first_card} -> Prédit {predicted_suit}")
+        # Table compilée : INTER (si actif) prioritaire sur STATIQUE, un seul accès indexé
+        rule = self._rule_table[first_card]
+        if rule:
+            predicted_suit, source = rule
+            logger.info(f"🔮 {'INTER' if source == SOURCE_INTER else 'STATIQUE'}: Déclencheur {card_text(first_card)} -> Prédit {predicted_suit}")
 
         if predicted_suit:
             if self.last_prediction_time and time.time() < self.last_prediction_time + self.prediction_cooldown:
@@ -452,13 +587,16 @@ class CardPredictor:
 
         return False, None, None
 
-    def prepare_prediction_text(self, game_number_source: int, predicted_costume: str) -> str:
+    def prepare_prediction_text(self, game_number_source: int, predicted_costume: Suit) -> str:
         target_game = game_number_source + 2
         return f"🔵{target_game}🔵:Enseigne {predicted_costume} statut :⏳"
 
 
-    def make_prediction(self, game_number_source: int, suit: str, message_id_bot: int):
+    def make_prediction(self, game_number_source: int, suit: Suit, message_id_bot: Optional[int] = None) -> int:
+        """Enregistre la prédiction N+2 (avant l'envoi : l'écart et le cooldown la voient aussitôt)."""
         target = game_number_source + 2
+        # La prédiction publiée garde l'emoji (texte du message Telegram)
+        suit = str(as_suit(suit))
         txt = self.prepare_prediction_text(game_number_source, suit)
         
         self.predictions[target] = {
@@ -470,48 +608,64 @@ class CardPredictor:
             'is_inter': self.is_inter_mode_active
         }
         
+        self.pending_index.add(target)
+        
         self.last_prediction_time = time.time()
         self.last_predicted_game_number = game_number_source
         self.consecutive_fails = 0
-        self._save_all_data()
+        self._record_put('predictions', target)
+        self._record_set('last_prediction_time')
+        self._record_set('last_predicted_game_number')
+        self._record_set('consecutive_fails')
+        return target
+
+    def set_prediction_message_id(self, game: int, message_id: int):
+        """Callback d'envoi (thread d'envoi) : mémorise le message de la prédiction pour l'éditer ensuite."""
+        with self.lock:
+            prediction = self.predictions.get(game)
+            if prediction is None: return
+            prediction['message_id'] = message_id
+            self._record_put('predictions', game)
 
     # --- VERIFICATION LOGIQUE ---
 
-    def verify_prediction(self, message: str) -> Optional[Dict]:
+    def verify_prediction(self, message: Union[str, ParsedGameMessage]) -> Optional[Dict]:
         """Vérifie une prédiction (message normal)"""
         return self._verify_prediction_common(message, is_edited=False)
 
-    def verify_prediction_from_edit(self, message: str) -> Optional[Dict]:
+    def verify_prediction_from_edit(self, message: Union[str, ParsedGameMessage]) -> Optional[Dict]:
         """Vérifie une prédiction (message édité)"""
         return self._verify_prediction_common(message, is_edited=True)
 
-    def check_costume_in_first_parentheses(self, message: str, predicted_costume: str) -> bool:
+    def check_costume_in_first_parentheses(self, message: Union[str, ParsedGameMessage], predicted_costume: str) -> bool:
         """Vérifie si le costume prédit apparaît dans le PREMIER parenthèses"""
         # Récupérer TOUTES les cartes du premier groupe
-        all_cards = self.get_all_cards_in_first_group(message)
+        first_group = self.parse(message).first_group
         
-        if not all_cards:
+        if not first_group:
             logger.debug("🎯 Aucune carte trouvée dans le premier groupe")
             return False
         
+        all_cards = [card_text(cid) for cid in first_group]
         # Log pour montrer toutes les cartes vues
         logger.info(f"🎯 Vérification: {len(all_cards)} carte(s) dans premier groupe: {', '.join(all_cards)}")
         
-        # Normaliser le costume prédit
-        normalized_costume = predicted_costume.replace("❤️", "♥️")
+        # Comparaison sur l'index canonique de l'enseigne (❤️ et ♥️ confondus)
+        target_suit = suit_id(predicted_costume)
         
         # Vérifier si au moins UNE carte du groupe a le costume prédit
-        for card in all_cards:
-            if card.endswith(normalized_costume):
-                logger.info(f"✅ Costume {normalized_costume} trouvé dans carte {card}")
+        for cid, card in zip(first_group, all_cards):
+            if card_suit(cid) == target_suit:
+                logger.info(f"✅ Costume {predicted_costume} trouvé dans carte {card}")
                 return True
         
-        logger.debug(f"❌ Costume {normalized_costume} non trouvé dans {', '.join(all_cards)}")
+        logger.debug(f"❌ Costume {predicted_costume} non trouvé dans {', '.join(all_cards)}")
         return False
 
-    def _verify_prediction_common(self, message: str, is_edited: bool = False) -> Optional[Dict]:
+    def _verify_prediction_common(self, message: Union[str, ParsedGameMessage], is_edited: bool = False) -> Optional[Dict]:
         """Logique de vérification commune - UNIQUEMENT pour messages finalisés."""
-        game_number = self.extract_game_number(message)
+        message = self.parse(message)
+        game_number = message.game_number
         if not game_number: return None
         
         # Validation Structurelle
@@ -519,19 +673,21 @@ class CardPredictor:
         
         if not is_structurally_valid: return None
 
-        if not self.predictions: return None
+        # Seules les prédictions en attente tranchables par ce jeu (offsets 0..VERIFICATION_MAX_OFFSET)
+        candidates = self.pending_index.candidates(game_number)
+        if not candidates: return None
         
         verification_result = None
 
         # --- ÉTAPE 3 : Vérification du gain/perte ---
-        for predicted_game in sorted(self.predictions.keys()):
-            prediction = self.predictions[predicted_game]
+        for predicted_game in candidates:
+            prediction = self.predictions.get(predicted_game)
 
-            if prediction.get('status') != 'pending': continue
+            if not prediction or prediction.get('status') != 'pending':
+                self.pending_index.discard(predicted_game)
+                continue
 
             verification_offset = game_number - predicted_game
-            
-            if verification_offset < 0 or verification_offset > 5: continue
 
             predicted_costume = prediction.get('predicted_costume')
             if not predicted_costume: continue
@@ -546,8 +702,10 @@ class CardPredictor:
                 prediction['status'] = 'won'
                 prediction['verification_count'] = verification_offset
                 prediction['final_message'] = updated_message
+                self.pending_index.discard(predicted_game)
                 self.consecutive_fails = 0
-                self._save_all_data()
+                self._record_put('predictions', predicted_game)
+                self._record_set('consecutive_fails')
 
                 verification_result = {
                     'type': 'edit_message',
@@ -564,6 +722,7 @@ class CardPredictor:
 
                 prediction['status'] = 'lost'
                 prediction['final_message'] = updated_message
+                self.pending_index.discard(predicted_game)
                 
                 if prediction.get('is_inter'):
                     self.is_inter_mode_active = False 
@@ -574,7 +733,9 @@ class CardPredictor:
                         self.analyze_and_set_smart_rules(force_activate=True) 
                         logger.info("⚠️ 2 Échecs Statiques : Activation automatique INTER.")
                 
-                self._save_all_data()
+                self._record_put('predictions', predicted_game)
+                self._record_set('consecutive_fails')
+                self._record_set('is_inter_mode_active')
 
                 verification_result = {
                     'type': 'edit_message',
@@ -584,6 +745,8 @@ class CardPredictor:
                 }
                 break 
 
+        if verification_result:
+            self._retire_settled()
         return verification_result
 
 # Global instance
@@ -0,0 +1,96 @@
+# cards.py
+
+"""
+Identifiants canoniques des 52 cartes.
+
+id = index_valeur * 4 + index_enseigne, quelle que soit la graphie de la carte
+(avec ou sans sélecteur de variante U+FE0F, cœur ❤️ ou ♥️).
+
+CardPredictor ne manipule que ces entiers (cartes) et `Suit` (enseignes) :
+les comparaisons sont des comparaisons d'entiers, et l'emoji n'est produit
+qu'à la sortie (messages Telegram, affichages, exports).
+"""
+from enum import IntEnum
+from functools import lru_cache
+from typing import Any, Optional
+
+RANKS = ('A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K')
+SUITS = ('♠️', '❤️', '♦️', '♣️')  # Rendu canonique des enseignes
+CARD_COUNT = len(RANKS) * len(SUITS)
+
+_RANK_INDEX = {rank: i for i, rank in enumerate(RANKS)}
+_SUIT_INDEX = {'♠': 0, '♥': 1, '❤': 1, '♦': 2, '♣': 3}
+
+
+class Suit(IntEnum):
+    """Enseigne canonique ; se rend en emoji dans les f-strings."""
+    SPADES = 0
+    HEARTS = 1
+    DIAMONDS = 2
+    CLUBS = 3
+
+    @property
+    def emoji(self) -> str:
+        return SUITS[self]
+
+    def __str__(self) -> str:
+        return SUITS[self]
+
+    def __format__(self, spec: str) -> str:
+        return format(SUITS[self], spec)
+
+
+# Rendus pré-calculés : aucune allocation de chaîne à l'affichage
+_CARD_TEXTS = tuple(f"{rank}{suit}" for rank in RANKS for suit in SUITS)
+_SUITS_BY_INDEX = tuple(Suit)
+_CARD_SUITS = tuple(_SUITS_BY_INDEX[i % len(SUITS)] for i in range(CARD_COUNT))
+
+
+@lru_cache(maxsize=512)
+def suit_id(suit: str) -> Optional[int]:
+    """Index canonique d'une enseigne (♠️=0, ❤️/♥️=1, ♦️=2, ♣️=3)."""
+    suit = suit.replace('\ufe0f', '').strip()
+    return _SUIT_INDEX.get(suit[-1]) if suit else None
+
+
+@lru_cache(maxsize=1024)
+def card_id(card: str) -> Optional[int]:
+    """Identifiant 0..51 d'une carte textuelle ('10♦️', 'A♥️', 'K♠'...), ou None."""
+    card = card.replace('\ufe0f', '').strip()
+    if len(card) < 2: return None
+    return card_id_from_parts(card[:-1], card[-1])
+
+
+def card_id_from_parts(rank: str, suit: str) -> Optional[int]:
+    """Identifiant à partir de la valeur et du symbole d'enseigne déjà séparés (analyseur)."""
+    rank_index = _RANK_INDEX.get(rank.upper())
+    suit_index = _SUIT_INDEX.get(suit)
+    if rank_index is None or suit_index is None: return None
+    return rank_index * 4 + suit_index
+
+
+def as_card_id(value: Any) -> Optional[int]:
+    """
+    Identifiant d'une carte déjà encodée (int), relue d'une colonne SQLite TEXT ('38')
+    ou d'une ancienne valeur persistée ('10♦️').
+    """
+    if isinstance(value, str):
+        if not value.isdigit(): return card_id(value)
+        value = int(value)
+    return value if isinstance(value, int) and 0 <= value < CARD_COUNT else None
+
+
+def as_suit(value: Any) -> Optional[Suit]:
+    """Enseigne déjà encodée (int, '1') ou ancienne valeur persistée ('♥️')."""
+    if isinstance(value, str):
+        value = int(value) if value.isdigit() else suit_id(value)
+    return _SUITS_BY_INDEX[value] if isinstance(value, int) and 0 <= value < len(SUITS) else None
+
+
+def card_suit(cid: int) -> Suit:
+    return _CARD_SUITS[cid]
+
+
+def card_text(cid: int) -> str:
+    """Rendu canonique d'un identifiant de carte."""
+    return _CARD_TEXTS[cid]
@@ -0,0 +1,184 @@
+# channel_shards.py
+
+"""
+Plusieurs paires canal source -> canal de prédiction dans un même processus.
+
+Chaque paire est servie par son propre CardPredictor (un « shard ») dont
+l'état vit dans SHARD_STATE_ROOT/<nom> : prédictions, collecte INTER, règles
+apprises, journal et archive sont isolés d'une table de jeu à l'autre. Les
+updates sont routées par chat id avec une seule recherche dans un dict.
+
+Configuration (au choix) :
+- CHANNEL_PAIRS="source:prédiction[:nom[:admin]],..." (ex: "-1001:-1002:table1:123,-1003:-1004") ;
+- fichier JSON CHANNEL_PAIRS_FILE (défaut channel_pairs.json) :
+  [{"name": "table1", "source": -1001, "prediction": -1002, "admin": 123}, ...]
+
+Les commandes admin visent le shard du chat d'où elles viennent ; un dernier
+argument peut nommer le shard (nom ou canal source : `/stat table1`,
+`/inter status -1001`), indispensable quand un chat admin sert plusieurs shards.
+
+Sans configuration, seul le predictor par défaut (état dans le répertoire
+courant, canaux choisis par /config) tourne, comme avant.
+"""
+import json
+import logging
+import os
+import re
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from card_predictor import CardPredictor
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+CHANNEL_PAIRS = os.getenv('CHANNEL_PAIRS') or ''
+CHANNEL_PAIRS_FILE = os.getenv('CHANNEL_PAIRS_FILE') or 'channel_pairs.json'
+SHARD_STATE_ROOT = os.getenv('SHARD_STATE_ROOT') or 'shards'
+
+_SHARD_NAME = re.compile(r'^[A-Za-z0-9_.-]+$')
+_CHAT_ID = re.compile(r'^-?\d+$')
+
+
+class ChannelPair(NamedTuple):
+    """Une table de jeu : canal source, canal de prédiction et chat admin optionnel."""
+    name: str
+    source: int
+    prediction: int
+    admin: Optional[int] = None
+
+
+def _pair(name: Optional[str], source, prediction, admin=None) -> ChannelPair:
+    source, prediction = int(source), int(prediction)
+    name = str(name or source)
+    if not _SHARD_NAME.match(name):
+        raise ValueError(f"Nom de shard invalide : {name!r} (lettres, chiffres, '_', '-', '.')")
+    return ChannelPair(name, source, prediction, int(admin) if admin not in (None, '') else None)
+
+
+def parse_channel_pairs(spec: str) -> List[ChannelPair]:
+    """
+    Paires depuis "source:prédiction[:nom[:admin]],..." (le nom par défaut est l'id
+    source ; "source:prédiction::admin" garde ce nom par défaut).
+    """
+    pairs = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item: continue
+        # Les ids de canaux sont négatifs : le séparateur est ':' (jamais '-')
+        parts = item.split(':')
+        if len(parts) not in (2, 3, 4):
+            raise ValueError(f"Paire de canaux invalide : {item!r} (attendu source:prédiction[:nom[:admin]])")
+        parts += [None] * (4 - len(parts))
+        pairs.append(_pair(parts[2], parts[0], parts[1], parts[3]))
+    return pairs
+
+
+def load_channel_pairs(spec: str = CHANNEL_PAIRS, path: str = CHANNEL_PAIRS_FILE) -> List[ChannelPair]:
+    """Paires configurées (variable d'environnement, sinon fichier JSON), sources et noms uniques."""
+    if spec:
+        pairs = parse_channel_pairs(spec)
+    elif os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            pairs = [_pair(p.get('name'), p['source'], p['prediction'], p.get('admin')) for p in json.load(f)]
+    else:
+        return []
+
+    sources, names = set(), set()
+    for pair in pairs:
+        if pair.source in sources: raise ValueError(f"Canal source configuré deux fois : {pair.source}")
+        if pair.name in names: raise ValueError(f"Nom de shard configuré deux fois : {pair.name}")
+        sources.add(pair.source)
+        names.add(pair.name)
+    return pairs
+
+
+class ShardRouter:
+    """
+    Routage chat id -> CardPredictor. Les canaux sources des shards sont dans un
+    dict ; le predictor par défaut garde son canal source réglable par /config.
+    """
+
+    def __init__(self, default: CardPredictor, shards: Optional[Dict[str, CardPredictor]] = None):
+        self.default = default
+        self.shards = dict(shards or {})
+        self._by_source: Dict[int, CardPredictor] = {}
+        self._by_chat: Dict[int, CardPredictor] = {}
+        # Chats (admin surtout) rattachés à plusieurs shards : nom de ces shards
+        self._shared_chats: Dict[int, List[str]] = {}
+        self.rebuild()
+
+    @classmethod
+    def open(cls, default: CardPredictor, pairs: Iterable[ChannelPair], factory: Callable[[str], CardPredictor],
+             root: str = SHARD_STATE_ROOT) -> 'ShardRouter':
+        """Crée un shard par paire (état dans root/<nom>) et fixe ses canaux."""
+        shards = {}
+        for pair in pairs:
+            predictor = factory(os.path.join(os.getcwd(), root, pair.name))
+            with predictor.exclusive():
+                for channel_type, chat_id in (('source', pair.source), ('prediction', pair.prediction), ('admin', pair.admin)):
+                    if chat_id is not None and predictor.channels_config.get(channel_type) != chat_id:
+                        predictor.set_channel_id(chat_id, channel_type)
+            shards[pair.name] = predictor
+            logger.info(f"🧩 Shard {pair.name} : source {pair.source} -> prédiction {pair.prediction}")
+        return cls(default, shards)
+
+    def rebuild(self) -> None:
+        """Recalcule les tables de routage (après un changement de canal par /config)."""
+        self._by_source = {p.target_channel_id: p for p in self.shards.values() if p.target_channel_id}
+        self._by_chat = {}
+        names_by_chat: Dict[int, List[str]] = {}
+        for name, predictor in self.shards.items():
+            for chat_id in {predictor.target_channel_id, predictor.prediction_channel_id, predictor.active_admin_chat_id}:
+                if not chat_id: continue
+                self._by_chat.setdefault(chat_id, predictor)
+                names_by_chat.setdefault(chat_id, []).append(name)
+        self._shared_chats = {chat_id: names for chat_id, names in names_by_chat.items() if len(names) > 1}
+        if self.default.target_channel_id in self._by_source:
+            logger.warning(f"⚠️ Canal source {self.default.target_channel_id} servi par un shard, pas par le predictor par défaut.")
+
+    def for_source(self, chat_id: int) -> Optional[CardPredictor]:
+        """Predictor du canal source `chat_id` (None si ce n'est pas un canal source)."""
+        predictor = self._by_source.get(chat_id)
+        if predictor is None and chat_id == self.default.target_channel_id:
+            return self.default
+        return predictor
+
+    def for_chat(self, chat_id: int) -> CardPredictor:
+        """Predictor concerné par une commande venant de `chat_id` (défaut sinon)."""
+        return self._by_chat.get(chat_id, self.default)
+
+    def resolve(self, ref: str) -> Optional[CardPredictor]:
+        """Shard désigné par son nom ou par son canal source (None si rien ne correspond)."""
+        predictor = self.shards.get(ref)
+        if predictor is None and _CHAT_ID.match(ref):
+            predictor = self.for_source(int(ref))
+        return predictor
+
+    def for_command(self, chat_id: int, args: List[str]) -> Tuple[CardPredictor, List[str]]:
+        """
+        Predictor visé par une commande admin et ses arguments restants : le dernier
+        argument peut nommer le shard, sinon c'est celui du chat (for_chat).
+        """
+        if args:
+            predictor = self.resolve(args[-1])
+            if predictor is not None: return predictor, args[:-1]
+        return self.for_chat(chat_id), args
+
+    def shards_sharing(self, chat_id: int) -> List[str]:
+        """Noms des shards rattachés à ce chat quand il y en a plusieurs (sinon liste vide)."""
+        return self._shared_chats.get(chat_id, [])
+
+    def name_of(self, predictor: CardPredictor) -> str:
+        for name, shard in self.shards.items():
+            if shard is predictor: return name
+        return 'défaut'
+
+    def predictors(self) -> List[CardPredictor]:
+        return [self.default] + list(self.shards.values())
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    def flush_state(self) -> None:
+        for predictor in self.predictors():
+            predictor.flush_state()
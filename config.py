@@ -38,6 +38,12 @@ class Config:
         
         # Mode Debug
         self.DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
+
+        # Webhook à acquittement immédiat : les updates sont traitées par un consommateur en file
+        self.WEBHOOK_ASYNC = os.getenv('WEBHOOK_ASYNC', 'False').lower() == 'true'
+        self.UPDATE_QUEUE_MAXSIZE = int(os.getenv('UPDATE_QUEUE_MAXSIZE') or 10000)
+        # Workers de traitement : > 1 répartit les canaux par chat id (ordre strict par canal)
+        self.UPDATE_WORKERS = max(1, int(os.getenv('UPDATE_WORKERS') or 1))
         
         # Validation finale
         self._validate_config()
@@ -91,7 +97,9 @@ class Config:
             f"  PORT: {self.PORT},\n"
             f"  TARGET_CHANNEL_ID: {self.TARGET_CHANNEL_ID},\n"
             f"  PREDICTION_CHANNEL_ID: {self.PREDICTION_CHANNEL_ID},\n"
-            f"  DEBUG: {self.DEBUG}\n"
+            f"  DEBUG: {self.DEBUG},\n"
+            f"  WEBHOOK_ASYNC: {self.WEBHOOK_ASYNC},\n"
+            f"  UPDATE_WORKERS: {self.UPDATE_WORKERS}\n"
             f")"
 )
         
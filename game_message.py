@@ -0,0 +1,86 @@
+# game_message.py
+
+"""
+Analyse en une seule passe d'un message du canal source.
+
+Les motifs sont compilés une fois pour toutes ; le résultat est un objet
+immuable (numéro de jeu, groupes de cartes entre parenthèses sous forme
+d'identifiants canoniques, indicateurs ⏰/✅/🔰) transmis à toutes les étapes
+de CardPredictor (collecte, prédiction, vérification).
+"""
+import re
+from typing import NamedTuple, Optional, Pattern, Sequence, Tuple, Union
+
+from cards import card_id_from_parts
+
+# Numéros de jeu : chaque prédicteur a son propre format de canal source
+GAME_NUMBER_TRB = (re.compile(r'#T(\d+)|#R(\d+)|🔵(\d+)🔵'),)
+GAME_NUMBER_N = (re.compile(r'#N(\d+)\.', re.IGNORECASE), re.compile(r'🔵(\d+)🔵'))
+
+GROUP_RE = re.compile(r'\(([^)]+)\)')
+CARD_RE = re.compile(r'(\d+|[AKQJ])([♠♥❤♦♣])', re.IGNORECASE)
+
+PENDING_INDICATORS = ('⏰', '▶', '🕐', '➡️')
+COMPLETION_INDICATORS = ('✅', '🔰')
+
+
+class ParsedGameMessage(NamedTuple):
+    """Message du canal source déjà analysé (immuable)."""
+    text: str
+    game_number: Optional[int]
+    groups: Tuple[Tuple[int, ...], ...]   # Cartes (ids 0..51) de chaque groupe entre parenthèses
+    has_completion: bool                  # ✅ ou 🔰 : résultat finalisé
+    has_pending: bool                     # ⏰ ▶ 🕐 ➡️ : message qui sera édité
+    has_final_tag: bool                   # '#T' ou '🔵#R' présent
+
+    @property
+    def first_group(self) -> Tuple[int, ...]:
+        return self.groups[0] if self.groups else ()
+
+    @property
+    def first_card(self) -> Optional[int]:
+        return self.groups[0][0] if self.groups and self.groups[0] else None
+
+    @property
+    def card_count(self) -> int:
+        return sum(len(group) for group in self.groups)
+
+
+class GameMessageParser:
+    """Analyseur configuré avec les motifs de numéro de jeu d'un canal (essayés dans l'ordre)."""
+
+    def __init__(self, game_number_patterns: Sequence[Pattern] = GAME_NUMBER_TRB):
+        self.game_number_patterns = tuple(game_number_patterns)
+        self._last: Optional[ParsedGameMessage] = None
+
+    def parse(self, message: Union[str, ParsedGameMessage]) -> ParsedGameMessage:
+        if isinstance(message, ParsedGameMessage):
+            return message
+        # Les étapes qui reçoivent encore le texte brut réutilisent la dernière analyse
+        last = self._last
+        if last is not None and last.text == message:
+            return last
+
+        parsed = ParsedGameMessage(
+            text=message,
+            game_number=self._extract_game_number(message),
+            groups=tuple(self._parse_group(content) for content in GROUP_RE.findall(message)),
+            has_completion=any(i in message for i in COMPLETION_INDICATORS),
+            has_pending=any(i in message for i in PENDING_INDICATORS),
+            has_final_tag='#T' in message or '🔵#R' in message,
+        )
+        self._last = parsed
+        return parsed
+
+    def _extract_game_number(self, message: str) -> Optional[int]:
+        for pattern in self.game_number_patterns:
+            match = pattern.search(message)
+            if match:
+                for group in match.groups():
+                    if group: return int(group)
+        return None
+
+    @staticmethod
+    def _parse_group(content: str) -> Tuple[int, ...]:
+        ids = (card_id_from_parts(rank, suit) for rank, suit in CARD_RE.findall(content))
+        return tuple(cid for cid in ids if cid is not None)
@@ -0,0 +1,129 @@
+# game_ring.py
+
+"""
+Historique des derniers jeux dans un anneau de taille fixe, indexé par numéro.
+
+Le jeu N occupe la case N % capacité ; la case garde aussi le numéro qu'elle
+contient (sa génération), ce qui invalide d'office l'ancien occupant : écrire
+le jeu N évince le jeu N - capacité, lire N-2 vérifie que la case contient bien
+N-2. Insertion, lecture et éviction sont en O(1), sans réallouer de conteneur
+à chaque jeu (les anciennes versions reconstruisaient un dict et un set).
+
+`GameRing` s'utilise comme un dict {numéro: valeur} (sequential_history),
+`GameRingSet` comme un set de numéros (collected_games) ; les deux acceptent
+les opérations du journal (PUT/ADD/DEL/PRUNE) et se rechargent sur place.
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class GameRing:
+    """Les `capacity` derniers jeux : {numéro: valeur}, case = numéro % capacity."""
+
+    def __init__(self, capacity: int, items: Any = None):
+        self.capacity = capacity
+        self._games: List[Optional[int]] = [None] * capacity
+        self._values: List[Any] = [None] * capacity
+        self._count = 0
+        if items:
+            self.assign(items)
+
+    # --- Écriture ---
+    def put(self, game: int, value: Any = True) -> Optional[int]:
+        """Range le jeu dans sa case ; renvoie le numéro évincé (ou None)."""
+        slot = game % self.capacity
+        previous = self._games[slot]
+        self._games[slot] = game
+        self._values[slot] = value
+        if previous is None:
+            self._count += 1
+            return None
+        return previous if previous != game else None
+
+    def __setitem__(self, game: int, value: Any) -> None:
+        self.put(game, value)
+
+    def pop(self, game: int, default: Any = None) -> Any:
+        slot = game % self.capacity
+        if self._games[slot] != game: return default
+        value = self._values[slot]
+        self._games[slot] = self._values[slot] = None
+        self._count -= 1
+        return value
+
+    def __delitem__(self, game: int) -> None:
+        if game not in self: raise KeyError(game)
+        self.pop(game)
+
+    def prune(self, limit: int) -> None:
+        """Retire les jeux de numéro < limit (anciens enregistrements OP_PRUNE du journal)."""
+        for game in [g for g in self._games if g is not None and g < limit]:
+            self.pop(game)
+
+    def clear(self) -> None:
+        self._games = [None] * self.capacity
+        self._values = [None] * self.capacity
+        self._count = 0
+
+    def assign(self, items: Any) -> None:
+        """Recharge sur place depuis un dict {numéro: valeur}, des paires ou un autre anneau."""
+        self.clear()
+        pairs = items.items() if hasattr(items, 'items') else items
+        # Par numéro croissant : si deux jeux se disputent une case, le plus récent la garde
+        for game, value in sorted(((int(g), v) for g, v in pairs), key=lambda pair: pair[0]):
+            self.put(game, value)
+
+    # --- Lecture ---
+    def __contains__(self, game: Any) -> bool:
+        try:
+            return self._games[game % self.capacity] == game
+        except TypeError:
+            return False
+
+    def get(self, game: int, default: Any = None) -> Any:
+        slot = game % self.capacity
+        return self._values[slot] if self._games[slot] == game else default
+
+    def __getitem__(self, game: int) -> Any:
+        slot = game % self.capacity
+        if self._games[slot] != game: raise KeyError(game)
+        return self._values[slot]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def items(self) -> List[Tuple[int, Any]]:
+        """Paires (numéro, valeur) par numéro croissant."""
+        return sorted(((g, v) for g, v in zip(self._games, self._values) if g is not None), key=lambda pair: pair[0])
+
+    def keys(self) -> List[int]:
+        return sorted(g for g in self._games if g is not None)
+
+    def values(self) -> List[Any]:
+        return [v for _, v in self.items()]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.keys())
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.capacity}, {dict(self.items())})"
+
+    def snapshot(self) -> Dict[int, Any]:
+        return dict(self.items())
+
+
+class GameRingSet(GameRing):
+    """Variante ensemble : les `capacity` derniers numéros de jeu vus."""
+
+    def add(self, game: int) -> Optional[int]:
+        return self.put(game, True)
+
+    def assign(self, items: Any) -> None:
+        if hasattr(items, 'items'):
+            items = items.keys()
+        super().assign((game, True) for game in items)
+
+    def snapshot(self) -> List[int]:
+        return self.keys()
+
+    def __repr__(self) -> str:
+        return f"GameRingSet({self.capacity}, {self.keys()})"
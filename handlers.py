@@ -4,8 +4,12 @@ import logging
 import time
 import json
 from collections import defaultdict
-from typing import Dict, Any, Optional
-import requests
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, Optional, Tuple, Union
+from inter_stats import render_entry
+from telegram_client import TelegramClient, bot_api_url
+from send_scheduler import PRIORITY_PREDICTION
+from update_dedup import UpdateDedup, SQLiteUpdateDedup
 import os 
 import sys
 
@@ -15,6 +19,7 @@ logger.setLevel(logging.INFO)
 # Importation Robuste
 try:
     from card_predictor import CardPredictor, STATIC_RULES
+    from channel_shards import ShardRouter, load_channel_pairs
 except ImportError:
     # Si l'importation échoue, le __init__ de TelegramHandlers affichera une erreur fatale
     logger.error("❌ IMPOSSIBLE D'IMPORTER CARDPREDICTOR. Vérifiez que card_predictor.py existe.")
@@ -23,6 +28,11 @@ except ImportError:
 
 user_message_counts = defaultdict(list)
 
+# /collect : entrées rendues (largement plus que la limite de 3500 caractères du message)
+COLLECT_PREVIEW_ENTRIES = 40
+# Commandes qui agissent sur l'état d'un shard (à préciser quand un chat en administre plusieurs)
+SHARD_COMMANDS = ('/r', '/reset_stock', '/a', '/toggle_ia', '/stat', '/inter', '/collect')
+
 # --- MESSAGES UTILISATEUR NETTOYÉS ---
 WELCOME_MESSAGE = """
 👋 **BIENVENUE SUR LE BOT ENSEIGNE !** ♠️♥️♦️♣️
@@ -57,7 +67,11 @@ class TelegramHandlers:
     def __init__(self, bot_token: str, server_url: str = ""):
         self.bot_token = bot_token
         self.server_url = server_url
-        self.api_url = f"https://api.telegram.org/bot{bot_token}"
+        self.api_url = bot_api_url(bot_token)
+        # Envois sortants : session persistante + file vidée en arrière-plan
+        self.telegram = TelegramClient(self.api_url)
+        # Envois de prédiction dont le message_id n'est pas encore revenu, par (canal source, jeu)
+        self._prediction_sends: Dict[Tuple[int, int], Future] = {}
         
         if CardPredictor is None:
              logger.critical("Bot ne peut pas démarrer car CardPredictor n'a pas été importé.")
@@ -65,11 +79,18 @@ class TelegramHandlers:
              
         # L'instance CardPredictor est créée ici
         self.card_predictor = CardPredictor(self.send_message)
+        # Un shard (predictor + état isolé) par paire source -> prédiction configurée
+        self.router = ShardRouter.open(self.card_predictor, load_channel_pairs(),
+                                       lambda state_dir: CardPredictor(self.send_message, state_dir=state_dir))
         logger.info("Handlers initialized.")
         
-    def send_message(self, chat_id: int, text: str, message_id: Optional[int] = None, reply_to_message_id: Optional[int] = None, keyboard: Optional[Dict[str, Any]] = None, parse_mode='Markdown', edit: bool = False):
-        """Envoie ou édite un message."""
-        url = f"{self.api_url}/{'editMessageText' if edit else 'sendMessage'}"
+    def send_message(self, chat_id: int, text: str, message_id: Optional[int] = None, reply_to_message_id: Optional[int] = None, keyboard: Optional[Dict[str, Any]] = None, parse_mode='Markdown', edit: bool = False, callback: Optional[Callable[[Optional[Dict]], None]] = None, priority: Optional[int] = None) -> Future:
+        """
+        Met en file l'envoi ou l'édition d'un message (non bloquant).
+        Le Future (et le callback éventuel) reçoit le message Telegram envoyé, ou None.
+        Priorité par défaut : édition ou administration (voir send_scheduler).
+        """
+        method = 'editMessageText' if edit else 'sendMessage'
         payload = {
             'chat_id': chat_id,
             'parse_mode': parse_mode,
@@ -82,36 +103,57 @@ class TelegramHandlers:
         if keyboard:
             payload['reply_markup'] = json.dumps(keyboard)
 
+        return self.telegram.submit(method, payload, callback, priority)
+
+    def _set_prediction_message_id(self, predictor: CardPredictor, predicted_game: int, sent_msg: Optional[Dict]):
+        """
+        Callback d'envoi : mémorise le message_id de la prédiction (pour l'éditer ensuite),
+        puis libère l'entrée réservée avant l'envoi et les éditions qui l'attendaient.
+        """
         try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status() 
-            return response.json().get('result')
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Erreur d'envoi de message: {e}")
-            return None
+            if sent_msg:
+                predictor.set_prediction_message_id(predicted_game, sent_msg['message_id'])
+        finally:
+            pending = self._prediction_sends.pop((predictor.target_channel_id, predicted_game), None)
+            if pending is not None:
+                pending.set_result(sent_msg)
+
+    def _edit_prediction(self, predictor: CardPredictor, res: Dict[str, Any]):
+        """Édite le message de prédiction ; si son envoi est encore en file, l'édition suit sa réception."""
+        predicted_game = int(res['predicted_game'])
+        channel_id = predictor.prediction_channel_id
+        pending = self._prediction_sends.get((predictor.target_channel_id, predicted_game))
+        if pending is not None:
+            pending.add_done_callback(lambda f: f.result() and self.send_message(channel_id, res['new_message'], message_id=f.result()['message_id'], edit=True))
+            return
+        prediction = predictor.predictions.get(predicted_game) or {}
+        mid_to_edit = prediction.get('message_id') or res.get('message_id_to_edit')
+        if mid_to_edit:
+            self.send_message(channel_id, res['new_message'], message_id=mid_to_edit, edit=True)
         
     def _handle_command(self, text: str, chat_id: int, message_id: int, from_user_id: int):
         
         command = text.split()[0].lower()
-        args = text.split()[1:]
+        # Les commandes s'appliquent au shard nommé en dernier argument (/stat table1), sinon
+        # au shard du chat (source, prédiction ou admin), sinon au predictor par défaut
+        predictor, args = self.router.for_command(chat_id, text.split()[1:])
+        shared = self.router.shards_sharing(chat_id)
+        if shared and len(args) == len(text.split()) - 1 and command in SHARD_COMMANDS:
+            self.send_message(chat_id, f"ℹ️ Ce chat administre plusieurs tables ({', '.join(shared)}) : précisez-la en dernier argument (ex: `{command} {shared[0]}`).")
+            return
         
         # --- COMMANDES RAPIDES /r et /a ---
         if command in ('/r', '/reset_stock'):
-            self.card_predictor.predictions = {}
-            self.card_predictor.processed_messages = set() 
-            self.card_predictor.last_prediction_time = 0
-            self.card_predictor.last_predicted_game_number = 0
-            self.card_predictor.consecutive_fails = 0
-            self.card_predictor._save_all_data() 
+            predictor.reset_prediction_stock()
             self.send_message(chat_id, "✅ **RESET MANUEL** : Stocks de prédiction réinitialisés (Historique IA conservé).")
             return
             
         if command in ('/a', '/toggle_ia'):
-            current_state = self.card_predictor.is_inter_mode_active
+            current_state = predictor.is_inter_mode_active
             new_state = not current_state
             
-            self.card_predictor.is_inter_mode_active = new_state
-            self.card_predictor._save_data(new_state, 'is_inter_mode_active.json')
+            predictor.is_inter_mode_active = new_state
+            predictor._record_set('is_inter_mode_active')
             
             mode = "ACTIVÉ" if new_state else "DÉSACTIVÉ"
             emoji = "🧠" if new_state else "📜"
@@ -123,7 +165,7 @@ class TelegramHandlers:
             self.send_message(chat_id, WELCOME_MESSAGE)
         
         elif command == '/stat':
-            p = self.card_predictor
+            p = predictor
             time_since_pred = (time.time() - p.last_prediction_time) / 60 if p.last_prediction_time else 0
             time_since_analysis = (time.time() - p.last_analysis_time) / 60 if p.last_analysis_time else 0
 
@@ -135,14 +177,16 @@ class TelegramHandlers:
 
 📈 **Stock de Prédiction**
     • Dernier jeu prédit : **{p.last_predicted_game_number}**
-    • Dernier jeu Source traité : **{p.card_predictor.extract_game_number(list(p.processed_messages)[-1]) if p.processed_messages else 'N/A'}**
+    • Dernier jeu Source traité : **{p.processed_messages.last or 'N/A'}**
     • Temps écoulé : {time_since_pred:.1f} min (depuis dernier N+2)
     • Fails Statiques consécutifs : **{p.consecutive_fails}** / 2
 
 🔗 **Configuration des Canaux**
+    • Shard : `{self.router.name_of(p)}`
     • Source ID : `{p.target_channel_id}`
     • Prédiction ID : `{p.prediction_channel_id}`
     • Admin ID : `{p.active_admin_chat_id or 'Non défini'}`
+    • Paires source → prédiction (shards) : {len(self.router)}
 """
             self.send_message(chat_id, status_msg)
             
@@ -158,7 +202,7 @@ class TelegramHandlers:
 
         elif command == '/inter':
             if not args or args[0].lower() == 'status':
-                status_data = self.card_predictor.get_inter_status(chat_id=chat_id)
+                status_data = predictor.get_inter_status(chat_id=chat_id)
                 keyboard = {
                     "inline_keyboard": [
                         [{"text": "Relancer Analyse (Top 2)", "callback_data": "inter_reanalyze"}]
@@ -167,20 +211,21 @@ class TelegramHandlers:
                 self.send_message(chat_id, status_data, keyboard=keyboard)
                 
             elif args[0].lower() == 'activate':
-                self.card_predictor.is_inter_mode_active = True
-                self.card_predictor._save_data(True, 'is_inter_mode_active.json')
-                self.card_predictor.analyze_and_set_smart_rules(chat_id=chat_id, force_activate=True)
+                predictor.is_inter_mode_active = True
+                predictor._record_set('is_inter_mode_active')
+                predictor.analyze_and_set_smart_rules(chat_id=chat_id, force_activate=True)
             
             elif args[0].lower() == 'default':
-                self.card_predictor.is_inter_mode_active = False
-                self.card_predictor._save_data(False, 'is_inter_mode_active.json')
+                predictor.is_inter_mode_active = False
+                predictor._record_set('is_inter_mode_active')
                 self.send_message(chat_id, "📜 Mode Intelligent **DÉSACTIVÉ** (Retour aux règles statiques).")
             
             else:
                  self.send_message(chat_id, "❌ Commande `inter` inconnue. Utilisez `/inter status`, `/inter activate`, ou `/inter default`.")
 
         elif command == '/collect':
-            inter_data_str = json.dumps(self.card_predictor.inter_data, indent=2, ensure_ascii=False)
+            # Seules les premières entrées tiennent dans un message : inutile de rendre toute la fenêtre
+            inter_data_str = json.dumps([render_entry(e) for e in predictor.inter_data[:COLLECT_PREVIEW_ENTRIES]], indent=2, ensure_ascii=False)
             
             if len(inter_data_str) > 3500:
                  inter_data_str = inter_data_str[:3500] + "\n[... TRONQUÉ POUR LA LIMITE TELEGRAM ...]"
@@ -195,107 +240,139 @@ class TelegramHandlers:
         data = callback_query['data']
         chat_id = callback_query['message']['chat']['id']
         message_id = callback_query['message']['message_id']
+        predictor = self.router.for_chat(chat_id)
         
         if data == 'set_source':
-            self.card_predictor.set_channel_id(chat_id, 'source')
+            predictor.set_channel_id(chat_id, 'source')
+            self.router.rebuild()
             self.send_message(chat_id, "✅ **CANAL SOURCE** : Ce canal est maintenant désigné pour recevoir les messages de jeu à analyser.", message_id=message_id, edit=True)
         elif data == 'set_prediction':
-            self.card_predictor.set_channel_id(chat_id, 'prediction')
+            predictor.set_channel_id(chat_id, 'prediction')
+            self.router.rebuild()
             self.send_message(chat_id, "✅ **CANAL PRÉDICTION** : Ce canal est maintenant désigné pour l'envoi des pronostics du bot.", message_id=message_id, edit=True)
         elif data == 'set_admin':
-            self.card_predictor.set_channel_id(chat_id, 'admin')
+            predictor.set_channel_id(chat_id, 'admin')
+            self.router.rebuild()
             self.send_message(chat_id, "✅ **CHAT ADMIN** : Ce chat recevra les alertes critiques (ex: reset quotidien).", message_id=message_id, edit=True)
         elif data == 'inter_reanalyze':
             # La fonction analyze_and_set_smart_rules envoie le message de confirmation
-            self.card_predictor.analyze_and_set_smart_rules(chat_id=chat_id, force_activate=True)
+            predictor.analyze_and_set_smart_rules(chat_id=chat_id, force_activate=True)
         elif data == 'inter_apply':
-             self.card_predictor.analyze_and_set_smart_rules(chat_id=chat_id, force_activate=True)
+             predictor.analyze_and_set_smart_rules(chat_id=chat_id, force_activate=True)
         elif data == 'inter_default':
-            self.card_predictor.is_inter_mode_active = False
-            self.card_predictor._save_data(False, 'is_inter_mode_active.json')
+            predictor.is_inter_mode_active = False
+            predictor._record_set('is_inter_mode_active')
             self.send_message(chat_id, "📜 Mode Intelligent **DÉSACTIVÉ** (Retour aux règles statiques).", message_id=message_id, edit=True)
         
-    def handle_update(self, update: Dict[str, Any]):
+    def handle_update(self, update: Dict[str, Any], dedup: Optional[Union[UpdateDedup, SQLiteUpdateDedup]] = None):
         try:
             if not self.card_predictor: return
 
-            # Vérification du reset quotidien
-            self.card_predictor.check_and_reset_predictions()
+            # Canal SOURCE -> shard : une seule recherche par chat id
+            post = update.get('channel_post') or update.get('edited_channel_post')
+            predictor = self.router.for_source(post['chat']['id']) if post and 'text' in post else None
+
+            # Workers parallèles (UPDATE_WORKERS, SHARED_STATE) : la section critique du predictor
+            # sérialise les posts de son canal et les commandes qui le visent
+            chat = (update.get('message') or (update.get('callback_query') or {}).get('message') or {}).get('chat') or {}
+            text = (update.get('message') or {}).get('text') or ''
+            if predictor is not None:
+                target = predictor
+            elif text.startswith('/'):
+                # Commande admin : même shard que _handle_command (éventuellement nommé en argument)
+                target, _ = self.router.for_command(chat.get('id'), text.split()[1:])
+            else:
+                target = self.router.for_chat(chat.get('id'))
+            update_id = update.get('update_id') if dedup is not None else None
+            with target.exclusive():
+                # Renvoi Telegram d'une update déjà traitée ; marquée seulement après traitement
+                if isinstance(update_id, int) and dedup.seen(update_id):
+                    logger.info(f"♻️ Update {update_id} déjà traitée (renvoi Telegram) : ignorée")
+                    return
+                if predictor is None and post and 'text' in post and post['chat']['id'] == target.target_channel_id:
+                    # Canal source changé par /config dans un autre processus (état rechargé)
+                    predictor = target
+                # Vérification du reset quotidien
+                target.check_and_reset_predictions()
 
-            # 1. Traitement des messages dans le canal SOURCE
-            if ('channel_post' in update and 'text' in update['channel_post']) and (update['channel_post']['chat']['id'] == self.card_predictor.target_channel_id):
+                # 1. Traitement des messages dans le canal SOURCE
+                if 'channel_post' in update and predictor is not None:
                 
-                msg = update['channel_post']
-                text = msg.get('text', '')
-                game_num = self.card_predictor.extract_game_number(text)
+                    msg = update['channel_post']
+                    # Analyse unique du message, partagée par la collecte, la prédiction et la vérification
+                    parsed = predictor.parse(msg.get('text', ''))
+                    game_num = parsed.game_number
                 
-                if game_num and game_num not in self.card_predictor.processed_messages:
+                    if game_num and game_num not in predictor.processed_messages:
                     
-                    # 1.A. COLLECTE IA (N-2 -> N)
-                    self.card_predictor.collect_inter_data(game_num, text)
-
-                    # 1.B. PRÉDICTION (N -> N+2)
-                    prediction_data = self.card_predictor.should_predict(text)
-                    if prediction_data:
-                        predicted_suit, is_inter = prediction_data
-                        res = self.card_predictor.make_prediction(game_num, predicted_suit, is_inter)
+                        # 1.A. COLLECTE IA (N-2 -> N)
+                        predictor.collect_inter_data(game_num, parsed)
+
+                        # 1.B. PRÉDICTION (N -> N+2)
+                        prediction_data = predictor.should_predict(parsed)
+                        if prediction_data:
+                            predicted_suit, is_inter = prediction_data
+                            res = predictor.make_prediction(game_num, predicted_suit, is_inter)
                         
-                        if res and res['type'] == 'send_message':
-                            sent_msg = self.send_message(self.card_predictor.prediction_channel_id, res['message'])
-                            if sent_msg:
-                                self.card_predictor.predictions[res['predicted_game']]['message_id'] = sent_msg['message_id']
-                                self.card_predictor._save_all_data() 
+                            if res and res['type'] == 'send_message':
+                                # Le message_id arrive par callback, sans bloquer le traitement de l'update ;
+                                # l'entrée est réservée avant l'envoi, que le callback peut précéder le retour
+                                game = res['predicted_game']
+                                self._prediction_sends[(predictor.target_channel_id, game)] = Future()
+                                self.send_message(
+                                    predictor.prediction_channel_id, res['message'],
+                                    callback=lambda sent_msg, game=game, predictor=predictor: self._set_prediction_message_id(predictor, game, sent_msg),
+                                    priority=PRIORITY_PREDICTION)
                     
-                    # 1.C. VÉRIFICATION (N-2)
-                    res = self.card_predictor.verify_prediction(text)
-                    if res and res['type'] == 'edit_message':
-                        mid_to_edit = res.get('message_id_to_edit')
-                        if mid_to_edit:
-                            self.send_message(self.card_predictor.prediction_channel_id, res['new_message'], message_id=mid_to_edit, edit=True)
+                        # 1.C. VÉRIFICATION (N-2)
+                        res = predictor.verify_prediction(parsed)
+                        if res and res['type'] == 'edit_message':
+                            self._edit_prediction(predictor, res)
                         
-                    self.card_predictor.processed_messages.add(game_num)
-                    self.card_predictor._save_data(self.card_predictor.processed_messages, 'processed.json')
+                        predictor.processed_messages.add(game_num)
+                        predictor._record_add('processed_messages', game_num)
 
 
-            # 2. Traitement des messages ÉDITÉS dans le canal SOURCE
-            elif ('edited_channel_post' in update and 'text' in update['edited_channel_post']) and (update['edited_channel_post']['chat']['id'] == self.card_predictor.target_channel_id):
+                # 2. Traitement des messages ÉDITÉS dans le canal SOURCE
+                elif 'edited_channel_post' in update and predictor is not None:
                 
-                msg = update['edited_channel_post']
-                text = msg.get('text', '')
-                game_num = self.card_predictor.extract_game_number(text)
+                    msg = update['edited_channel_post']
+                    # Analyse unique du message, partagée par la collecte, la prédiction et la vérification
+                    parsed = predictor.parse(msg.get('text', ''))
+                    game_num = parsed.game_number
                 
-                if game_num:
-                    # La collecte doit se faire sur l'édition si le jeu n'a pas été traité
-                    if game_num not in self.card_predictor.collected_games:
-                       self.card_predictor.collect_inter_data(game_num, text)
+                    if game_num:
+                        # La collecte doit se faire sur l'édition si le jeu n'a pas été traité
+                        if game_num not in predictor.collected_games:
+                           predictor.collect_inter_data(game_num, parsed)
                     
-                    # Vérifier UNIQUEMENT sur messages finalisés (✅ ou 🔰)
-                    if self.card_predictor.has_completion_indicators(text) or '🔰' in text:
-                        res = self.card_predictor.verify_prediction_from_edit(text)
+                        # Vérifier UNIQUEMENT sur messages finalisés (✅ ou 🔰)
+                        if parsed.has_completion:
+                            res = predictor.verify_prediction_from_edit(parsed)
                         
-                        if res and res['type'] == 'edit_message':
-                            mid_to_edit = res.get('message_id_to_edit')
-                            
-                            if mid_to_edit:
-                                self.send_message(self.card_predictor.prediction_channel_id, res['new_message'], message_id=mid_to_edit, edit=True)
-
-            # 3. Callbacks
-            elif 'callback_query' in update:
-                self._handle_callback_query(update['callback_query'])
+                            if res and res['type'] == 'edit_message':
+                                self._edit_prediction(predictor, res)
+
+                # 3. Callbacks
+                elif 'callback_query' in update:
+                    self._handle_callback_query(update['callback_query'])
             
-            # 4. Commandes utilisateur (dans n'importe quel chat)
-            elif 'message' in update and 'text' in update['message']:
-                 m = update['message']
-                 if m['text'].startswith('/'):
-                    self._handle_command(m['text'], m['chat']['id'], m['message_id'], m['from']['id'])
+                # 4. Commandes utilisateur (dans n'importe quel chat)
+                elif 'message' in update and 'text' in update['message']:
+                     m = update['message']
+                     if m['text'].startswith('/'):
+                        self._handle_command(m['text'], m['chat']['id'], m['message_id'], m['from']['id'])
             
-            # 5. Ajout au groupe
-            elif 'my_chat_member' in update:
-                m = update['my_chat_member']
-                if m['new_chat_member']['status'] in ['member', 'administrator']:
-                    bot_id_part = self.bot_token.split(':')[0]
-                    if str(m['new_chat_member']['user']['id']).startswith(bot_id_part):
-                         self.send_message(m['chat']['id'], "✨ Merci de m'avoir ajouté ! Veuillez utiliser `/config` pour définir mon rôle (Source ou Prédiction).")
+                # 5. Ajout au groupe
+                elif 'my_chat_member' in update:
+                    m = update['my_chat_member']
+                    if m['new_chat_member']['status'] in ['member', 'administrator']:
+                        bot_id_part = self.bot_token.split(':')[0]
+                        if str(m['new_chat_member']['user']['id']).startswith(bot_id_part):
+                             self.send_message(m['chat']['id'], "✨ Merci de m'avoir ajouté ! Veuillez utiliser `/config` pour définir mon rôle (Source ou Prédiction).")
+
+                if isinstance(update_id, int):
+                    dedup.mark(update_id)
 
 
         except Exception as e:
@@ -4,8 +4,12 @@ import logging
 import time
 import json
 from collections import defaultdict
-from typing import Dict, Any, Optional
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, Optional
 import requests
+from cards import Suit, card_text
+from telegram_client import TelegramClient, bot_api_url
+from send_scheduler import PRIORITY_PREDICTION
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -81,7 +85,9 @@ HELP_MESSAGE = """
 class TelegramHandlers:
     def __init__(self, bot_token: str):
         self.bot_token = bot_token
-        self.base_url = f"https://api.telegram.org/bot{bot_token}"
+        self.base_url = bot_api_url(bot_token)
+        # Envois sortants : session persistante + file vidée en arrière-plan
+        self.telegram = TelegramClient(self.base_url)
         
         if CardPredictor:
             # On passe la fonction d'envoi pour les notifs INTER
@@ -96,7 +102,8 @@ class TelegramHandlers:
         user_message_counts[user_id].append(now)
         return len(user_message_counts[user_id]) <= 30
 
-    def send_message(self, chat_id: int, text: str, parse_mode='Markdown', message_id: Optional[int] = None, edit=False, reply_markup: Optional[Dict] = None) -> Optional[int]:
+    def send_message(self, chat_id: int, text: str, parse_mode='Markdown', message_id: Optional[int] = None, edit=False, reply_markup: Optional[Dict] = None, callback: Optional[Callable[[Optional[int]], None]] = None, priority: Optional[int] = None) -> Optional[Future]:
+        """Met l'envoi en file (non bloquant) ; le callback reçoit le message_id envoyé, ou None."""
         if not chat_id or not text: return None
         
         method = 'editMessageText' if (message_id or edit) else 'sendMessage'
@@ -106,15 +113,10 @@ class TelegramHandlers:
         if reply_markup: 
             payload['reply_markup'] = json.dumps(reply_markup) if isinstance(reply_markup, dict) else reply_markup
 
-        try:
-            r = requests.post(f"{self.base_url}/{method}", json=payload, timeout=10)
-            if r.status_code == 200:
-                return r.json().get('result', {}).get('message_id')
-            else:
-                logger.error(f"Erreur Telegram {r.status_code}: {r.text}")
-        except Exception as e:
-            logger.error(f"Exception envoi message: {e}")
-        return None
+        on_sent = None
+        if callback is not None:
+            on_sent = lambda result: callback(result.get('message_id') if isinstance(result, dict) else None)
+        return self.telegram.submit(method, payload, on_sent, priority)
 
     # --- GESTION COMMANDE /deploy ---
     # (Le code de _handle_command_deploy n'a pas été modifié)
@@ -127,7 +129,7 @@ class TelegramHandlers:
                 'main.py', 'bot.py', 'handlers.py', 'card_predictor.py', 
                 'config.py', 'requirements.txt', 'RENDER_DEPLOYMENT_INSTRUCTIONS.md',
                 # Fichiers de données INTER
-                'inter_data.json', 'smart_rules.json', 'sequential_history.json',
+                'inter_data.bin', 'inter_data.json', 'smart_rules.json', 'sequential_history.json',
                 'collected_games.json', 'inter_mode_status.json',
                 # Fichiers de prédictions
                 'predictions.json', 'processed.json', 'pending_edits.json',
@@ -174,7 +176,7 @@ class TelegramHandlers:
                     'caption': f'📦 **fin23.zip - Package Replit Deployment**\n\n✅ Port : 5000 (Replit)\n✅ Tous les fichiers inclus\n✅ **{data_count} jeux collectés**\n✅ **{rules_count} règles INTER**\n✅ Instructions incluses\n\n**Déploiement :**\n1. Utilisez Replit Deployments\n2. Variables env : BOT_TOKEN\n3. WEBHOOK_URL auto-configuré\n\nVoir RENDER_DEPLOYMENT_INSTRUCTIONS.md pour les détails',
                     'parse_mode': 'Markdown'
                 }
-                response = requests.post(url, data=data, files=files, timeout=60)
+                response = self.telegram.session.post(url, data=data, files=files, timeout=60)
             
             if response.json().get('ok'):
                 logger.info(f"✅ fin23.zip envoyé avec succès")
@@ -206,26 +208,17 @@ class TelegramHandlers:
         
         # Afficher TOUS les déclencheurs collectés par enseigne
         if self.card_predictor.inter_data:
-            from collections import defaultdict
-            
-            # Grouper par enseigne de résultat
-            by_result_suit = defaultdict(list)
-            for entry in self.card_predictor.inter_data:
-                result_suit = entry.get('result_suit', '?')
-                trigger = entry.get('declencheur', '?').replace("♥️", "❤️")
-                by_result_suit[result_suit].append(trigger)
+            # Matrice déclencheur x enseigne calculée en bloc (ids entiers, rendus en emoji à l'affichage)
+            matrix = self.card_predictor.inter_data.matrix()
             
             message += "📊 **TOUS LES DÉCLENCHEURS COLLECTÉS:**\n\n"
             
-            for suit in ['♠️', '❤️', '♦️', '♣️']:
-                if suit in by_result_suit:
-                    triggers = by_result_suit[suit]
+            for suit in Suit:
+                stats = matrix.summary(suit, k=None)
+                if stats:
                     message += f"**Pour enseigne {suit}:**\n"
-                    # Compter les occurrences
-                    from collections import Counter
-                    trigger_counts = Counter(triggers)
-                    for trigger, count in trigger_counts.most_common():
-                        message += f"  • {trigger} ({count}x)\n"
+                    for stat in stats:
+                        message += f"  • {card_text(stat['trigger'])} ({stat['count']}x, {stat['rate']:.0%})\n"
                     message += "\n"
         else:
             message += "⚠️ **Aucune donnée collectée.**\n"
@@ -270,7 +263,7 @@ class TelegramHandlers:
         
         elif action == 'default':
             self.card_predictor.is_inter_mode_active = False
-            self.card_predictor._save_all_data()
+            self.card_predictor._record_set('is_inter_mode_active')
             self.send_message(chat_id, "❌ **MODE INTER DÉSACTIVÉ**\nRetour aux règles statiques.")
             
         elif action == 'status':
@@ -297,7 +290,7 @@ class TelegramHandlers:
         
         elif data == 'inter_default':
             self.card_predictor.is_inter_mode_active = False
-            self.card_predictor._save_all_data()
+            self.card_predictor._record_set('is_inter_mode_active')
             # Mise à jour du message pour confirmer l'action
             msg, kb = self.card_predictor.get_inter_status()
             self.send_message(chat_id, msg, message_id=msg_id, edit=True, reply_markup=kb)
@@ -313,8 +306,13 @@ class TelegramHandlers:
 
     # --- UPDATES (PARTIE CORRIGÉE) ---
     def handle_update(self, update: Dict[str, Any]):
+        if not self.card_predictor: return
+        # L'état n'est modifié que sous le verrou du predictor (copié par le flusher sous ce verrou)
+        with self.card_predictor.lock:
+            self._process_update(update)
+
+    def _process_update(self, update: Dict[str, Any]):
         try:
-            if not self.card_predictor: return
 
             if ('message' in update and 'text' in update['message']) or ('channel_post' in update and 'text' in update['channel_post']):
                 
@@ -346,14 +344,17 @@ class TelegramHandlers:
                 # Traitement Canal Source
                 elif str(chat_id) == str(self.card_predictor.target_channel_id):
                     
+                    # Analyse unique du message, partagée par la collecte, la vérification et la prédiction
+                    parsed = self.card_predictor.parse(text)
+
                     # A. Collecter TOUJOURS (même messages temporaires ⏰)
-                    game_num = self.card_predictor.extract_game_number(text)
+                    game_num = parsed.game_number
                     if game_num:
-                        self.card_predictor.collect_inter_data(game_num, text)
+                        self.card_predictor.collect_inter_data(game_num, parsed)
                     
                     # B. Vérifier UNIQUEMENT sur messages finalisés (✅ ou 🔰)
-                    if self.card_predictor.has_completion_indicators(text) or '🔰' in text:
-                        res = self.card_predictor._verify_prediction_common(text)
+                    if parsed.has_completion:
+                        res = self.card_predictor._verify_prediction_common(parsed)
                         
                         if res and res['type'] == 'edit_message':
                             mid_to_edit = res.get('message_id_to_edit') 
@@ -362,13 +363,14 @@ class TelegramHandlers:
                                 self.send_message(self.card_predictor.prediction_channel_id, res['new_message'], message_id=mid_to_edit, edit=True)
                     
                     # C. Prédire (même sur messages temporaires ⏰)
-                    ok, num, val = self.card_predictor.should_predict(text)
+                    ok, num, val = self.card_predictor.should_predict(parsed)
                     if ok:
                         txt = self.card_predictor.prepare_prediction_text(num, val)
-                        mid = self.send_message(self.card_predictor.prediction_channel_id, txt)
-                        
-                        if mid:
-                            self.card_predictor.make_prediction(num, val, mid)
+                        # Enregistrée avant l'envoi ; son message_id est ajouté quand Telegram l'a renvoyé
+                        target = self.card_predictor.make_prediction(num, val)
+                        self.send_message(self.card_predictor.prediction_channel_id, txt,
+                                          callback=lambda mid, target=target: mid and self.card_predictor.set_prediction_message_id(target, mid),
+                                          priority=PRIORITY_PREDICTION)
 
             # 2. Messages édités (CRITIQUE pour vérification)
             elif ('edited_message' in update and 'text' in update['edited_message']) or ('edited_channel_post' in update and 'text' in update['edited_channel_post']):
@@ -379,14 +381,16 @@ class TelegramHandlers:
                 
                 # Traitement Canal Source - Vérification sur messages édités
                 if str(chat_id) == str(self.card_predictor.target_channel_id):
+                    parsed = self.card_predictor.parse(text)
+
                     # Collecter TOUJOURS
-                    game_num = self.card_predictor.extract_game_number(text)
+                    game_num = parsed.game_number
                     if game_num:
-                        self.card_predictor.collect_inter_data(game_num, text)
+                        self.card_predictor.collect_inter_data(game_num, parsed)
                     
                     # Vérifier UNIQUEMENT sur messages finalisés (✅ ou 🔰)
-                    if self.card_predictor.has_completion_indicators(text) or '🔰' in text:
-                        res = self.card_predictor.verify_prediction_from_edit(text)
+                    if parsed.has_completion:
+                        res = self.card_predictor.verify_prediction_from_edit(parsed)
                         
                         if res and res['type'] == 'edit_message':
                             mid_to_edit = res.get('message_id_to_edit')
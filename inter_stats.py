@@ -0,0 +1,407 @@
+# inter_stats.py
+
+"""
+Compteurs incrémentaux déclencheur (carte N-2) -> enseigne résultat (N).
+
+Tenus à jour à chaque collecte : l'analyse Top 2 lit directement ces compteurs
+au lieu de reparcourir tout l'historique `inter_data`.
+
+`InterDataWindow` borne l'historique d'apprentissage (N derniers jeux et/ou
+D derniers jours) dans un tampon circulaire de capacité fixe et maintient les
+compteurs au fil des ajouts et des évictions, avec une décroissance
+exponentielle optionnelle (les jeux récents pèsent plus).
+
+Les entrées sont encodées : 'declencheur' est un id de carte (0..51) et
+'result_suit' un index d'enseigne (cards.Suit) ; les anciennes entrées
+persistées sous forme d'emoji sont converties à l'ajout.
+
+Le stockage est colonnaire : cinq tableaux `array` parallèles (jeu résultat,
+jeu déclencheur, carte, enseigne, date en secondes epoch), soit ~18 octets
+par jeu au lieu d'un dict. Les entrées ne sont matérialisées en dict qu'à la
+lecture (affichage, journal) ; analyses et exports lisent les colonnes.
+Sur disque, `InterColumns` s'écrit dans un fichier binaire compact relu en
+une seule lecture.
+"""
+import heapq
+import math
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from cards import SUITS, as_card_id, as_suit, card_text
+from trigger_matrix import TriggerSuitMatrix, np
+
+# Seuil sous lequel un compteur décru est considéré comme nul
+_EPSILON = 1e-9
+
+
+class TriggerSuitCounts:
+    """Table {enseigne_résultat: {carte_déclencheur: poids}} (clés entières)."""
+
+    def __init__(self, entries: Iterable[Dict] = (), decay: float = 1.0):
+        self.decay = decay
+        self._counts: Dict[int, Dict[int, float]] = {}
+        self.total = 0
+        self.step = 0
+        for entry in entries:
+            self.add_entry(entry)
+
+    def clear(self) -> None:
+        self._counts = {}
+        self.total = 0
+        self.step = 0
+
+    def add(self, trigger: int, result_suit: int) -> int:
+        """Ajoute une observation ; renvoie son numéro d'ajout (pour la retirer plus tard)."""
+        self.step += 1
+        if self.decay != 1.0:
+            # Au plus 52 x 4 cellules : coût constant par jeu
+            for counts in self._counts.values():
+                for k in counts:
+                    counts[k] *= self.decay
+            self.total *= self.decay
+        counts = self._counts.setdefault(result_suit, {})
+        counts[trigger] = counts.get(trigger, 0) + 1
+        self.total += 1
+        return self.step
+
+    def remove(self, trigger: int, result_suit: int, added_at: Optional[int] = None) -> None:
+        """Retire une observation ajoutée au pas `added_at` (son poids a décru depuis)."""
+        counts = self._counts.get(result_suit)
+        if not counts or trigger not in counts: return
+        weight = self.decay ** (self.step - added_at) if self.decay != 1.0 and added_at is not None else 1
+        counts[trigger] -= weight
+        self.total -= weight
+        if counts[trigger] <= _EPSILON:
+            del counts[trigger]
+
+    def add_many(self, triggers: Sequence[int], suits: Sequence[int]) -> int:
+        """
+        Ajoute des observations en bloc (chargement) ; renvoie le numéro d'ajout de la
+        première, les suivantes ayant des numéros consécutifs.
+        """
+        first = self.step + 1
+        if self.decay != 1.0 or np is None:
+            for trigger, suit in zip(triggers, suits):
+                self.add(trigger, suit)
+            return first
+
+        cells = np.asarray(triggers, dtype=np.intp) * len(SUITS) + np.asarray(suits, dtype=np.intp)
+        totals = np.bincount(cells, minlength=0)
+        # Clés insérées dans l'ordre de première apparition, comme l'ajout un par un
+        # (même départage des ex æquo dans top())
+        uniq, first_seen = np.unique(cells, return_index=True)
+        for cell in uniq[np.argsort(first_seen, kind='stable')].tolist():
+            counts = self._counts.setdefault(cell % len(SUITS), {})
+            counts[cell // len(SUITS)] = counts.get(cell // len(SUITS), 0) + int(totals[cell])
+        self.total += len(cells)
+        self.step += len(cells)
+        return first
+
+    def add_entry(self, entry: Dict) -> int:
+        return self.add(entry['declencheur'], entry['result_suit'])
+
+    def remove_entry(self, entry: Dict, added_at: Optional[int] = None) -> None:
+        self.remove(entry['declencheur'], entry['result_suit'], added_at)
+
+    def get(self, result_suit: int) -> Dict[int, float]:
+        return self._counts.get(result_suit, {})
+
+    def top(self, result_suit: int, n: int = 2) -> List[Tuple[int, float]]:
+        """Les `n` déclencheurs les plus fréquents pour cette enseigne (ordre stable)."""
+        best = heapq.nlargest(n, self.get(result_suit).items(), key=lambda x: x[1])
+        if self.decay != 1.0:
+            best = [(trigger, round(count, 2)) for trigger, count in best]
+        return best
+
+    def suits(self) -> List[int]:
+        return [suit for suit, counts in self._counts.items() if counts]
+
+
+def normalize_entry(entry: Dict) -> Optional[Dict]:
+    """Entrée encodée (ids entiers) ; None si la carte ou l'enseigne est illisible."""
+    trigger, result_suit = entry.get('declencheur'), entry.get('result_suit')
+    if type(trigger) is int and type(result_suit) is int:
+        return entry
+    trigger, result_suit = as_card_id(trigger), as_suit(result_suit)
+    if trigger is None or result_suit is None: return None
+    return {**entry, 'declencheur': trigger, 'result_suit': int(result_suit)}
+
+
+def render_entry(entry: Dict) -> Dict:
+    """Entrée rendue en emoji pour l'affichage et les exports."""
+    return {**entry, 'declencheur': card_text(entry['declencheur']), 'result_suit': SUITS[entry['result_suit']]}
+
+
+# Colonnes persistées : (clé de l'entrée, code de type array)
+INTER_COLUMN_TYPES = (
+    ('numero_resultat', 'i'),
+    ('numero_declencheur', 'i'),
+    ('declencheur', 'b'),
+    ('result_suit', 'b'),
+    ('epoch', 'd'),
+)
+_COLUMN_NAMES = tuple(name for name, _ in INTER_COLUMN_TYPES)
+
+# Fichier binaire : en-tête (magique, version, nombre de jeux) puis chaque colonne brute (little-endian)
+INTER_FILE_MAGIC = b'IDAT'
+INTER_FILE_VERSION = 1
+_HEADER = struct.Struct('<4sHI')
+
+
+def _to_epoch(date: Any) -> float:
+    """Date ISO (ou epoch) -> secondes epoch ; NaN si absente ou illisible."""
+    if isinstance(date, (int, float)): return float(date)
+    try:
+        return datetime.fromisoformat(date).timestamp()
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _to_iso(epoch: float) -> Optional[str]:
+    return None if epoch != epoch else datetime.fromtimestamp(epoch).isoformat()
+
+
+def _entry(result_game: int, trigger_game: int, trigger: int, suit: int, epoch: float) -> Dict:
+    return {'numero_resultat': result_game, 'declencheur': trigger, 'numero_declencheur': trigger_game,
+            'result_suit': suit, 'date': _to_iso(epoch)}
+
+
+def _empty_columns(size: int = 0) -> Dict[str, array]:
+    return {name: array(code, bytes(array(code).itemsize * size)) for name, code in INTER_COLUMN_TYPES}
+
+
+class InterColumns:
+    """Copie colonnaire contiguë (ordre chronologique) : snapshot, fichier binaire, analyses."""
+
+    def __init__(self, columns: Optional[Dict[str, array]] = None):
+        self.columns = columns if columns is not None else _empty_columns()
+
+    def __len__(self) -> int:
+        return len(self.columns['numero_resultat'])
+
+    def __getitem__(self, name: str) -> array:
+        return self.columns[name]
+
+    def __iter__(self) -> Iterator[Dict]:
+        return (_entry(*row) for row in zip(*(self.columns[name] for name in _COLUMN_NAMES)))
+
+    def rows(self) -> Iterator[Tuple]:
+        """Lignes (numero_resultat, declencheur, numero_declencheur, result_suit, date ISO)."""
+        c = self.columns
+        for rg, tg, t, s, e in zip(c['numero_resultat'], c['numero_declencheur'], c['declencheur'], c['result_suit'], c['epoch']):
+            yield rg, t, tg, s, _to_iso(e)
+
+    def write(self, path: str) -> None:
+        """Écriture atomique du fichier binaire."""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(INTER_FILE_MAGIC, INTER_FILE_VERSION, len(self)))
+            for name in _COLUMN_NAMES:
+                column = self.columns[name]
+                if sys.byteorder == 'big':
+                    column = array(column.typecode, column)
+                    column.byteswap()
+                f.write(column.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def read(cls, path: str) -> 'InterColumns':
+        """Relit le fichier binaire en une seule lecture."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, count = _HEADER.unpack_from(data)
+        if magic != INTER_FILE_MAGIC or version != INTER_FILE_VERSION:
+            raise ValueError(f"Fichier inter_data binaire inconnu ({magic!r}, v{version})")
+        view, offset, columns = memoryview(data), _HEADER.size, {}
+        for name, code in INTER_COLUMN_TYPES:
+            column = array(code)
+            size = column.itemsize * count
+            column.frombytes(view[offset:offset + size])
+            if sys.byteorder == 'big':
+                column.byteswap()
+            columns[name] = column
+            offset += size
+        return cls(columns)
+
+
+class InterDataWindow:
+    """
+    Tampon circulaire colonnaire des entrées de collecte (ordre chronologique).
+
+    capacity : nombre maximum de jeux conservés (0 = illimité)
+    max_days : âge maximum des entrées en jours (0 = illimité)
+    decay    : facteur de décroissance des compteurs par jeu (1.0 = aucun)
+    """
+
+    def __init__(self, capacity: int = 0, max_days: float = 0, decay: float = 1.0,
+                 entries: Iterable[Dict] = ()):
+        self.capacity = max(0, int(capacity))
+        self.max_days = max_days
+        self.counts = TriggerSuitCounts(decay=decay)
+        self._cols = _empty_columns(self.capacity)
+        # Numéro d'ajout de chaque entrée dans les compteurs (parallèle aux colonnes)
+        self._steps = array('q', bytes(8 * self.capacity))
+        self._head = 0
+        self._size = 0
+        if entries:
+            self.assign(entries)
+
+    # --- Accès séquentiel (compatible avec l'ancienne liste de dicts) ---
+    def _index(self, i: int) -> int:
+        return (self._head + i) % self.capacity if self.capacity else self._head + i
+
+    def _row(self, j: int) -> Dict:
+        c = self._cols
+        return _entry(c['numero_resultat'][j], c['numero_declencheur'][j], c['declencheur'][j],
+                      c['result_suit'][j], c['epoch'][j])
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(self._size):
+            yield self._row(self._index(i))
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._row(self._index(i)) for i in range(*item.indices(self._size))]
+        if item < 0: item += self._size
+        if not 0 <= item < self._size:
+            raise IndexError('InterDataWindow index out of range')
+        return self._row(self._index(item))
+
+    def to_list(self) -> List[Dict]:
+        return list(self)
+
+    def column(self, name: str) -> array:
+        """Copie contiguë d'une colonne, dans l'ordre chronologique."""
+        return self._ordered(self._cols[name])
+
+    def snapshot(self) -> InterColumns:
+        """Copie colonnaire de la fenêtre (pour l'écriture en arrière-plan)."""
+        return InterColumns({name: self.column(name) for name in _COLUMN_NAMES})
+
+    def matrix(self) -> TriggerSuitMatrix:
+        """Matrice de contingence déclencheur x enseigne de toute la fenêtre (non pondérée)."""
+        return TriggerSuitMatrix.from_arrays(self.column('declencheur'), self.column('result_suit'))
+
+    # --- Mutations ---
+    def append(self, entry: Dict) -> Optional[Dict]:
+        """Ajoute une entrée ; renvoie l'entrée évincée si la fenêtre était pleine."""
+        entry = normalize_entry(entry)
+        # Ancienne entrée illisible : ignorée (elle ne compterait pour aucune règle)
+        if entry is None: return None
+        return self._append_values(entry.get('numero_resultat') or 0, entry.get('numero_declencheur') or 0,
+                                   entry['declencheur'], entry['result_suit'], _to_epoch(entry.get('date')))
+
+    def _append_values(self, result_game: int, trigger_game: int, trigger: int, suit: int, epoch: float) -> Optional[Dict]:
+        evicted = None
+        if self.capacity and self._size == self.capacity:
+            evicted = self._popleft()
+        step = self.counts.add(trigger, suit)
+        values = (result_game, trigger_game, trigger, suit, epoch)
+        if self.capacity:
+            j = self._index(self._size)
+            for name, value in zip(_COLUMN_NAMES, values):
+                self._cols[name][j] = value
+            self._steps[j] = step
+        else:
+            for name, value in zip(_COLUMN_NAMES, values):
+                self._cols[name].append(value)
+            self._steps.append(step)
+        self._size += 1
+        return evicted
+
+    def evict_expired(self, now: Optional[datetime] = None) -> List[Dict]:
+        """Évince les entrées plus vieilles que `max_days` (les plus anciennes sont en tête)."""
+        if not self.max_days or not self._size: return []
+        cutoff = ((now or datetime.now()) - timedelta(days=self.max_days)).timestamp()
+        epochs = self._cols['epoch']
+        evicted = []
+        # Une date absente (NaN) est considérée comme expirée
+        while self._size and not epochs[self._head] >= cutoff:
+            evicted.append(self._popleft())
+        return evicted
+
+    def remove_where(self, predicate: Callable[[Dict], bool]) -> List[Dict]:
+        """Retire les entrées correspondant au prédicat (chemin de correction, rare)."""
+        kept, removed = [], []
+        for i in range(self._size):
+            j = self._index(i)
+            entry = self._row(j)
+            if predicate(entry):
+                self.counts.remove_entry(entry, added_at=self._steps[j])
+                removed.append(entry)
+            else:
+                kept.append(j)
+        if removed:
+            columns = {name: array(code, (self._cols[name][j] for j in kept)) for name, code in INTER_COLUMN_TYPES}
+            self._reset_columns(columns, array('q', (self._steps[j] for j in kept)))
+        return removed
+
+    def assign(self, entries: Iterable[Dict]) -> None:
+        """
+        Remplace tout le contenu (chargement, rejeu d'un 'set'), en gardant les plus récentes.
+        Accepte des dicts (anciens fichiers JSON, journal) ou des `InterColumns` (fichier binaire).
+        """
+        self.counts.clear()
+        if not isinstance(entries, InterColumns):
+            columns = _empty_columns()
+            for entry in entries:
+                entry = normalize_entry(entry)
+                if entry is None: continue
+                columns['numero_resultat'].append(entry.get('numero_resultat') or 0)
+                columns['numero_declencheur'].append(entry.get('numero_declencheur') or 0)
+                columns['declencheur'].append(entry['declencheur'])
+                columns['result_suit'].append(entry['result_suit'])
+                columns['epoch'].append(_to_epoch(entry.get('date')))
+            entries = InterColumns(columns)
+
+        start = max(0, len(entries) - self.capacity) if self.capacity else 0
+        columns = {name: entries[name][start:] for name in _COLUMN_NAMES}
+        first = self.counts.add_many(columns['declencheur'], columns['result_suit'])
+        steps = array('q', range(first, first + len(columns['declencheur'])))
+        self._reset_columns(columns, steps)
+
+    def _ordered(self, column: array) -> array:
+        if not self.capacity:
+            return column[self._head:self._head + self._size]
+        end = self._head + self._size
+        if end <= self.capacity:
+            return column[self._head:end]
+        return column[self._head:] + column[:end - self.capacity]
+
+    def _popleft(self) -> Dict:
+        j = self._head
+        entry = self._row(j)
+        self.counts.remove(entry['declencheur'], entry['result_suit'], added_at=self._steps[j])
+        self._size -= 1
+        if self.capacity:
+            self._head = (self._head + 1) % self.capacity
+        else:
+            self._head += 1
+            # Fenêtre illimitée (par jours) : on compacte les colonnes de temps en temps
+            if self._head > 1024 and self._head > self._size:
+                for column in self._cols.values():
+                    del column[:self._head]
+                del self._steps[:self._head]
+                self._head = 0
+        return entry
+
+    def _reset_columns(self, columns: Dict[str, array], steps: array) -> None:
+        """Réinitialise le tampon avec des colonnes contiguës et leurs numéros d'ajout."""
+        size = len(steps)
+        if self.capacity:
+            padding = self.capacity - size
+            self._cols = {name: columns[name] + array(code, bytes(array(code).itemsize * padding))
+                          for name, code in INTER_COLUMN_TYPES}
+            self._steps = steps + array('q', bytes(8 * padding))
+        else:
+            self._cols = {name: array(code, columns[name]) for name, code in INTER_COLUMN_TYPES}
+            self._steps = array('q', steps)
+        self._head = 0
+        self._size = size
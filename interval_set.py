@@ -0,0 +1,116 @@
+# interval_set.py
+
+"""
+Ensemble de numéros de jeu stocké en intervalles contigus.
+
+Les jeux du canal source arrivent presque dans l'ordre (1, 2, 3, ...) : une
+journée entière tient en quelques intervalles [début, fin]. L'appartenance est
+testée d'abord sur le dernier intervalle (cas courant, O(1)), sinon par
+bisection sur les débuts. Le snapshot ne contient que les intervalles
+([[1, 812], [815, 1440]]) ; les ajouts restent journalisés un par un (OP_ADD).
+
+Remplace un `set` de numéros : `in`, `add`, `len`, itération, `clear`.
+"""
+from bisect import bisect_right
+from typing import Any, Iterable, Iterator, List, Optional
+
+
+class IntervalSet:
+    """Ensemble d'entiers compressé en intervalles fermés triés et disjoints."""
+
+    def __init__(self, values: Iterable[Any] = ()):
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._count = 0
+        self.assign(values)
+
+    # --- Lecture ---
+    def __contains__(self, value: Any) -> bool:
+        ends = self._ends
+        if not ends: return False
+        starts = self._starts
+        if value >= starts[-1]: return value <= ends[-1]
+        i = bisect_right(starts, value) - 1
+        return i >= 0 and value <= ends[i]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in zip(self._starts, self._ends):
+            yield from range(start, end + 1)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, IntervalSet):
+            return self._starts == other._starts and self._ends == other._ends
+        if isinstance(other, (set, frozenset)):
+            return len(other) == self._count and all(v in self for v in other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"IntervalSet({self.runs()})"
+
+    @property
+    def last(self) -> Optional[int]:
+        """Plus grand numéro présent (None si vide)."""
+        return self._ends[-1] if self._ends else None
+
+    def runs(self) -> List[List[int]]:
+        """Intervalles [début, fin] (bornes incluses), forme sérialisée."""
+        return [[start, end] for start, end in zip(self._starts, self._ends)]
+
+    def snapshot(self) -> List[List[int]]:
+        return self.runs()
+
+    # --- Écriture ---
+    def add(self, value: Any) -> bool:
+        """Ajoute un numéro ; False s'il était déjà présent."""
+        value = int(value)
+        starts, ends = self._starts, self._ends
+        i = bisect_right(starts, value) - 1
+        if i >= 0 and value <= ends[i]: return False
+
+        joins_left = i >= 0 and ends[i] == value - 1
+        joins_right = i + 1 < len(starts) and starts[i + 1] == value + 1
+        if joins_left and joins_right:
+            ends[i] = ends[i + 1]
+            del starts[i + 1], ends[i + 1]
+        elif joins_left:
+            ends[i] = value
+        elif joins_right:
+            starts[i + 1] = value
+        else:
+            starts.insert(i + 1, value)
+            ends.insert(i + 1, value)
+        self._count += 1
+        return True
+
+    def update(self, values: Iterable[Any]) -> None:
+        for value in values:
+            self.add(value)
+
+    def clear(self) -> None:
+        self._starts.clear()
+        self._ends.clear()
+        self._count = 0
+
+    def assign(self, values: Iterable[Any]) -> None:
+        """
+        Recharge le contenu sur place : intervalles [[début, fin], ...] (snapshot),
+        numéros isolés (ancien processed.json, set) ou un autre IntervalSet.
+        """
+        self.clear()
+        if isinstance(values, IntervalSet):
+            values = values.runs()
+        for item in values or ():
+            if isinstance(item, (list, tuple)):
+                start, end = int(item[0]), int(item[1])
+                if not self._ends or start > self._ends[-1] + 1:
+                    # Intervalles du snapshot : déjà triés et disjoints
+                    self._starts.append(start)
+                    self._ends.append(end)
+                    self._count += end - start + 1
+                else:
+                    self.update(range(start, end + 1))
+            else:
+                self.add(item)
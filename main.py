@@ -11,6 +11,8 @@ import requests
 # Importe la configuration et le bot
 from config import Config
 from bot import TelegramBot 
+from update_queue import UpdateQueue
+from process_lock import run_once
 
 # Configure logging
 logging.basicConfig(
@@ -19,6 +21,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Verrou de démarrage : avec plusieurs workers gunicorn, un seul configure le webhook
+WEBHOOK_SETUP_LOCK = 'webhook_setup.lock'
+
 # Initialize bot and config
 try:
     config = Config()
@@ -29,6 +34,10 @@ except ValueError as e:
 # 'bot' est l'instance de la classe TelegramBot
 bot = TelegramBot(config.BOT_TOKEN) 
 
+# Mode WEBHOOK_ASYNC : le webhook met en file, les workers traitent chaque canal dans l'ordre
+update_queue = UpdateQueue(bot.handle_update, maxsize=config.UPDATE_QUEUE_MAXSIZE,
+                           workers=config.UPDATE_WORKERS) if config.WEBHOOK_ASYNC else None
+
 # Initialize Flask app
 app = Flask(__name__)
 
@@ -43,9 +52,20 @@ def webhook():
         if not update:
             return jsonify({'status': 'ok'}), 200
 
+        if not isinstance(update, dict) or not isinstance(update.get('update_id'), int):
+            logger.warning("⚠️ Webhook : payload invalide ignoré (update_id manquant)")
+            return jsonify({'status': 'invalid'}), 400
+
+        # Mode asynchrone : acquittement immédiat, traitement par le consommateur
+        if update_queue is not None:
+            if not update_queue.put(update):
+                # File pleine : Telegram renverra l'update plus tard
+                logger.error("🚨 File des updates pleine : update refusée")
+                return jsonify({'status': 'busy'}), 503
+            return 'OK', 200
+
         # Délégation du traitement complet à bot.handle_update
-        if update:
-            bot.handle_update(update)
+        bot.handle_update(update)
         
         return 'OK', 200
     except Exception as e:
@@ -57,6 +77,13 @@ def health_check():
     """Health check endpoint for render.com"""
     return {'status': 'healthy', 'service': 'telegram-bot'}, 200
 
+@app.route('/queue', methods=['GET'])
+def queue_stats():
+    """Profondeur et retard de la file des updates (mode WEBHOOK_ASYNC)"""
+    if update_queue is None:
+        return {'mode': 'sync'}, 200
+    return {'mode': 'async', **update_queue.stats()}, 200
+
 @app.route('/', methods=['GET'])
 def home():
     """Root endpoint"""
@@ -94,8 +121,8 @@ def setup_webhook():
     except Exception as e:
         logger.error(f"❌ Erreur critique lors du setup du webhook: {e}")
 
-# Configure webhook au démarrage (fonctionne avec Gunicorn)
-setup_webhook()
+# Configure webhook au démarrage (fonctionne avec Gunicorn) : une seule fois pour tous les workers
+run_once(os.path.join(os.getcwd(), WEBHOOK_SETUP_LOCK), setup_webhook)
 
 if __name__ == '__main__':
     # Get port from environment 
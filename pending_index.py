@@ -0,0 +1,61 @@
+# pending_index.py
+
+"""
+Index des prédictions en attente, par numéro de jeu de vérification.
+
+Une prédiction pour le jeu N peut être tranchée par les résultats des jeux
+N .. N+window. Elle est inscrite sous chacun de ces numéros : le résultat du
+jeu G ne consulte donc que les prédictions qui le concernent, au lieu de
+parcourir toutes celles de la journée. Une prédiction gagnée ou perdue est
+retirée aussitôt de l'index (elle reste dans `predictions` pour l'historique).
+"""
+from typing import Dict, Iterable, List, Set
+
+
+class PendingIndex:
+    """Numéro de jeu de vérification -> numéros des prédictions en attente."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._by_game: Dict[int, Set[int]] = {}
+        self._pending: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, predicted_game: int) -> bool:
+        return predicted_game in self._pending
+
+    def add(self, predicted_game: int) -> None:
+        if predicted_game in self._pending: return
+        self._pending.add(predicted_game)
+        for game in range(predicted_game, predicted_game + self.window + 1):
+            self._by_game.setdefault(game, set()).add(predicted_game)
+
+    def discard(self, predicted_game: int) -> None:
+        if predicted_game not in self._pending: return
+        self._pending.discard(predicted_game)
+        for game in range(predicted_game, predicted_game + self.window + 1):
+            entries = self._by_game.get(game)
+            if entries is None: continue
+            entries.discard(predicted_game)
+            if not entries: del self._by_game[game]
+
+    def candidates(self, game_number: int) -> List[int]:
+        """Prédictions en attente vérifiables par ce jeu, par numéro croissant."""
+        entries = self._by_game.get(game_number)
+        return sorted(entries) if entries else []
+
+    def clear(self) -> None:
+        self._by_game.clear()
+        self._pending.clear()
+
+    def rebuild(self, predictions: Dict[int, Dict]) -> None:
+        """Reconstruit l'index depuis `predictions` (chargement, rejeu du journal, reset)."""
+        self.clear()
+        self.add_many(game for game, prediction in predictions.items()
+                      if isinstance(prediction, dict) and prediction.get('status') == 'pending')
+
+    def add_many(self, predicted_games: Iterable[int]) -> None:
+        for predicted_game in predicted_games:
+            self.add(predicted_game)
@@ -0,0 +1,163 @@
+# polling.py
+
+"""
+Point d'entrée alternatif au webhook : ingestion par long polling (getUpdates).
+
+Aucune URL HTTPS publique n'est nécessaire (staging, tests de charge). Les
+updates sont lues par lots (`offset`, `limit`), traitées dans l'ordre par
+`TelegramBot.handle_update`, puis l'état est écrit une seule fois par lot et
+l'offset suivant est persisté. L'offset n'est confirmé qu'après l'écriture de
+l'état : un arrêt brutal fait relire le lot, les doublons étant absorbés par
+la fenêtre d'update_id.
+
+Avec UPDATE_WORKERS > 1, le lot est réparti sur des workers par canal
+(update_queue) : chaque canal reste dans l'ordre, les canaux indépendants et
+les commandes sont traités en parallèle, et le lot est attendu en entier
+avant l'écriture de l'état et de l'offset.
+
+Usage : BOT_TOKEN=... python polling.py
+(TELEGRAM_API_BASE permet de viser un serveur d'API local.)
+"""
+import json
+import logging
+import os
+import signal
+import time
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from bot import TelegramBot, ALLOWED_UPDATES
+from update_queue import UpdateQueue
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+POLLING_OFFSET_FILE = 'polling_offset.json'
+# Attente côté serveur (s) et taille max d'un lot (100 = maximum de l'API)
+POLL_TIMEOUT = int(os.getenv('POLL_TIMEOUT') or 30)
+POLL_LIMIT = int(os.getenv('POLL_LIMIT') or 100)
+# Pause après une erreur réseau ou API, doublée à chaque échec consécutif
+POLL_RETRY_DELAY = float(os.getenv('POLL_RETRY_DELAY') or 1.0)
+POLL_MAX_RETRY_DELAY = 30.0
+UPDATE_WORKERS = max(1, int(os.getenv('UPDATE_WORKERS') or 1))
+
+
+class UpdatePoller:
+    """Boucle getUpdates -> handle_update, une écriture d'état et d'offset par lot."""
+
+    def __init__(self, bot: TelegramBot, offset_file: str = POLLING_OFFSET_FILE,
+                 timeout: int = POLL_TIMEOUT, limit: int = POLL_LIMIT, workers: int = UPDATE_WORKERS):
+        self.bot = bot
+        self.offset_path = os.path.join(os.getcwd(), offset_file)
+        self.timeout = timeout
+        self.limit = max(1, min(100, limit))
+        self.session = requests.Session()
+        self.queue = UpdateQueue(bot.handle_update, workers=workers) if workers > 1 else None
+        self.offset: Optional[int] = self._load_offset()
+        self._stopped = False
+        self.batches = 0
+        self.processed = 0
+
+    def stop(self, *_args) -> None:
+        self._stopped = True
+
+    def run(self) -> None:
+        """Boucle jusqu'à `stop()` (SIGINT/SIGTERM)."""
+        if not self.bot.delete_webhook():
+            logger.warning("⚠️ deleteWebhook a échoué : getUpdates renverra 409 tant qu'un webhook est actif")
+        logger.info(f"📡 Long polling démarré (offset={self.offset}, limit={self.limit}, timeout={self.timeout}s)")
+
+        retry_delay = POLL_RETRY_DELAY
+        while not self._stopped:
+            updates = self.fetch()
+            if updates is None:
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, POLL_MAX_RETRY_DELAY)
+                continue
+            retry_delay = POLL_RETRY_DELAY
+            if updates:
+                self.process_batch(updates)
+
+        if self.queue:
+            self.queue.close()
+        self.flush()
+        self.session.close()
+        logger.info(f"🛑 Long polling arrêté ({self.processed} update(s) en {self.batches} lot(s))")
+
+    def fetch(self) -> Optional[List[Dict[str, Any]]]:
+        """Un appel getUpdates ; None en cas d'erreur."""
+        payload = {'timeout': self.timeout, 'limit': self.limit, 'allowed_updates': ALLOWED_UPDATES}
+        if self.offset is not None:
+            payload['offset'] = self.offset
+        try:
+            response = self.session.post(f"{self.bot.base_url}/getUpdates", json=payload,
+                                         timeout=(5, self.timeout + 10))
+            data = response.json()
+            if response.status_code == 200 and data.get('ok'):
+                return data.get('result') or []
+            logger.error(f"❌ Erreur getUpdates ({response.status_code}): {data.get('description')}")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"❌ Exception getUpdates: {e}")
+        return None
+
+    def process_batch(self, updates: List[Dict[str, Any]]) -> None:
+        """Traite le lot dans l'ordre, écrit l'état une fois, puis confirme l'offset."""
+        if self.queue:
+            for update in updates:
+                self.queue.put(update, block=True)
+            self.queue.join()
+        else:
+            for update in updates:
+                self.bot.handle_update(update)
+        self.flush()
+        self.offset = max(update['update_id'] for update in updates) + 1
+        self._save_offset()
+        self.batches += 1
+        self.processed += len(updates)
+        logger.info(f"📥 Lot de {len(updates)} update(s) traité (offset={self.offset})")
+
+    def flush(self) -> None:
+        # Tous les shards (predictor par défaut compris) avant d'avancer l'offset
+        if self.bot.handlers.card_predictor:
+            self.bot.handlers.router.flush_state()
+        self.bot.dedup.save()
+
+    def _load_offset(self) -> Optional[int]:
+        try:
+            if os.path.exists(self.offset_path):
+                with open(self.offset_path, 'r', encoding='utf-8') as f:
+                    offset = json.load(f)
+                return offset if isinstance(offset, int) else None
+        except Exception as e:
+            logger.error(f"Erreur de chargement {POLLING_OFFSET_FILE}: {e}")
+        return None
+
+    def _save_offset(self) -> None:
+        try:
+            tmp_path = self.offset_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.offset, f)
+            os.replace(tmp_path, self.offset_path)
+        except Exception as e:
+            logger.error(f"Erreur de sauvegarde {POLLING_OFFSET_FILE}: {e}")
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    token = os.getenv('BOT_TOKEN')
+    if not token:
+        logger.error("❌ BOT_TOKEN environment variable not set.")
+        raise SystemExit(1)
+
+    poller = UpdatePoller(TelegramBot(token))
+    signal.signal(signal.SIGINT, poller.stop)
+    signal.signal(signal.SIGTERM, poller.stop)
+    poller.run()
+
+
+if __name__ == '__main__':
+    main()
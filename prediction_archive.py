@@ -0,0 +1,125 @@
+# prediction_archive.py
+
+"""
+Archive permanente des prédictions tranchées, par segments quotidiens compressés.
+
+L'état vivant (`predictions`) ne garde que les prédictions en attente et les
+quelques dernières tranchées ; les plus anciennes sont ajoutées à la fin du
+segment de leur journée de prédiction (`predictions-AAAA-MM-JJ.jsonl.gz`).
+Chaque ajout est un membre gzip indépendant : le fichier n'est jamais réécrit,
+et une fin tronquée par un arrêt brutal ne fait perdre que le dernier lot.
+
+Un lot peut être archivé deux fois si l'arrêt survient avant l'écriture de
+l'état qui le retire : la lecture ignore les enregistrements identiques.
+
+Usage : python prediction_archive.py [AAAA-MM-JJ ...] [--dir prediction_archive]
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import zlib
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+SEGMENT_PREFIX = 'predictions-'
+SEGMENT_SUFFIX = '.jsonl.gz'
+
+
+def settled_overflow(predictions: Dict[int, Dict], keep: int) -> List[int]:
+    """
+    Numéros des prédictions tranchées à sortir de la mémoire (les plus anciennes),
+    pour n'en garder que `keep`. Rien n'est renvoyé tant qu'il y en a moins de
+    2 x keep : l'archive est écrite par lots et non à chaque résultat.
+    """
+    settled = [game for game, prediction in predictions.items() if prediction.get('status') != 'pending']
+    if len(settled) <= 2 * keep: return []
+    settled.sort()
+    return settled[:len(settled) - keep]
+
+
+class PredictionArchive:
+    """Segments quotidiens append-only des prédictions sorties de l'état vivant."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def segment_path(self, day: str) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{day}{SEGMENT_SUFFIX}")
+
+    def append(self, day: str, predictions: Dict[int, Dict]) -> int:
+        """Ajoute un lot {numéro: prédiction} au segment du jour ; renvoie le nombre archivé."""
+        if not predictions: return 0
+        lines = ''.join(json.dumps({'game': game, 'day': day, **prediction}, ensure_ascii=False, sort_keys=True) + '\n'
+                        for game, prediction in sorted(predictions.items()))
+        # Membre compressé en mémoire puis ajouté en une seule écriture
+        member = gzip.compress(lines.encode('utf-8'))
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.segment_path(day), 'ab') as f:
+            f.write(member)
+        logger.info(f"🗃️ {len(predictions)} prédiction(s) archivée(s) ({day}).")
+        return len(predictions)
+
+    def days(self) -> List[str]:
+        """Journées disponibles, par ordre chronologique."""
+        if not os.path.isdir(self.directory): return []
+        return sorted(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)] for name in os.listdir(self.directory)
+                      if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX))
+
+    def read(self, day: str) -> List[Dict[str, Any]]:
+        """Prédictions archivées d'une journée, dans l'ordre d'archivage, sans doublons."""
+        path = self.segment_path(day)
+        if not os.path.exists(path): return []
+
+        records, seen = [], set()
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    if line in seen: continue
+                    seen.add(line)
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+            except (EOFError, OSError, zlib.error) as e:
+                # Dernier membre tronqué (arrêt pendant l'écriture) : le reste est lisible
+                logger.warning(f"⚠️ Segment {path} tronqué, lecture arrêtée : {e}")
+        return records
+
+    def iter_records(self, start_day: Optional[str] = None, end_day: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Prédictions archivées entre deux journées incluses (bornes optionnelles)."""
+        for day in self.days():
+            if start_day and day < start_day: continue
+            if end_day and day > end_day: break
+            yield from self.read(day)
+
+    def summary(self, day: str) -> Dict[str, int]:
+        """Effectifs par statut pour une journée."""
+        counts: Dict[str, int] = {}
+        for record in self.read(day):
+            status = record.get('status', 'pending')
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from card_predictor import PREDICTION_ARCHIVE_DIR
+
+    parser = argparse.ArgumentParser(description="Résumé de l'archive des prédictions")
+    parser.add_argument('days', nargs='*', help="Journées (AAAA-MM-JJ) ; toutes par défaut")
+    parser.add_argument('--dir', default=PREDICTION_ARCHIVE_DIR, help="Répertoire de l'archive")
+    args = parser.parse_args(argv)
+
+    archive = PredictionArchive(args.dir)
+    for day in args.days or archive.days():
+        counts = archive.summary(day)
+        settled = counts.get('won', 0) + counts.get('lost', 0)
+        rate = f"{counts.get('won', 0) / settled:.1%}" if settled else '-'
+        print(f"{day}  ✅{counts.get('won', 0)}  ❌{counts.get('lost', 0)}  ⏳{counts.get('pending', 0)}  (taux {rate})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# process_lock.py
+
+"""
+Verrous partagés entre processus (plusieurs workers gunicorn sur le même disque).
+
+`ProcessLock` est un verrou exclusif sur un fichier (flock) : un seul worker à
+la fois traite les updates d'un état partagé. Il est réentrant dans un même
+processus (le verrou de fichier n'est pris qu'au premier niveau) et sûr entre
+les threads d'un worker.
+
+`run_once` exécute une tâche de démarrage (ex: setWebhook) dans un seul worker :
+le premier qui obtient le verrou la lance et le garde jusqu'à sa sortie, les
+autres l'ignorent. Si ce worker est remplacé, son successeur la relance (la
+tâche doit donc être idempotente).
+
+Sans `fcntl` (Windows), seuls les threads du processus sont synchronisés.
+"""
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - plateformes sans flock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Verrous run_once gardés ouverts (et donc pris) pendant toute la vie du processus
+_held_once: Dict[str, Any] = {}
+
+
+class ProcessLock:
+    """Verrou exclusif réentrant, partagé entre threads et processus via un fichier."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self) -> None:
+        self._thread_lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, 'a+')
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            except Exception:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+    def __enter__(self) -> 'ProcessLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self.release()
+
+    def close(self) -> None:
+        with self._thread_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def run_once(path: str, task: Callable[[], Any]) -> Optional[Any]:
+    """
+    Lance `task` si aucun autre processus vivant ne l'a fait (verrou non bloquant
+    sur `path`) ; renvoie son résultat, ou None si un autre worker s'en charge.
+    """
+    if fcntl is None:
+        return task()
+    if path in _held_once:
+        return None
+    handle = open(path, 'a+')
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        logger.info(f"⏭️ {os.path.basename(path)} : tâche de démarrage déjà prise par un autre worker")
+        return None
+    _held_once[path] = handle
+    return task()
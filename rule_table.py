@@ -0,0 +1,59 @@
+# rule_table.py
+
+"""
+Table de règles compilée : 52 cases (une par carte canonique) donnant
+l'enseigne à prédire et la source de la règle (INTER ou STATIQUE).
+
+La priorité INTER > STATIQUE est résolue une seule fois, à la compilation
+(analyse des règles, bascule du mode). La table est un tuple immuable : la
+remplacer par une nouvelle est une simple affectation, donc atomique pour
+le thread webhook, et la décision par message est un seul accès indexé.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cards import CARD_COUNT, Suit, as_card_id, as_suit
+
+SOURCE_INTER = 'INTER'
+SOURCE_STATIC = 'STATIC'
+
+# Case de la table : (enseigne_prédite, source) ou None
+RuleSlot = Optional[Tuple[Suit, str]]
+RuleTable = Tuple[RuleSlot, ...]
+
+EMPTY_TABLE: RuleTable = (None,) * CARD_COUNT
+
+
+def normalize_rules(smart_rules: Iterable[Dict]) -> List[Dict]:
+    """
+    Règles INTER encodées : 'trigger' (id de carte), 'predict' et 'result_suit' (Suit).
+    Les règles persistées sous forme d'emoji sont converties, les illisibles ignorées.
+    """
+    rules = []
+    for rule in smart_rules or ():
+        trigger = as_card_id(rule.get('trigger'))
+        predict = as_suit(rule.get('predict'))
+        if trigger is None or predict is None: continue
+        # Suit.SPADES vaut 0 : tester None, pas la valeur de vérité
+        result_suit = as_suit(rule.get('result_suit'))
+        if result_suit is None: result_suit = predict
+        rules.append({**rule, 'trigger': trigger, 'predict': predict, 'result_suit': result_suit})
+    return rules
+
+
+def compile_rules(smart_rules: Iterable[Dict], static_rules: Dict[str, str], inter_active: bool) -> RuleTable:
+    """Compile les règles INTER (si actives, déjà normalisées) puis STATIQUES en une table de 52 cases."""
+    table = [None] * CARD_COUNT
+
+    if inter_active:
+        for rule in smart_rules or ():
+            cid = rule['trigger']
+            # La première règle INTER d'un déclencheur l'emporte (comme l'ancien parcours linéaire)
+            if table[cid] is None:
+                table[cid] = (rule['predict'], SOURCE_INTER)
+
+    for trigger, predicted_suit in static_rules.items():
+        cid = as_card_id(trigger)
+        if cid is not None and table[cid] is None:
+            table[cid] = (as_suit(predicted_suit), SOURCE_STATIC)
+
+    return tuple(table)
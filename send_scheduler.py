@@ -0,0 +1,152 @@
+# send_scheduler.py
+
+"""
+Ordonnanceur des envois sortants vers Telegram.
+
+- un seau à jetons par chat (1 msg/s en privé, 20 msg/min en groupe/canal)
+  et un seau global (30 msg/s) ;
+- un 429 bloque le chat pendant `retry_after` : l'envoi est remis en tête
+  de sa file au lieu d'être perdu ;
+- priorités : prédictions > éditions > messages d'administration ;
+- un seul envoi en cours par chat, donc l'ordre d'un chat est conservé à
+  priorité égale.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+PRIORITY_PREDICTION = 0
+PRIORITY_EDIT = 1
+PRIORITY_ADMIN = 2
+
+# Limites Telegram (par défaut celles documentées par l'API Bot)
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE') or 1.0)                 # msg/s, chat privé
+TELEGRAM_GROUP_RATE_PER_MIN = float(os.getenv('TELEGRAM_GROUP_RATE_PER_MIN') or 20)  # msg/min, groupe ou canal
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE') or 30)               # msg/s, tout le bot
+TELEGRAM_CHAT_BURST = int(os.getenv('TELEGRAM_CHAT_BURST') or 3)
+
+
+class TokenBucket:
+    """Seau à jetons : `rate` jetons par seconde, au plus `capacity` en réserve."""
+
+    def __init__(self, rate: float, capacity: float, now: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Secondes avant qu'un jeton soit disponible (0 s'il y en a un)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+
+class SendScheduler:
+    """File de priorité par chat, partagée par les workers d'envoi."""
+
+    def __init__(self, chat_rate: float = TELEGRAM_CHAT_RATE, group_rate_per_min: float = TELEGRAM_GROUP_RATE_PER_MIN,
+                 global_rate: float = TELEGRAM_GLOBAL_RATE, burst: int = TELEGRAM_CHAT_BURST):
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate_per_min / 60.0
+        self.burst = burst
+        self._global = TokenBucket(global_rate, global_rate)
+        self._buckets: Dict[Any, TokenBucket] = {}
+        self._queues: Dict[Any, List[Tuple[int, int, Any]]] = {}
+        self._blocked_until: Dict[Any, float] = {}
+        self._busy: Set[Any] = set()
+        self._seq = itertools.count()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def put(self, chat_id: Any, job: Any, priority: int = PRIORITY_ADMIN) -> None:
+        with self._cond:
+            self._push(chat_id, (priority, next(self._seq), job))
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Tuple[Any, Any]]:
+        """
+        Attend le prochain envoi autorisé et renvoie (chat_id, job) ; le chat reste
+        réservé jusqu'à `done()`. None si l'ordonnanceur est fermé et vide (ou délai écoulé).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                best, wait = self._pick(now)
+                if best is not None:
+                    chat_id = best
+                    priority, seq, job = heapq.heappop(self._queues[chat_id])
+                    if not self._queues[chat_id]: del self._queues[chat_id]
+                    self._size -= 1
+                    self._busy.add(chat_id)
+                    self._bucket(chat_id).take(now)
+                    self._global.take(now)
+                    return chat_id, (priority, seq, job)
+                if self._closed and not self._size: return None
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0: return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+    def done(self, chat_id: Any, entry: Tuple[int, int, Any], retry_after: Optional[float] = None,
+             requeue: bool = True) -> None:
+        """
+        Libère le chat ; avec `retry_after` (429), le chat est bloqué et l'envoi remis
+        en tête (sauf requeue=False : il a été remplacé par un envoi déjà en file).
+        """
+        with self._cond:
+            self._busy.discard(chat_id)
+            if retry_after is not None:
+                self._blocked_until[chat_id] = time.monotonic() + retry_after
+                if requeue: self._push(chat_id, entry)
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    # --- Interne (verrou tenu) ---
+    def _push(self, chat_id: Any, entry: Tuple[int, int, Any]) -> None:
+        heapq.heappush(self._queues.setdefault(chat_id, []), entry)
+        self._size += 1
+
+    def _bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            # Les ids négatifs sont des groupes ou des canaux (limite par minute)
+            is_group = isinstance(chat_id, int) and chat_id < 0
+            bucket = TokenBucket(self.group_rate if is_group else self.chat_rate, self.burst)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    def _pick(self, now: float) -> Tuple[Optional[Any], Optional[float]]:
+        """Chat prêt dont la tête de file a la meilleure priorité, sinon délai avant le prochain."""
+        best, best_key, wait = None, None, None
+        global_delay = self._global.delay(now)
+        for chat_id, jobs in self._queues.items():
+            if chat_id in self._busy: continue
+            delay = max(self._blocked_until.get(chat_id, 0) - now, self._bucket(chat_id).delay(now), global_delay)
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            key = jobs[0][:2]
+            if best_key is None or key < best_key:
+                best, best_key = chat_id, key
+        return best, wait
@@ -0,0 +1,393 @@
+# sqlite_store.py
+
+"""
+Backend SQLite (optionnel) pour l'état de CardPredictor.
+
+Même vocabulaire d'opérations que le journal (state_journal.py), mais chaque
+mutation devient une écriture d'une seule ligne dans une table :
+prédictions par numéro de jeu, inter_data, sequential_history et
+les ensembles de jeux (un numéro par ligne, ou un intervalle de numéros
+consécutifs par ligne pour processed_messages). Les autres champs (scalaires, règles, config) vivent
+dans une table clé/valeur. Activé avec STATE_BACKEND=sqlite.
+
+La base ne sert qu'à persister : les recherches (prédiction en attente du
+jeu N, etc.) passent par les structures en mémoire du predictor.
+
+Plusieurs processus peuvent partager la base (SHARED_STATE) : `data_version`
+signale les écritures des autres connexions et la table field_versions dit
+quels champs elles ont touchés ; seuls ces champs sont rechargés (les lignes
+ajoutées à inter_data, sans relire la fenêtre entière). `claim_prediction`
+réserve un jeu à prédire par un INSERT atomique, si bien qu'un seul worker
+publie la prédiction d'un numéro.
+"""
+import json
+import sqlite3
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from state_journal import OP_SET, OP_PUT, OP_DEL, OP_ADD, OP_APPEND, OP_PRUNE, apply_record, assign_field
+from interval_set import IntervalSet
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_DB_FILE = 'bot_state.sqlite3'
+
+INTER_COLUMNS = ('numero_resultat', 'declencheur', 'numero_declencheur', 'result_suit', 'date')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    game INTEGER PRIMARY KEY,
+    status TEXT,
+    data TEXT NOT NULL
+);
+-- Index (status, game) des premières versions : jamais lu, supprimé
+DROP INDEX IF EXISTS idx_predictions_status;
+
+CREATE TABLE IF NOT EXISTS inter_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    numero_resultat INTEGER,
+    declencheur INTEGER,          -- id de carte (0..51) ; TEXT dans les anciennes bases
+    numero_declencheur INTEGER,
+    result_suit INTEGER,          -- index d'enseigne (cards.Suit)
+    date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_inter_data_resultat ON inter_data (numero_resultat);
+
+CREATE TABLE IF NOT EXISTS sequential_history (
+    game INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS game_sets (
+    field TEXT NOT NULL,
+    game INTEGER NOT NULL,
+    PRIMARY KEY (field, game)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS game_runs (
+    field TEXT NOT NULL,
+    start_game INTEGER NOT NULL,
+    end_game INTEGER NOT NULL,   -- borne incluse
+    PRIMARY KEY (field, start_game)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS prediction_claims (
+    day TEXT NOT NULL,           -- journée de reset (les numéros repartent chaque jour)
+    game INTEGER NOT NULL,
+    claimed_at REAL NOT NULL,
+    PRIMARY KEY (day, game)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS field_versions (
+    field TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,     -- +1 à chaque transaction qui modifie le champ
+    generation INTEGER NOT NULL   -- +1 quand le champ est réécrit en entier (OP_SET)
+);
+
+CREATE TABLE IF NOT EXISTS kv (
+    field TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Champs stockés ligne par ligne (les autres vont dans la table kv)
+SET_FIELDS = ('collected_games',)
+# Ensembles de numéros presque contigus, stockés en intervalles (IntervalSet)
+INTERVAL_FIELDS = ('processed_messages',)
+TABLE_FIELDS = ('predictions', 'inter_data', 'sequential_history') + SET_FIELDS + INTERVAL_FIELDS
+
+
+def _int_keys(value: Any) -> Any:
+    """Les clés JSON sont des chaînes : on restaure les numéros de jeu en int."""
+    if isinstance(value, dict):
+        return {int(k) if str(k).lstrip('-').isdigit() else k: v for k, v in value.items()}
+    return value
+
+
+class SQLiteStateStore:
+    """Stockage transactionnel de l'état (WAL), une ligne par mutation."""
+
+    def __init__(self, path: str = DEFAULT_DB_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        # Champs modifiés par la transaction en cours : {champ: réécrit en entier}
+        self._touched: Dict[str, bool] = {}
+        # Versions déjà présentes en mémoire, {champ: (version, génération)}
+        self._seen_versions: Dict[str, Tuple[int, int]] = {}
+        self._inter_last_id = 0
+        self._data_version = self.data_version()
+
+    # --- Interface commune avec StateJournal ---
+    def should_compact(self) -> bool:
+        return False
+
+    def has_state(self) -> bool:
+        with self._lock:
+            return self.conn.execute('SELECT 1 FROM kv LIMIT 1').fetchone() is not None
+
+    def replay(self, target: Any) -> int:
+        """Charge l'état complet depuis la base dans les attributs de `target`."""
+        with self._lock:
+            self._data_version = self.data_version()
+            self._seen_versions = {field: (version, generation) for field, version, generation
+                                   in self.conn.execute('SELECT field, version, generation FROM field_versions')}
+            for field in TABLE_FIELDS:
+                self._load_table_field(target, field)
+            self._load_kv(target)
+        logger.info(f"🗄️ État chargé depuis SQLite ({self.path}) : {len(target.inter_data)} jeux collectés, {len(target.predictions)} prédictions.")
+        return 0
+
+    def _load_table_field(self, target: Any, field: str) -> None:
+        c = self.conn
+        if field == 'predictions':
+            target.predictions = {game: json.loads(data) for game, data in c.execute('SELECT game, data FROM predictions ORDER BY game')}
+        elif field == 'inter_data':
+            rows = c.execute(f"SELECT id, {', '.join(INTER_COLUMNS)} FROM inter_data ORDER BY id").fetchall()
+            assign_field(target, 'inter_data', [dict(zip(INTER_COLUMNS, row[1:])) for row in rows])
+            self._inter_last_id = rows[-1][0] if rows else 0
+            # Anciennes bases : lignes déjà sorties de la fenêtre (jamais supprimées avant OP_PRUNE)
+            excess = len(rows) - len(target.inter_data)
+            if excess > 0:
+                self._prune_inter_data(excess)
+        elif field == 'sequential_history':
+            assign_field(target, 'sequential_history', {game: json.loads(data) for game, data in c.execute('SELECT game, data FROM sequential_history')})
+        elif field in SET_FIELDS:
+            if hasattr(target, field):
+                assign_field(target, field, [g for (g,) in c.execute('SELECT game FROM game_sets WHERE field = ?', (field,))])
+        elif field in INTERVAL_FIELDS:
+            if hasattr(target, field):
+                # Les anciennes bases gardent un numéro par ligne dans game_sets
+                runs = c.execute('SELECT start_game, end_game FROM game_runs WHERE field = ? ORDER BY start_game', (field,)).fetchall()
+                legacy = [g for (g,) in c.execute('SELECT game FROM game_sets WHERE field = ?', (field,))]
+                assign_field(target, field, runs + legacy)
+
+    def _load_kv(self, target: Any, fields: Optional[Iterable[str]] = None) -> None:
+        if fields is None:
+            rows = self.conn.execute('SELECT field, value FROM kv')
+        else:
+            fields = list(fields)
+            rows = self.conn.execute(f"SELECT field, value FROM kv WHERE field IN ({', '.join('?' * len(fields))})", fields)
+        for field, value in rows:
+            assign_field(target, field, _int_keys(json.loads(value)))
+
+    def _load_new_inter_rows(self, target: Any) -> None:
+        """Ajoute à la fenêtre les lignes écrites par un autre processus (elle s'évince comme lui)."""
+        rows = self.conn.execute(f"SELECT id, {', '.join(INTER_COLUMNS)} FROM inter_data WHERE id > ? ORDER BY id",
+                                 (self._inter_last_id,)).fetchall()
+        if not rows: return
+        target.inter_data.evict_expired()
+        for row in rows:
+            target.inter_data.append(dict(zip(INTER_COLUMNS, row[1:])))
+        self._inter_last_id = rows[-1][0]
+
+    def append(self, op: str, field: str, key: Any = None, value: Any = None) -> None:
+        """Applique une mutation en une écriture de ligne (transaction implicite)."""
+        with self._lock, self.transaction():
+            self._apply(op, field, key, value)
+
+    def append_many(self, records: List[dict]) -> None:
+        """Applique un lot de mutations dans une seule transaction (group commit)."""
+        with self._lock, self.transaction():
+            for r in records:
+                self._apply(r['op'], r['field'], r.get('key'), r.get('value'))
+
+    def reset(self) -> None:
+        pass
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+    # --- Snapshot complet (migration JSON -> SQLite, resets) ---
+    def save_all(self, state: Dict[str, Any]) -> None:
+        """Réécrit tous les champs de `state` ({champ: valeur}) en une transaction."""
+        with self._lock, self.transaction():
+            for field, value in state.items():
+                self._apply(OP_SET, field, None, value)
+
+    @contextmanager
+    def transaction(self):
+        """Regroupe plusieurs mutations dans une seule transaction (réentrant)."""
+        with self._lock:
+            if self._batch_depth == 0:
+                self.conn.execute('BEGIN IMMEDIATE')
+            self._batch_depth += 1
+            try:
+                yield self.conn
+            except Exception:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._touched = {}
+                    self.conn.execute('ROLLBACK')
+                raise
+            else:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._bump_versions()
+                    self.conn.execute('COMMIT')
+
+    # --- Partage entre processus ---
+    def data_version(self) -> int:
+        """Compteur SQLite modifié par chaque commit d'une *autre* connexion."""
+        with self._lock:
+            return self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _bump_versions(self) -> None:
+        """Versions des champs modifiés par la transaction (avant COMMIT, écriture verrouillée)."""
+        touched, self._touched = self._touched, {}
+        if not touched: return
+        c = self.conn
+        c.executemany('INSERT INTO field_versions (field, version, generation) VALUES (?, 1, ?) '
+                      'ON CONFLICT(field) DO UPDATE SET version = version + 1, generation = generation + excluded.generation',
+                      [(field, int(rewritten)) for field, rewritten in touched.items()])
+        # Nos propres écritures sont déjà en mémoire : rien à recharger pour elles
+        fields = list(touched)
+        for field, version, generation in c.execute(
+                f"SELECT field, version, generation FROM field_versions WHERE field IN ({', '.join('?' * len(fields))})", fields):
+            self._seen_versions[field] = (version, generation)
+        if 'inter_data' in touched:
+            self._inter_last_id = c.execute('SELECT COALESCE(MAX(id), 0) FROM inter_data').fetchone()[0]
+
+    def external_changes(self) -> Dict[str, bool]:
+        """
+        Champs modifiés par un autre processus depuis le dernier appel : {champ: réécrit en entier}.
+        La table des versions n'est lue que si data_version a bougé.
+        """
+        with self._lock:
+            version = self.data_version()
+            if version == self._data_version: return {}
+            self._data_version = version
+            changes = {}
+            for field, version, generation in self.conn.execute('SELECT field, version, generation FROM field_versions'):
+                seen = self._seen_versions.get(field)
+                if seen != (version, generation):
+                    changes[field] = seen is None or seen[1] != generation
+                    self._seen_versions[field] = (version, generation)
+            return changes
+
+    def reload(self, target: Any, changes: Dict[str, bool]) -> None:
+        """Recharge dans `target` les seuls champs modifiés (voir external_changes)."""
+        with self._lock:
+            kv_fields = []
+            for field, rewritten in changes.items():
+                if field == 'inter_data' and not rewritten:
+                    self._load_new_inter_rows(target)
+                elif field in TABLE_FIELDS:
+                    self._load_table_field(target, field)
+                else:
+                    kv_fields.append(field)
+            if kv_fields:
+                self._load_kv(target, kv_fields)
+
+    def claim_prediction(self, day: str, game: int) -> bool:
+        """Réserve atomiquement la prédiction du jeu `game` ; False s'il est déjà réservé."""
+        with self._lock:
+            cursor = self.conn.execute('INSERT OR IGNORE INTO prediction_claims (day, game, claimed_at) VALUES (?, ?, ?)',
+                                       (day, game, time.time()))
+            return cursor.rowcount == 1
+
+    def release_claims_before(self, day: str) -> None:
+        """Oublie les réservations des journées précédentes (reset quotidien)."""
+        with self._lock:
+            self.conn.execute('DELETE FROM prediction_claims WHERE day < ?', (day,))
+
+    def release_claims(self, day: str) -> None:
+        """Oublie les réservations de la journée `day` (reset manuel : numérotation relancée)."""
+        with self._lock:
+            self.conn.execute('DELETE FROM prediction_claims WHERE day = ?', (day,))
+
+    # --- Traduction des opérations ---
+    def _apply(self, op: str, field: str, key: Any, value: Any) -> None:
+        c = self.conn
+        self._touched[field] = self._touched.get(field, False) or op == OP_SET
+        if field not in TABLE_FIELDS:
+            if op != OP_SET:
+                # Dict/set secondaire (ex: pending_edits) : lecture-modification-écriture de sa ligne kv
+                row = c.execute('SELECT value FROM kv WHERE field = ?', (field,)).fetchone()
+                holder = SimpleNamespace(**{field: _int_keys(json.loads(row[0])) if row else {}})
+                apply_record(holder, {'op': op, 'field': field, 'key': key, 'value': value})
+                value = getattr(holder, field)
+            if isinstance(value, set): value = list(value)
+            c.execute('INSERT OR REPLACE INTO kv (field, value) VALUES (?, ?)', (field, json.dumps(value, ensure_ascii=False)))
+            return
+
+        if op == OP_SET:
+            self._replace_table(field, value)
+        elif field == 'predictions':
+            if op == OP_PUT:
+                c.execute('INSERT OR REPLACE INTO predictions (game, status, data) VALUES (?, ?, ?)',
+                          (key, value.get('status'), json.dumps(value, ensure_ascii=False)))
+            elif op == OP_DEL:
+                c.execute('DELETE FROM predictions WHERE game = ?', (key,))
+        elif field == 'sequential_history':
+            if op == OP_PUT:
+                c.execute('INSERT OR REPLACE INTO sequential_history (game, data) VALUES (?, ?)', (key, json.dumps(value, ensure_ascii=False)))
+            elif op == OP_DEL:
+                c.execute('DELETE FROM sequential_history WHERE game = ?', (key,))
+            elif op == OP_PRUNE:
+                c.execute('DELETE FROM sequential_history WHERE game < ?', (value,))
+        elif field == 'inter_data':
+            if op == OP_APPEND:
+                c.execute(f"INSERT INTO inter_data ({', '.join(INTER_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+                          tuple(value.get(col) for col in INTER_COLUMNS))
+            elif op == OP_PRUNE:
+                # value = nombre d'entrées évincées de la fenêtre (les plus anciennes)
+                self._prune_inter_data(value)
+        elif field in SET_FIELDS:
+            if op == OP_ADD:
+                c.execute('INSERT OR IGNORE INTO game_sets (field, game) VALUES (?, ?)', (field, value))
+            elif op == OP_DEL:
+                c.execute('DELETE FROM game_sets WHERE field = ? AND game = ?', (field, key))
+            elif op == OP_PRUNE:
+                c.execute('DELETE FROM game_sets WHERE field = ? AND game < ?', (field, value))
+        elif field in INTERVAL_FIELDS:
+            if op == OP_ADD:
+                self._add_to_runs(field, int(value))
+
+    def _prune_inter_data(self, count: int) -> None:
+        self.conn.execute('DELETE FROM inter_data WHERE id IN (SELECT id FROM inter_data ORDER BY id LIMIT ?)', (count,))
+
+    def _add_to_runs(self, field: str, game: int) -> None:
+        """Ajoute un numéro en fusionnant les intervalles adjacents (au plus 2 lignes touchées)."""
+        c = self.conn
+        bounds = (field, game + 1, game - 1)
+        rows = c.execute('SELECT start_game, end_game FROM game_runs WHERE field = ? AND start_game <= ? AND end_game >= ?', bounds).fetchall()
+        if any(start <= game <= end for start, end in rows): return
+        start = min([game] + [s for s, _ in rows])
+        end = max([game] + [e for _, e in rows])
+        c.execute('DELETE FROM game_runs WHERE field = ? AND start_game <= ? AND end_game >= ?', bounds)
+        c.execute('INSERT INTO game_runs (field, start_game, end_game) VALUES (?, ?, ?)', (field, start, end))
+
+    def _replace_table(self, field: str, value: Any) -> None:
+        c = self.conn
+        if field == 'predictions':
+            c.execute('DELETE FROM predictions')
+            c.executemany('INSERT INTO predictions (game, status, data) VALUES (?, ?, ?)',
+                          [(int(g), p.get('status'), json.dumps(p, ensure_ascii=False)) for g, p in (value or {}).items()])
+        elif field == 'sequential_history':
+            c.execute('DELETE FROM sequential_history')
+            c.executemany('INSERT INTO sequential_history (game, data) VALUES (?, ?)',
+                          [(int(g), json.dumps(d, ensure_ascii=False)) for g, d in (value or {}).items()])
+        elif field == 'inter_data':
+            c.execute('DELETE FROM inter_data')
+            # Snapshot colonnaire (InterColumns) : lignes produites sans passer par des dicts
+            rows = value.rows() if hasattr(value, 'rows') else (tuple(e.get(col) for col in INTER_COLUMNS) for e in (value or []))
+            c.executemany(f"INSERT INTO inter_data ({', '.join(INTER_COLUMNS)}) VALUES (?, ?, ?, ?, ?)", rows)
+        elif field in SET_FIELDS:
+            c.execute('DELETE FROM game_sets WHERE field = ?', (field,))
+            c.executemany('INSERT INTO game_sets (field, game) VALUES (?, ?)', [(field, int(g)) for g in (value or [])])
+        elif field in INTERVAL_FIELDS:
+            c.execute('DELETE FROM game_sets WHERE field = ?', (field,))
+            c.execute('DELETE FROM game_runs WHERE field = ?', (field,))
+            c.executemany('INSERT INTO game_runs (field, start_game, end_game) VALUES (?, ?, ?)',
+                          [(field, start, end) for start, end in IntervalSet(value or []).runs()])
@@ -0,0 +1,177 @@
+# state_flusher.py
+
+"""
+Écriture différée (group commit) de l'état de CardPredictor.
+
+Les mutations sont seulement marquées en mémoire : le chemin webhook n'attend
+plus jamais le disque. Un thread d'arrière-plan écrit le lot en une fois
+(une écriture de journal ou une transaction SQLite) toutes les `interval`
+secondes ou dès `max_pending` mutations, et une dernière fois à l'arrêt.
+Les mutations redondantes d'un même champ sont fusionnées avant l'écriture.
+
+Un snapshot complet est copié sous le verrou de l'état (`state_lock`, celui
+du predictor) puis sérialisé après l'avoir relâché : une update traitée en
+même temps ne peut ni le déchirer ni modifier un dict pendant sa copie.
+"""
+import atexit
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from state_journal import OP_SET, OP_PUT
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_FLUSH_INTERVAL = 0.5
+DEFAULT_MAX_PENDING = 50
+
+
+def shallow_copy(value: Any) -> Any:
+    """Copie superficielle : l'écriture en arrière-plan ne voit pas les mutations suivantes."""
+    if isinstance(value, dict): return dict(value)
+    if isinstance(value, list): return list(value)
+    if isinstance(value, set): return set(value)
+    if hasattr(value, 'to_list'): return value.to_list()
+    return value
+
+
+def snapshot_copy(value: Any) -> Any:
+    """Copie pour un snapshot complet : copie colonnaire pour les conteneurs qui en offrent une."""
+    if hasattr(value, 'snapshot'): return value.snapshot()
+    return shallow_copy(value)
+
+
+class StateFlusher:
+    """
+    Tampon de mutations devant un backend (StateJournal ou SQLiteStateStore).
+    Avec interval <= 0, chaque mutation est écrite immédiatement (mode synchrone).
+    """
+
+    def __init__(self, backend: Any, capture_state: Callable[[], Dict[str, Any]],
+                 write_snapshot: Callable[[Dict[str, Any]], None],
+                 interval: float = DEFAULT_FLUSH_INTERVAL, max_pending: int = DEFAULT_MAX_PENDING,
+                 state_lock: Optional[Any] = None):
+        self.backend = backend
+        self.capture_state = capture_state
+        self.write_snapshot = write_snapshot
+        self.state_lock = state_lock
+        self.interval = interval
+        self.max_pending = max_pending
+
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending: List[dict] = []
+        self._dirty_fields: Set[str] = set()
+        self._snapshot_requested = False
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='state-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    @property
+    def dirty_fields(self) -> Set[str]:
+        with self._lock:
+            return set(self._dirty_fields)
+
+    def append(self, op: str, field: str, key: Any = None, value: Any = None) -> None:
+        """Marque une mutation ; aucune E/S disque dans l'appelant (sauf mode synchrone)."""
+        record = {'op': op, 'field': field, 'key': key, 'value': shallow_copy(value)}
+        with self._lock:
+            # Une valeur complète remplace tout ce qui est en attente pour ce champ,
+            # une entrée indexée remplace l'écriture en attente de la même clé.
+            if op == OP_SET:
+                self._pending = [r for r in self._pending if r['field'] != field]
+            elif op == OP_PUT:
+                self._pending = [r for r in self._pending if not (r['op'] == OP_PUT and r['field'] == field and r['key'] == key)]
+            self._pending.append(record)
+            self._dirty_fields.add(field)
+            wake = len(self._pending) >= self.max_pending
+
+        if self._thread is None:
+            self.flush()
+        elif wake:
+            self._wakeup.set()
+
+    def request_snapshot(self) -> None:
+        """Demande une réécriture complète de l'état (reset, compaction)."""
+        with self._lock:
+            self._snapshot_requested = True
+        if self._thread is None:
+            self.flush()
+        else:
+            self._wakeup.set()
+
+    def flush(self) -> None:
+        """Écrit le lot en attente en une seule opération."""
+        with self._lock:
+            wants_snapshot = self._snapshot_requested or self.backend.should_compact()
+        # Verrou de l'état pris avant _write_lock, dans le même ordre que les appelants
+        # (qui flushent en le tenant déjà), et seulement le temps de la copie
+        state_locked = wants_snapshot and self.state_lock is not None
+        if state_locked: self.state_lock.acquire()
+        self._write_lock.acquire()
+        try:
+            try:
+                with self._lock:
+                    records, self._pending = self._pending, []
+                    self._dirty_fields = set()
+                    # Snapshot demandé après le test ci-dessus sans le verrou de l'état : au prochain lot
+                    snapshot = (self._snapshot_requested or self.backend.should_compact()) and (state_locked or self.state_lock is None)
+                    if snapshot: self._snapshot_requested = False
+                    # La copie est prise sous le verrou : les mutations marquées ensuite
+                    # iront dans le journal vidé par ce snapshot.
+                    state = self.capture_state() if snapshot else None
+            finally:
+                if state_locked: self.state_lock.release()
+
+            try:
+                if snapshot:
+                    self.write_snapshot(state)
+                elif records:
+                    self.backend.append_many(records)
+            except Exception as e:
+                logger.error(f"❌ Erreur d'écriture de l'état ({len(records)} mutation(s)): {e}")
+                with self._lock:
+                    self._snapshot_requested = True
+        finally:
+            self._write_lock.release()
+
+    def close(self) -> None:
+        """Arrête le thread et force l'écriture de tout ce qui reste en attente."""
+        if self._stopped: return
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped: break
+            self.flush()
+
+
+class DiscardingFlusher:
+    """Remplaçant sans E/S (rejeu hors ligne) : les mutations sont ignorées."""
+
+    backend = None
+    dirty_fields: Set[str] = frozenset()
+
+    def append(self, op: str, field: str, key: Any = None, value: Any = None) -> None:
+        pass
+
+    def request_snapshot(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
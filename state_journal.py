@@ -0,0 +1,173 @@
+# state_journal.py
+
+"""
+Journal d'écriture anticipée (append-only) pour l'état de CardPredictor.
+
+Chaque mutation est ajoutée comme un petit enregistrement JSON (une ligne) au
+lieu de réécrire tous les fichiers d'état. Au démarrage, le journal est rejoué
+par-dessus le dernier snapshot (les fichiers *.json habituels), puis il est
+périodiquement compacté : le snapshot complet est réécrit et le journal vidé.
+"""
+import os
+import json
+import logging
+from typing import Any, List, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Opérations supportées par le journal
+OP_SET = 'set'        # Remplace la valeur complète d'un champ (scalaires, petits dicts)
+OP_PUT = 'put'        # champ[key] = value (dicts indexés par numéro de jeu)
+OP_DEL = 'del'        # Supprime champ[key]
+OP_ADD = 'add'        # Ajoute value à un set
+OP_APPEND = 'append'  # Ajoute value à la fin d'une liste
+OP_PRUNE = 'prune'    # Supprime les clés/éléments numériques < value
+
+DEFAULT_COMPACT_EVERY = 500
+
+
+def assign_field(target: Any, field: str, value: Any) -> None:
+    """Remplace la valeur complète d'un champ en conservant son type de conteneur."""
+    current = getattr(target, field, None)
+    # Les sets sont sérialisés en liste : on restaure le type d'origine
+    if isinstance(current, set) and isinstance(value, list):
+        value = set(value)
+    elif hasattr(current, 'assign'):
+        # Conteneurs bornés (ex: InterDataWindow) : rechargés sur place
+        current.assign(value or [])
+        return
+    setattr(target, field, value)
+
+
+def apply_record(target: Any, record: dict) -> None:
+    """Applique un enregistrement du journal sur les attributs de `target`."""
+    op = record['op']
+    field = record['field']
+    value = record.get('value')
+
+    if op == OP_SET:
+        assign_field(target, field, value)
+        return
+
+    container = getattr(target, field)
+    if op == OP_PUT:
+        container[record['key']] = value
+    elif op == OP_DEL:
+        container.pop(record['key'], None)
+    elif op == OP_ADD:
+        container.add(value)
+    elif op == OP_APPEND:
+        container.append(value)
+    elif op == OP_PRUNE:
+        if isinstance(container, dict):
+            for k in [k for k in container if k < value]:
+                del container[k]
+        elif isinstance(container, set):
+            container.difference_update([g for g in container if g < value])
+        elif hasattr(container, 'prune'):
+            container.prune(value)
+        # InterDataWindow : la fenêtre s'évince d'elle-même au rejeu (seul SQLite supprime des lignes)
+    else:
+        raise ValueError(f"Opération de journal inconnue: {op}")
+
+
+class StateJournal:
+    """Journal JSON-lines des mutations d'état, rejoué au démarrage."""
+
+    def __init__(self, path: str, compact_every: int = DEFAULT_COMPACT_EVERY, fsync: bool = False):
+        self.path = path
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.records_since_compaction = 0
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        return self._file
+
+    def append(self, op: str, field: str, key: Any = None, value: Any = None) -> None:
+        """Ajoute un enregistrement en fin de journal (coût constant)."""
+        self.append_many([{'op': op, 'field': field, 'key': key, 'value': value}])
+
+    def append_many(self, records: List[dict]) -> None:
+        """Ajoute un lot d'enregistrements en une seule écriture."""
+        lines = []
+        for r in records:
+            record = {'op': r['op'], 'field': r['field']}
+            if r.get('key') is not None: record['key'] = r['key']
+            value = r.get('value')
+            if value is not None: record['value'] = list(value) if isinstance(value, set) else value
+            lines.append(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+        f = self._open()
+        f.write(''.join(lines))
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+        self.records_since_compaction += len(lines)
+
+    def should_compact(self) -> bool:
+        return self.records_since_compaction >= self.compact_every
+
+    def replay(self, target: Any) -> int:
+        """
+        Rejoue le journal sur `target`. Les ajouts de liste déjà présents dans le
+        snapshot (crash entre l'écriture du snapshot et la remise à zéro du journal)
+        sont ignorés pour que le rejeu reste idempotent.
+        """
+        if not os.path.exists(self.path):
+            return 0
+
+        records = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line: continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Ligne tronquée (arrêt brutal pendant l'écriture) : on s'arrête là
+                    logger.warning(f"⚠️ Journal {self.path} tronqué à la ligne {line_no}, rejeu partiel.")
+                    break
+
+        window = sum(1 for r in records if r.get('op') == OP_APPEND)
+        seen_tails = {}
+        applied = 0
+        for record in records:
+            try:
+                if record['op'] == OP_APPEND:
+                    field = record['field']
+                    if field not in seen_tails:
+                        tail = getattr(target, field)[-window:] if window else []
+                        seen_tails[field] = {self._fingerprint(e) for e in tail}
+                    fingerprint = self._fingerprint(record.get('value'))
+                    if fingerprint in seen_tails[field]: continue
+                apply_record(target, record)
+                applied += 1
+            except Exception as e:
+                logger.error(f"❌ Enregistrement de journal ignoré {record}: {e}")
+
+        self.records_since_compaction = len(records)
+        if applied:
+            logger.info(f"📒 Journal rejoué : {applied} mutation(s) appliquée(s) depuis {self.path}")
+        return applied
+
+    def reset(self) -> None:
+        """Vide le journal après l'écriture d'un snapshot complet."""
+        self.close()
+        with open(self.path, 'w', encoding='utf-8'):
+            pass
+        self.records_since_compaction = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            finally:
+                self._file = None
+
+    @staticmethod
+    def _fingerprint(value: Optional[Any]) -> str:
+        return json.dumps(value, sort_keys=True, ensure_ascii=False)
@@ -0,0 +1,267 @@
+# telegram_client.py
+
+"""
+Client sortant vers l'API Telegram.
+
+Une session HTTP persistante (keep-alive, pool de connexions) et une file
+d'envoi vidée par des threads de fond : le webhook ne fait que mettre en file
+et rend la main tout de suite. Chaque envoi renvoie un `Future` (résultat
+Telegram ou None en cas d'échec) ; un callback optionnel reçoit ce résultat
+quand l'appelant a besoin du message_id (envoi des prédictions).
+
+La file est un `SendScheduler` : limites de débit par chat et globale,
+report sur 429 (retry_after) et priorité des prédictions. Les éditions d'un
+même message encore en file sont fusionnées (seul le dernier texte part) et
+une édition identique au dernier texte livré n'est jamais envoyée.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from send_scheduler import SendScheduler, PRIORITY_EDIT, PRIORITY_ADMIN
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Racine de l'API (remplaçable par un serveur local de test ou un Bot API auto-hébergé)
+TELEGRAM_API_BASE = (os.getenv('TELEGRAM_API_BASE') or 'https://api.telegram.org').rstrip('/')
+# Délais bornés (connexion, lecture) et nombre de workers d'envoi
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv('TELEGRAM_CONNECT_TIMEOUT') or 3.05)
+TELEGRAM_READ_TIMEOUT = float(os.getenv('TELEGRAM_READ_TIMEOUT') or 10)
+TELEGRAM_SEND_WORKERS = int(os.getenv('TELEGRAM_SEND_WORKERS') or 2)
+# Nombre de reports sur 429 avant d'abandonner un envoi
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES') or 5)
+# Nombre de messages dont on retient le dernier texte livré
+DELIVERED_CACHE_SIZE = 1024
+
+# Un envoi en file : [méthode, payload, futures en attente du résultat, nombre de reports]
+Job = List[Any]
+
+
+def bot_api_url(token: str) -> str:
+    """URL des méthodes du bot : <TELEGRAM_API_BASE>/bot<token>."""
+    return f"{TELEGRAM_API_BASE}/bot{token}"
+
+
+def _message_key(chat_id: Any, message_id: Any) -> Tuple[Any, Any]:
+    return chat_id, message_id
+
+
+def _content(payload: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Ce qui est visible du message : deux éditions au même contenu sont identiques."""
+    return payload.get('text'), payload.get('parse_mode'), payload.get('reply_markup')
+
+
+class EditCoalescer:
+    """
+    Éditions en file par (chat_id, message_id) et dernier contenu livré par message.
+    Toutes les méthodes sont appelées sous le verrou du client.
+    """
+
+    def __init__(self, capacity: int = DELIVERED_CACHE_SIZE):
+        self.capacity = capacity
+        self._queued: Dict[Tuple[Any, Any], Job] = {}
+        self._delivered: 'OrderedDict[Tuple[Any, Any], Tuple[Any, ...]]' = OrderedDict()
+
+    def is_noop(self, key: Tuple[Any, Any], payload: Dict[str, Any]) -> bool:
+        return self._delivered.get(key) == _content(payload)
+
+    def merge(self, key: Tuple[Any, Any], payload: Dict[str, Any], future: Future) -> bool:
+        """Remplace le texte d'une édition encore en file ; False s'il n'y en a pas."""
+        job = self._queued.get(key)
+        if job is None: return False
+        job[1] = payload
+        job[2].append(future)
+        return True
+
+    def queued(self, key: Tuple[Any, Any], job: Job) -> None:
+        self._queued[key] = job
+
+    def requeue(self, key: Tuple[Any, Any], job: Job) -> bool:
+        """
+        Édition reportée (429) remise en file ; si une édition plus récente du même
+        message y est déjà, c'est elle qui part (avec les futures de la reportée) : False.
+        """
+        newer = self._queued.get(key)
+        if newer is None:
+            self._queued[key] = job
+            return True
+        newer[2].extend(job[2])
+        job[2] = []
+        return False
+
+    def taken(self, key: Tuple[Any, Any], job: Job) -> None:
+        """Le worker prend l'édition : les suivantes ne peuvent plus s'y fusionner."""
+        if self._queued.get(key) is job:
+            del self._queued[key]
+
+    def delivered(self, key: Tuple[Any, Any], payload: Dict[str, Any]) -> None:
+        self._delivered[key] = _content(payload)
+        self._delivered.move_to_end(key)
+        while len(self._delivered) > self.capacity:
+            self._delivered.popitem(last=False)
+
+
+class TelegramClient:
+    """File d'envoi ordonnancée + pool de connexions vers <TELEGRAM_API_BASE>/bot<token>."""
+
+    def __init__(self, api_url: str, workers: int = TELEGRAM_SEND_WORKERS,
+                 connect_timeout: float = TELEGRAM_CONNECT_TIMEOUT, read_timeout: float = TELEGRAM_READ_TIMEOUT,
+                 scheduler: Optional[SendScheduler] = None):
+        self.api_url = api_url
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, workers) + 2)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.scheduler = scheduler if scheduler is not None else SendScheduler()
+        self.edits = EditCoalescer()
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, name=f'telegram-sender-{i}', daemon=True)
+                         for i in range(max(1, workers))]
+        self._stopped = False
+        for thread in self._threads:
+            thread.start()
+        atexit.register(self.close)
+
+    @property
+    def pending(self) -> int:
+        return len(self.scheduler)
+
+    def call(self, method: str, payload: Dict[str, Any]) -> Optional[Any]:
+        """Appel synchrone (session partagée, délais bornés) ; renvoie `result` ou None."""
+        result, _ = self._post(method, payload)
+        self._remember(method, payload, result)
+        return result
+
+    def submit(self, method: str, payload: Dict[str, Any],
+               callback: Optional[Callable[[Optional[Any]], None]] = None,
+               priority: Optional[int] = None) -> Future:
+        """
+        Met l'appel en file et rend la main ; le Future reçoit `result` (ou None).
+        Priorité par défaut : édition pour editMessageText, administration sinon.
+        """
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(lambda f: self._run_callback(callback, f.result()))
+        if self._stopped:
+            future.set_result(self.call(method, payload))
+            return future
+        if priority is None:
+            priority = PRIORITY_EDIT if method.startswith('edit') else PRIORITY_ADMIN
+
+        job = [method, payload, [future], 0]
+        if method == 'editMessageText':
+            key = _message_key(payload.get('chat_id'), payload.get('message_id'))
+            with self._lock:
+                if self.edits.is_noop(key, payload):
+                    # Contenu déjà affiché : Telegram répondrait "message is not modified"
+                    future.set_result(True)
+                    return future
+                if self.edits.merge(key, payload, future):
+                    return future
+                self.edits.queued(key, job)
+        self.scheduler.put(payload.get('chat_id'), job, priority)
+        return future
+
+    def close(self, timeout: float = 5) -> None:
+        """Laisse les workers vider la file (dans la limite de `timeout`) puis les arrête."""
+        if self._stopped: return
+        self._stopped = True
+        self.scheduler.close()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=timeout)
+        self.session.close()
+
+    def _post(self, method: str, payload: Dict[str, Any]) -> Tuple[Optional[Any], Optional[float]]:
+        """Renvoie (result, retry_after) ; retry_after n'est défini que sur un 429."""
+        try:
+            response = self.session.post(f"{self.api_url}/{method}", json=payload, timeout=self.timeout)
+            data = response.json()
+            if response.status_code == 200 and data.get('ok'):
+                return data.get('result'), None
+            if response.status_code == 400 and 'message is not modified' in (data.get('description') or ''):
+                return True, None
+            if response.status_code == 429:
+                retry_after = (data.get('parameters') or {}).get('retry_after', 1)
+                logger.warning(f"⏳ Telegram 429 sur {method} (chat {payload.get('chat_id')}) : report de {retry_after}s")
+                return None, float(retry_after)
+            logger.error(f"❌ Erreur Telegram {method} ({response.status_code}): {data.get('description')}")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"❌ Exception Telegram {method}: {e}")
+        return None, None
+
+    def _remember(self, method: str, payload: Dict[str, Any], result: Optional[Any]) -> None:
+        """Mémorise le contenu livré (envoi ou édition) pour écarter les éditions identiques."""
+        if not result: return
+        if method == 'editMessageText':
+            key = _message_key(payload.get('chat_id'), payload.get('message_id'))
+        elif method == 'sendMessage' and isinstance(result, dict):
+            key = _message_key(payload.get('chat_id'), result.get('message_id'))
+        else:
+            return
+        with self._lock:
+            self.edits.delivered(key, payload)
+
+    @staticmethod
+    def _run_callback(callback: Callable[[Optional[Any]], None], result: Optional[Any]) -> None:
+        try:
+            callback(result)
+        except Exception as e:
+            logger.error(f"❌ Erreur dans le callback d'envoi: {e}")
+
+    def _run(self) -> None:
+        while True:
+            item = self.scheduler.get()
+            if item is None: break
+            chat_id, entry = item
+            job = entry[2]
+            retry_after = None
+            try:
+                retry_after = self._send(chat_id, job)
+            finally:
+                # Édition reportée supplantée (plus de futures) : le chat attend, elle n'est pas remise en file
+                self.scheduler.done(chat_id, entry, retry_after, requeue=bool(job[2]))
+
+    def _send(self, chat_id: Any, job: Job) -> Optional[float]:
+        """Exécute un envoi pris dans la file ; renvoie retry_after s'il doit être reporté."""
+        method = job[0]
+        if method == 'editMessageText':
+            key = _message_key(chat_id, job[1].get('message_id'))
+            with self._lock:
+                self.edits.taken(key, job)
+                noop = self.edits.is_noop(key, job[1])
+            if noop:
+                self._resolve(job, True)
+                return None
+
+        result, retry_after = self._post(method, job[1])
+        if retry_after is not None:
+            if job[3] < TELEGRAM_MAX_RETRIES:
+                job[3] += 1
+                if method == 'editMessageText':
+                    # De nouveau en file : les éditions suivantes peuvent encore s'y fusionner,
+                    # sauf si une plus récente attend déjà (l'ancien texte ne doit pas partir après)
+                    with self._lock:
+                        self.edits.requeue(key, job)
+                return retry_after
+            logger.error(f"❌ Envoi {method} abandonné après {job[3]} report(s) (chat {chat_id})")
+
+        self._remember(method, job[1], result)
+        self._resolve(job, result)
+        return None
+
+    @staticmethod
+    def _resolve(job: Job, result: Optional[Any]) -> None:
+        for future in job[2]:
+            future.set_result(result)
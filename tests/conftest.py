@@ -0,0 +1,7 @@
+# tests/conftest.py
+
+"""Les modules du bot sont à la racine du dépôt (pas de paquet) : on l'ajoute au chemin d'import."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,47 @@
+# tests/test_game_ring.py
+
+from game_ring import GameRing, GameRingSet
+
+
+def test_put_evicts_game_capacity_back():
+    ring = GameRing(4)
+    for game in range(1, 5):
+        assert ring.put(game, f'v{game}') is None
+    assert ring.put(5, 'v5') == 1
+    assert 1 not in ring and ring.get(1) is None
+    assert ring[5] == 'v5'
+    assert len(ring) == 4
+    assert ring.keys() == [2, 3, 4, 5]
+    # Réécrire le même jeu n'évince rien
+    assert ring.put(5, 'w5') is None and ring[5] == 'w5'
+
+
+def test_stale_slot_is_not_returned():
+    ring = GameRing(4, {2: 'a'})
+    assert ring.get(6) is None
+    assert 6 not in ring
+    assert 'x' not in ring
+
+
+def test_pop_delete_and_prune():
+    ring = GameRing(8, {1: 'a', 2: 'b', 3: 'c', 9: 'd'})
+    # 1 et 9 se disputent la case 1 : le plus récent la garde
+    assert ring.snapshot() == {2: 'b', 3: 'c', 9: 'd'}
+    assert ring.pop(2) == 'b' and ring.pop(2, 'absent') == 'absent'
+    del ring[3]
+    ring.prune(10)
+    assert len(ring) == 0
+
+
+def test_assign_from_json_keys():
+    ring = GameRing(4)
+    ring.assign({'10': 'x', '11': 'y'})
+    assert ring.items() == [(10, 'x'), (11, 'y')]
+
+
+def test_ring_set():
+    seen = GameRingSet(3, [1, 2, 3])
+    assert seen.add(4) == 1
+    assert seen.snapshot() == [2, 3, 4]
+    seen.assign({5: True})
+    assert list(seen) == [5]
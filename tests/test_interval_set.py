@@ -0,0 +1,41 @@
+# tests/test_interval_set.py
+
+from interval_set import IntervalSet
+
+
+def test_add_merges_runs():
+    s = IntervalSet()
+    for game in (1, 2, 3, 7, 5, 6):
+        assert s.add(game)
+    assert not s.add(2)
+    assert s.runs() == [[1, 3], [5, 7]]
+    s.add(4)
+    assert s.runs() == [[1, 7]]
+    assert len(s) == 7
+    assert s.last == 7
+
+
+def test_membership():
+    s = IntervalSet([[1, 3], [10, 12]])
+    assert 1 in s and 3 in s and 11 in s
+    assert 0 not in s and 4 not in s and 9 not in s and 13 not in s
+    assert 5 not in IntervalSet()
+
+
+def test_assign_accepts_snapshot_legacy_and_overlaps():
+    assert IntervalSet([[1, 3], [5, 5]]).runs() == [[1, 3], [5, 5]]
+    # Ancien processed.json : numéros isolés, dans le désordre
+    assert IntervalSet([5, 1, 2, 3]).runs() == [[1, 3], [5, 5]]
+    overlapping = IntervalSet([[5, 8], [1, 6]])
+    assert overlapping.runs() == [[1, 8]]
+    assert len(overlapping) == 8
+    assert IntervalSet(overlapping) == overlapping
+
+
+def test_iteration_equality_and_clear():
+    s = IntervalSet([[1, 2], [4, 4]])
+    assert list(s) == [1, 2, 4]
+    assert s == {1, 2, 4}
+    assert s != {1, 2}
+    s.clear()
+    assert len(s) == 0 and s.last is None and s.snapshot() == []
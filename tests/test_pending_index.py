@@ -0,0 +1,33 @@
+# tests/test_pending_index.py
+
+from pending_index import PendingIndex
+
+
+def test_candidates_cover_verification_window():
+    index = PendingIndex(window=2)
+    index.add(10)
+    index.add(11)
+    assert index.candidates(9) == []
+    assert index.candidates(10) == [10]
+    assert index.candidates(12) == [10, 11]
+    assert index.candidates(13) == [11]
+    assert len(index) == 2 and 10 in index
+
+
+def test_discard_removes_every_slot():
+    index = PendingIndex(window=2)
+    index.add_many([10, 10, 11])
+    index.discard(10)
+    index.discard(10)
+    assert index.candidates(10) == []
+    assert index.candidates(12) == [11]
+    assert 10 not in index and len(index) == 1
+
+
+def test_rebuild_keeps_only_pending():
+    index = PendingIndex(window=1)
+    index.add(1)
+    index.rebuild({5: {'status': 'pending'}, 6: {'status': 'won'}, 7: 'corrompu'})
+    assert index.candidates(1) == []
+    assert index.candidates(6) == [5]
+    assert len(index) == 1
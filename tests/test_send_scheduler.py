@@ -0,0 +1,74 @@
+# tests/test_send_scheduler.py
+
+import time
+
+from send_scheduler import PRIORITY_ADMIN, PRIORITY_EDIT, PRIORITY_PREDICTION, SendScheduler, TokenBucket
+
+
+def fast_scheduler() -> SendScheduler:
+    # Débits élevés : seuls l'ordre, les priorités et les reports sont testés
+    return SendScheduler(chat_rate=1000, group_rate_per_min=60000, global_rate=1000, burst=10)
+
+
+def test_priority_then_arrival_order():
+    scheduler = fast_scheduler()
+    scheduler.put(-1, 'admin', PRIORITY_ADMIN)
+    scheduler.put(-1, 'edit', PRIORITY_EDIT)
+    scheduler.put(-1, 'prediction 1', PRIORITY_PREDICTION)
+    scheduler.put(-1, 'prediction 2', PRIORITY_PREDICTION)
+    order = []
+    for _ in range(4):
+        chat_id, entry = scheduler.get(timeout=1)
+        order.append(entry[2])
+        scheduler.done(chat_id, entry)
+    assert order == ['prediction 1', 'prediction 2', 'edit', 'admin']
+
+
+def test_one_send_in_flight_per_chat():
+    scheduler = fast_scheduler()
+    scheduler.put(-1, 'a1')
+    scheduler.put(-1, 'a2')
+    scheduler.put(-2, 'b1')
+    first = scheduler.get(timeout=1)
+    second = scheduler.get(timeout=1)
+    assert {first[0], second[0]} == {-1, -2}
+    assert scheduler.get(timeout=0.05) is None
+    scheduler.done(*(first if first[0] == -1 else second))
+    assert scheduler.get(timeout=1)[1][2] == 'a2'
+
+
+def test_429_blocks_chat_and_requeues_at_head():
+    scheduler = fast_scheduler()
+    scheduler.put(-1, 'first')
+    scheduler.put(-1, 'second')
+    chat_id, entry = scheduler.get(timeout=1)
+    scheduler.done(chat_id, entry, retry_after=0.2)
+    assert len(scheduler) == 2
+    assert scheduler.get(timeout=0.05) is None
+    chat_id, entry = scheduler.get(timeout=1)
+    assert entry[2] == 'first'
+
+
+def test_429_without_requeue_drops_entry():
+    scheduler = fast_scheduler()
+    scheduler.put(-1, 'superseded')
+    chat_id, entry = scheduler.get(timeout=1)
+    scheduler.done(chat_id, entry, retry_after=0.01, requeue=False)
+    assert len(scheduler) == 0
+
+
+def test_close_drains_then_stops():
+    scheduler = fast_scheduler()
+    scheduler.put(-1, 'last')
+    scheduler.close()
+    chat_id, entry = scheduler.get()
+    scheduler.done(chat_id, entry)
+    assert scheduler.get() is None
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, capacity=1, now=0)
+    assert bucket.delay(0) == 0
+    bucket.take(0)
+    assert bucket.delay(0) == 0.5
+    assert bucket.delay(0.5) == 0
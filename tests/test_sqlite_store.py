@@ -0,0 +1,99 @@
+# tests/test_sqlite_store.py
+
+from datetime import datetime
+
+from game_ring import GameRing, GameRingSet
+from inter_stats import InterDataWindow
+from interval_set import IntervalSet
+from sqlite_store import SQLiteStateStore
+from state_journal import OP_ADD, OP_APPEND, OP_PRUNE, OP_PUT, OP_SET
+
+
+class State:
+    """Cible de chargement minimale : mêmes conteneurs que CardPredictor."""
+
+    def __init__(self):
+        self.predictions = {}
+        self.inter_data = InterDataWindow(capacity=3)
+        self.sequential_history = GameRing(10)
+        self.collected_games = GameRingSet(10)
+        self.processed_messages = IntervalSet()
+        self.consecutive_fails = 0
+
+
+def inter_entry(game):
+    return {'numero_resultat': game, 'declencheur': game % 52, 'numero_declencheur': game - 2,
+            'result_suit': game % 4, 'date': datetime.now().isoformat()}
+
+
+def record_game(state, game):
+    """Collecte d'un jeu telle que la journalise le predictor (ajout + éviction de la fenêtre)."""
+    entry = inter_entry(game)
+    evicted = state.inter_data.append(entry)
+    records = [{'op': OP_APPEND, 'field': 'inter_data', 'value': entry},
+               {'op': OP_ADD, 'field': 'processed_messages', 'value': game}]
+    state.processed_messages.add(game)
+    if evicted is not None:
+        records.append({'op': OP_PRUNE, 'field': 'inter_data', 'value': 1})
+    return records
+
+
+def test_replay_round_trip(tmp_path):
+    path = str(tmp_path / 'state.sqlite3')
+    store, state = SQLiteStateStore(path), State()
+    records = []
+    for game in range(1, 6):
+        records += record_game(state, game)
+    state.predictions[7] = {'status': 'pending', 'predicted_suit': 1}
+    state.sequential_history[5] = {'carte': 12}
+    records += [{'op': OP_PUT, 'field': 'predictions', 'key': 7, 'value': state.predictions[7]},
+                {'op': OP_PUT, 'field': 'sequential_history', 'key': 5, 'value': state.sequential_history[5]},
+                {'op': OP_SET, 'field': 'consecutive_fails', 'value': 2}]
+    store.append_many(records)
+    # Lignes sorties de la fenêtre supprimées
+    assert store.conn.execute('SELECT COUNT(*) FROM inter_data').fetchone()[0] == 3
+    store.close()
+
+    restored = State()
+    SQLiteStateStore(path).replay(restored)
+    assert restored.predictions == {7: {'status': 'pending', 'predicted_suit': 1}}
+    assert [e['numero_resultat'] for e in restored.inter_data] == [3, 4, 5]
+    assert restored.sequential_history.snapshot() == {5: {'carte': 12}}
+    assert list(restored.processed_messages) == [1, 2, 3, 4, 5]
+    assert restored.consecutive_fails == 2
+
+
+def test_reload_applies_only_other_process_changes(tmp_path):
+    path = str(tmp_path / 'state.sqlite3')
+    writer, reader = SQLiteStateStore(path), SQLiteStateStore(path)
+    written, read = State(), State()
+    writer.append_many(record_game(written, 1))
+    reader.replay(read)
+    assert reader.external_changes() == {}
+
+    records = record_game(written, 2) + record_game(written, 3) + record_game(written, 4)
+    records.append({'op': OP_SET, 'field': 'consecutive_fails', 'value': 1})
+    writer.append_many(records)
+    # Ses propres écritures ne sont pas à recharger
+    assert writer.external_changes() == {}
+
+    changes = reader.external_changes()
+    # inter_data seulement complétée (lignes ajoutées), consecutive_fails réécrit
+    assert changes == {'inter_data': False, 'processed_messages': False, 'consecutive_fails': True}
+    reader.reload(read, changes)
+    assert [e['numero_resultat'] for e in read.inter_data] == [2, 3, 4]
+    assert read.inter_data.counts.get(2) == written.inter_data.counts.get(2)
+    assert list(read.processed_messages) == [1, 2, 3, 4]
+    assert read.consecutive_fails == 1
+    assert reader.external_changes() == {}
+
+
+def test_claims(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / 'state.sqlite3'))
+    assert store.claim_prediction('2026-01-01', 10)
+    assert not store.claim_prediction('2026-01-01', 10)
+    assert store.claim_prediction('2026-01-02', 10)
+    store.release_claims('2026-01-02')
+    assert store.claim_prediction('2026-01-02', 10)
+    store.release_claims_before('2026-01-02')
+    assert store.claim_prediction('2026-01-01', 10)
@@ -0,0 +1,139 @@
+# tests/test_state_journal.py
+
+import json
+
+import pytest
+
+from interval_set import IntervalSet
+from state_flusher import StateFlusher
+from state_journal import (OP_ADD, OP_APPEND, OP_DEL, OP_PRUNE, OP_PUT, OP_SET,
+                           StateJournal, apply_record)
+
+
+class State:
+    """Cible de rejeu minimale : mêmes types de conteneurs que CardPredictor."""
+
+    def __init__(self):
+        self.predictions = {}
+        self.processed_messages = IntervalSet()
+        self.history = []
+        self.consecutive_fails = 0
+
+
+def test_replay_round_trip(tmp_path):
+    journal = StateJournal(str(tmp_path / 'journal.jsonl'))
+    journal.append(OP_PUT, 'predictions', key=10, value={'status': 'pending'})
+    journal.append(OP_PUT, 'predictions', key=12, value={'status': 'pending'})
+    journal.append(OP_PUT, 'predictions', key=10, value={'status': 'won'})
+    journal.append(OP_DEL, 'predictions', key=12)
+    journal.append(OP_ADD, 'processed_messages', value=10)
+    journal.append(OP_ADD, 'processed_messages', value=11)
+    journal.append(OP_APPEND, 'history', value={'game': 10})
+    journal.append(OP_SET, 'consecutive_fails', value=2)
+    journal.close()
+
+    state = State()
+    assert journal.replay(state) == 8
+    # Les clés JSON sont relues en int
+    assert state.predictions == {10: {'status': 'won'}}
+    assert list(state.processed_messages) == [10, 11]
+    assert state.history == [{'game': 10}]
+    assert state.consecutive_fails == 2
+    assert journal.records_since_compaction == 8
+
+
+def test_replay_skips_appends_already_in_snapshot(tmp_path):
+    # Arrêt entre l'écriture du snapshot et la remise à zéro du journal
+    journal = StateJournal(str(tmp_path / 'journal.jsonl'))
+    journal.append(OP_APPEND, 'history', value={'game': 1, 'suit': 0})
+    journal.append(OP_APPEND, 'history', value={'game': 2, 'suit': 1})
+    journal.close()
+
+    state = State()
+    state.history = [{'suit': 0, 'game': 1}]
+    assert journal.replay(state) == 1
+    assert state.history == [{'suit': 0, 'game': 1}, {'game': 2, 'suit': 1}]
+
+
+def test_replay_stops_at_truncated_line(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    journal = StateJournal(str(path))
+    journal.append(OP_SET, 'consecutive_fails', value=1)
+    journal.append(OP_PUT, 'predictions', key=5, value={'status': 'pending'})
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"op":"set","field":"consecutive_fa')
+
+    state = State()
+    assert journal.replay(state) == 2
+    assert state.consecutive_fails == 1
+    assert state.predictions == {5: {'status': 'pending'}}
+
+
+def test_replay_missing_file(tmp_path):
+    assert StateJournal(str(tmp_path / 'absent.jsonl')).replay(State()) == 0
+
+
+def test_prune_and_unknown_op():
+    state = State()
+    state.predictions = {1: {}, 5: {}, 9: {}}
+    apply_record(state, {'op': OP_PRUNE, 'field': 'predictions', 'value': 6})
+    assert state.predictions == {9: {}}
+    with pytest.raises(ValueError):
+        apply_record(state, {'op': 'bogus', 'field': 'predictions'})
+
+
+def test_flusher_compacts_into_snapshot(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    journal = StateJournal(str(path), compact_every=3)
+    state = State()
+    snapshots = []
+
+    def write_snapshot(captured):
+        snapshots.append(captured)
+        journal.reset()
+
+    flusher = StateFlusher(journal, lambda: {'predictions': dict(state.predictions)}, write_snapshot, interval=0)
+    for game in range(1, 6):
+        state.predictions[game] = {'status': 'pending'}
+        flusher.append(OP_PUT, 'predictions', key=game, value=state.predictions[game])
+
+    # 3 mutations journalisées, la 4e déclenche le snapshot (qui l'inclut), la 5e repart dans le journal vidé
+    assert snapshots == [{'predictions': {g: {'status': 'pending'} for g in range(1, 5)}}]
+    lines = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert lines == [{'op': OP_PUT, 'field': 'predictions', 'key': 5, 'value': {'status': 'pending'}}]
+
+    restored = State()
+    restored.predictions = dict(snapshots[-1]['predictions'])
+    journal.replay(restored)
+    assert restored.predictions == state.predictions
+
+
+class RecordingBackend:
+    def __init__(self):
+        self.batches = []
+
+    def should_compact(self):
+        return False
+
+    def append_many(self, records):
+        self.batches.append(records)
+
+
+def test_flusher_coalesces_pending_writes():
+    backend = RecordingBackend()
+    flusher = StateFlusher(backend, dict, lambda state: None, interval=3600)
+    try:
+        flusher.append(OP_SET, 'consecutive_fails', value=1)
+        flusher.append(OP_PUT, 'predictions', key=7, value={'status': 'pending'})
+        flusher.append(OP_SET, 'consecutive_fails', value=2)
+        flusher.append(OP_PUT, 'predictions', key=7, value={'status': 'won'})
+        assert flusher.dirty_fields == {'consecutive_fails', 'predictions'}
+        flusher.flush()
+    finally:
+        flusher.close()
+
+    assert backend.batches == [[
+        {'op': OP_SET, 'field': 'consecutive_fails', 'key': None, 'value': 2},
+        {'op': OP_PUT, 'field': 'predictions', 'key': 7, 'value': {'status': 'won'}},
+    ]]
@@ -0,0 +1,100 @@
+# tests/test_telegram_client.py
+
+import threading
+from concurrent.futures import Future
+
+from send_scheduler import SendScheduler
+from telegram_client import EditCoalescer, TelegramClient
+
+
+def edit(text, chat_id=-1, message_id=7):
+    return {'chat_id': chat_id, 'message_id': message_id, 'text': text, 'parse_mode': 'Markdown'}
+
+
+class FakeApi:
+    """Remplace TelegramClient._post : enregistre les textes envoyés ; le premier appel attend `release`."""
+
+    def __init__(self, first_retry_after=None):
+        self.texts = []
+        self.first_retry_after = first_retry_after
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, method, payload):
+        self.texts.append(payload['text'])
+        if len(self.texts) == 1:
+            self.entered.set()
+            self.release.wait(2)
+            if self.first_retry_after is not None:
+                return None, self.first_retry_after
+        if method == 'sendMessage':
+            return {'message_id': 100 + len(self.texts)}, None
+        return True, None
+
+
+def make_client(api):
+    client = TelegramClient('http://telegram.invalid/botTEST', workers=1,
+                            scheduler=SendScheduler(chat_rate=1000, group_rate_per_min=60000, global_rate=1000, burst=10))
+    client._post = api
+    return client
+
+
+def test_429_requeue_keeps_newer_edit():
+    api = FakeApi(first_retry_after=0.05)
+    client = make_client(api)
+    try:
+        old = client.submit('editMessageText', edit('ancien'))
+        assert api.entered.wait(2)
+        # Édition plus récente du même message pendant l'envoi qui va recevoir un 429
+        new = client.submit('editMessageText', edit('nouveau'))
+        api.release.set()
+        assert new.result(2) is True
+        assert old.result(2) is True
+    finally:
+        client.close()
+    # L'ancien texte ne repart pas après le nouveau
+    assert api.texts == ['ancien', 'nouveau']
+
+
+def test_queued_edits_are_merged_and_repeats_skipped():
+    api = FakeApi()
+    client = make_client(api)
+    try:
+        # Le worker est occupé par un autre chat : les deux éditions attendent en file
+        busy = client.submit('sendMessage', {'chat_id': -2, 'text': 'occupé'})
+        assert api.entered.wait(2)
+        first = client.submit('editMessageText', edit('v1'))
+        second = client.submit('editMessageText', edit('v2'))
+        api.release.set()
+        assert busy.result(2) == {'message_id': 101}
+        assert first.result(2) is True and second.result(2) is True
+        # Contenu déjà affiché : résolu sans appel
+        assert client.submit('editMessageText', edit('v2')).result(2) is True
+    finally:
+        client.close()
+    assert api.texts == ['occupé', 'v2']
+
+
+def test_coalescer_requeue():
+    coalescer = EditCoalescer()
+    key = (-1, 7)
+    reported, reported_future = ['editMessageText', edit('ancien'), [], 1], Future()
+    reported[2].append(reported_future)
+    # Rien de plus récent en file : l'édition reportée y retourne
+    assert coalescer.requeue(key, reported)
+    assert coalescer.merge(key, edit('fusion'), Future())
+    coalescer.taken(key, reported)
+
+    newer = ['editMessageText', edit('nouveau'), [Future()], 0]
+    coalescer.queued(key, newer)
+    stale = ['editMessageText', edit('ancien'), [reported_future], 1]
+    assert not coalescer.requeue(key, stale)
+    assert stale[2] == [] and reported_future in newer[2]
+
+
+def test_coalescer_delivered_cache_is_bounded():
+    coalescer = EditCoalescer(capacity=2)
+    for message_id in (1, 2, 3):
+        coalescer.delivered((-1, message_id), edit('x', message_id=message_id))
+    assert not coalescer.is_noop((-1, 1), edit('x', message_id=1))
+    assert coalescer.is_noop((-1, 3), edit('x', message_id=3))
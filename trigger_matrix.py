@@ -0,0 +1,121 @@
+# trigger_matrix.py
+
+"""
+Statistiques déclencheur (carte N-2) x enseigne résultat (N) calculées en bloc.
+
+Les entrées de collecte sont encodées en deux tableaux d'entiers (id de
+carte 0..51, enseigne 0..3) ; la matrice de contingence 52 x 4 est obtenue en
+un seul `bincount`, et le Top-K par enseigne, les taux et la confiance
+(borne basse de Wilson) en opérations sur tableaux.
+
+NumPy est optionnel : sans lui, le même calcul est fait avec des listes
+Python (même résultat, plus lent sur de gros historiques).
+"""
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from cards import CARD_COUNT, SUITS
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    np = None
+
+SUIT_COUNT = len(SUITS)
+# z de la borne de Wilson (intervalle à 95 %)
+WILSON_Z = 1.96
+
+
+def wilson_lower_bound(successes: float, total: float, z: float = WILSON_Z) -> float:
+    """Borne basse de l'intervalle de Wilson : taux prudent pour les petits effectifs."""
+    if total <= 0: return 0.0
+    p = successes / total
+    z2 = z * z
+    centre = p + z2 / (2 * total)
+    margin = z * math.sqrt(p * (1 - p) / total + z2 / (4 * total * total))
+    return max(0.0, (centre - margin) / (1 + z2 / total))
+
+
+class TriggerSuitMatrix:
+    """Matrice de contingence [déclencheur][enseigne] et statistiques dérivées."""
+
+    def __init__(self, counts):
+        # ndarray (52, 4) avec NumPy, sinon liste de 52 listes de 4 nombres
+        self.counts = counts
+
+    # --- Construction ---
+    @classmethod
+    def from_arrays(cls, triggers: Sequence[int], suits: Sequence[int],
+                    weights: Optional[Sequence[float]] = None) -> 'TriggerSuitMatrix':
+        """Matrice à partir de tableaux parallèles (ids de carte, enseignes, poids optionnels)."""
+        if np is not None:
+            cells = np.asarray(triggers, dtype=np.intp) * SUIT_COUNT + np.asarray(suits, dtype=np.intp)
+            flat = np.bincount(cells, weights=None if weights is None else np.asarray(weights, dtype=float),
+                               minlength=CARD_COUNT * SUIT_COUNT)
+            return cls(flat.reshape(CARD_COUNT, SUIT_COUNT))
+
+        counts = [[0] * SUIT_COUNT for _ in range(CARD_COUNT)]
+        if weights is None:
+            for trigger, suit in zip(triggers, suits):
+                counts[trigger][suit] += 1
+        else:
+            for trigger, suit, weight in zip(triggers, suits, weights):
+                counts[trigger][suit] += weight
+        return cls(counts)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict]) -> 'TriggerSuitMatrix':
+        """Matrice à partir d'entrées de collecte encodées ('declencheur', 'result_suit')."""
+        triggers, suits = [], []
+        for entry in entries:
+            triggers.append(entry['declencheur'])
+            suits.append(entry['result_suit'])
+        return cls.from_arrays(triggers, suits)
+
+    # --- Lectures ---
+    @property
+    def total(self) -> float:
+        if np is not None: return float(self.counts.sum())
+        return sum(sum(row) for row in self.counts)
+
+    def trigger_totals(self) -> List[float]:
+        """Nombre d'apparitions de chaque déclencheur (toutes enseignes confondues)."""
+        if np is not None: return self.counts.sum(axis=1).tolist()
+        return [sum(row) for row in self.counts]
+
+    def top(self, result_suit: int, k: Optional[int] = 2) -> List[Tuple[int, float]]:
+        """
+        Les `k` déclencheurs les plus fréquents pour cette enseigne (tous si k est None),
+        par effectif décroissant puis id de carte croissant ; effectifs nuls exclus.
+        """
+        if np is not None:
+            column = self.counts[:, result_suit]
+            order = np.argsort(-column, kind='stable')
+            order = order[column[order] > 0][:k]
+            return [(int(t), column[t].item()) for t in order]
+
+        ranked = sorted(((t, row[result_suit]) for t, row in enumerate(self.counts) if row[result_suit] > 0),
+                        key=lambda item: -item[1])
+        return ranked[:k] if k is not None else ranked
+
+    def summary(self, result_suit: int, k: Optional[int] = 2) -> List[Dict]:
+        """
+        Top-K avec taux (part des apparitions du déclencheur suivies de cette enseigne)
+        et confiance (borne basse de Wilson de ce taux).
+        """
+        top = self.top(result_suit, k)
+        if not top: return []
+        totals = self.trigger_totals()
+
+        if np is not None:
+            ids = np.array([t for t, _ in top], dtype=np.intp)
+            hits = np.array([c for _, c in top], dtype=float)
+            n = np.asarray(totals, dtype=float)[ids]
+            p = hits / n
+            z2 = WILSON_Z * WILSON_Z
+            lower = (p + z2 / (2 * n) - WILSON_Z * np.sqrt(p * (1 - p) / n + z2 / (4 * n * n))) / (1 + z2 / n)
+            return [{'trigger': int(t), 'count': c, 'rate': float(r), 'confidence': float(max(0.0, lb))}
+                    for (t, c), r, lb in zip(top, p, lower)]
+
+        return [{'trigger': t, 'count': c, 'rate': c / totals[t],
+                 'confidence': wilson_lower_bound(c, totals[t])} for t, c in top]
@@ -0,0 +1,146 @@
+# update_dedup.py
+
+"""
+Fenêtre de déduplication des updates Telegram par `update_id`.
+
+Quand le traitement est lent, Telegram renvoie la même update : sans garde,
+une commande (/inter activate) ou un clic (inter_reanalyze) est rejoué en
+entier. Les N derniers update_id vus sont gardés dans un anneau (ordre
+d'arrivée) doublé d'un set (test en O(1)). La fenêtre est sauvegardée
+paresseusement (toutes les `save_every` nouvelles updates et à l'arrêt)
+pour survivre à un redémarrage pendant une rafale de renvois.
+
+Une update n'est marquée (`mark`) qu'une fois traitée : si le worker meurt
+en cours de traitement, le renvoi de Telegram est traité à nouveau. Le test
+(`seen`) et la marque se font dans la section critique du predictor.
+
+Avec plusieurs workers (SHARED_STATE), `SQLiteUpdateDedup` garde la fenêtre
+dans la base partagée : un INSERT OR IGNORE sur update_id dit atomiquement
+quel worker voit l'update en premier, sans fichier réécrit par chacun.
+"""
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import deque
+from typing import Deque, Set
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+UPDATE_DEDUP_FILE = 'processed_updates.json'
+# Nombre d'update_id retenus et fréquence de sauvegarde
+UPDATE_DEDUP_WINDOW = int(os.getenv('UPDATE_DEDUP_WINDOW') or 1000)
+UPDATE_DEDUP_SAVE_EVERY = int(os.getenv('UPDATE_DEDUP_SAVE_EVERY') or 20)
+
+
+class UpdateDedup:
+    """Anneau + set des derniers update_id traités, persisté dans un petit fichier JSON."""
+
+    def __init__(self, path: str = UPDATE_DEDUP_FILE, capacity: int = UPDATE_DEDUP_WINDOW,
+                 save_every: int = UPDATE_DEDUP_SAVE_EVERY):
+        self.path = os.path.join(os.getcwd(), path)
+        self.capacity = max(1, capacity)
+        self.save_every = max(1, save_every)
+        self._ring: Deque[int] = deque()
+        self._seen: Set[int] = set()
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self.duplicates = 0
+        self._load()
+        atexit.register(self.save)
+
+    def __len__(self) -> int:
+        return len(self._ring)
+
+    def seen(self, update_id: int) -> bool:
+        """True si l'update a déjà été traitée (doublon à ignorer)."""
+        with self._lock:
+            if update_id in self._seen:
+                self.duplicates += 1
+                return True
+        return False
+
+    def mark(self, update_id: int) -> None:
+        """Enregistre une update traitée."""
+        with self._lock:
+            if update_id in self._seen: return
+            self._ring.append(update_id)
+            self._seen.add(update_id)
+            if len(self._ring) > self.capacity:
+                self._seen.discard(self._ring.popleft())
+            self._unsaved += 1
+            save = self._unsaved >= self.save_every
+        if save:
+            self.save()
+
+    def save(self) -> None:
+        """Écriture atomique de la fenêtre (si elle a changé depuis la dernière sauvegarde)."""
+        with self._lock:
+            if not self._unsaved: return
+            ids = list(self._ring)
+            self._unsaved = 0
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(ids, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Erreur de sauvegarde {os.path.basename(self.path)}: {e}")
+
+    def _load(self) -> None:
+        try:
+            if not os.path.exists(self.path): return
+            with open(self.path, 'r', encoding='utf-8') as f:
+                ids = json.load(f)
+        except Exception as e:
+            logger.error(f"Erreur de chargement {os.path.basename(self.path)}: {e}")
+            return
+        for update_id in ids[-self.capacity:]:
+            if isinstance(update_id, int) and update_id not in self._seen:
+                self._ring.append(update_id)
+                self._seen.add(update_id)
+
+
+class SQLiteUpdateDedup:
+    """Derniers update_id traités, partagés entre processus dans une table SQLite (même interface)."""
+
+    def __init__(self, path: str, capacity: int = UPDATE_DEDUP_WINDOW,
+                 prune_every: int = UPDATE_DEDUP_SAVE_EVERY):
+        self.path = path
+        self.capacity = max(1, capacity)
+        self.prune_every = max(1, prune_every)
+        self._inserted = 0
+        self._lock = threading.Lock()
+        self.duplicates = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS processed_updates (update_id INTEGER PRIMARY KEY)')
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM processed_updates').fetchone()[0]
+
+    def seen(self, update_id: int) -> bool:
+        """True si l'update a déjà été traitée (par n'importe quel worker)."""
+        with self._lock:
+            if self.conn.execute('SELECT 1 FROM processed_updates WHERE update_id = ?', (update_id,)).fetchone():
+                self.duplicates += 1
+                return True
+        return False
+
+    def mark(self, update_id: int) -> None:
+        """Enregistre une update traitée."""
+        with self._lock:
+            if not self.conn.execute('INSERT OR IGNORE INTO processed_updates (update_id) VALUES (?)', (update_id,)).rowcount:
+                return
+            self._inserted += 1
+            if self._inserted % self.prune_every == 0:
+                # update_id croissants : on garde les `capacity` plus récents
+                self.conn.execute('DELETE FROM processed_updates WHERE update_id NOT IN '
+                                  '(SELECT update_id FROM processed_updates ORDER BY update_id DESC LIMIT ?)', (self.capacity,))
+
+    def save(self) -> None:
+        """Chaque update est écrite à sa réception : rien à sauvegarder."""
@@ -0,0 +1,164 @@
+# update_queue.py
+
+"""
+File d'attente des updates Telegram reçues par le webhook.
+
+Le webhook valide l'update, la met en file et répond 200 immédiatement :
+sa latence ne dépend plus du coût du traitement (analyse, écritures,
+appels API). La profondeur de la file et le retard (lag) sont exposés par
+`stats()`.
+
+Avec plusieurs workers, la file est partitionnée : les posts d'un canal
+(source) vont toujours au même worker, choisi par hachage de son chat id,
+ce qui garde l'ordre strict au sein du canal. Les autres updates
+(commandes, boutons, ajouts au groupe) ont leur propre worker : elles ne
+patientent plus derrière le trafic ni les appels Telegram d'un canal, et
+des canaux indépendants sont traités en parallèle. Avec un seul worker,
+tout est traité dans l'ordre d'arrivée.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_MAXSIZE = 10000
+# Partition des updates hors canaux (commandes admin, callbacks) quand il y a plusieurs workers
+CONTROL_PARTITION = 0
+
+_STOP = object()
+_CHANNEL_KEYS = ('channel_post', 'edited_channel_post')
+
+
+def channel_chat_id(update: Dict[str, Any]) -> Optional[int]:
+    """Chat id du canal d'un post (ou de son édition) ; None pour les autres updates."""
+    for key in _CHANNEL_KEYS:
+        post = update.get(key)
+        if isinstance(post, dict):
+            return (post.get('chat') or {}).get('id')
+    return None
+
+
+class UpdateQueue:
+    """Files FIFO bornées, une par worker, chaque worker appelant `handler(update)` dans l'ordre."""
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], None], maxsize: int = DEFAULT_MAXSIZE,
+                 workers: int = 1):
+        self.handler = handler
+        self.workers = max(1, workers)
+        # maxsize borne le total : chaque partition en reçoit une part
+        per_partition = max(1, maxsize // self.workers) if maxsize > 0 else 0
+        self._queues: List['queue.Queue[Tuple[Any, float]]'] = [queue.Queue(maxsize=per_partition) for _ in range(self.workers)]
+        self._lock = threading.Lock()
+        self.received = 0
+        self.processed = 0
+        self.rejected = 0
+        self.errors = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_duration = 0.0
+        self._stopped = False
+        self._threads = [threading.Thread(target=self._run, args=(q,), daemon=True,
+                                          name='update-consumer' if self.workers == 1 else f'update-worker-{i}')
+                         for i, q in enumerate(self._queues)]
+        for thread in self._threads:
+            thread.start()
+        atexit.register(self.close)
+
+    def partition(self, update: Dict[str, Any]) -> int:
+        """Worker d'une update : hachage du chat id pour un canal, partition de contrôle sinon."""
+        if self.workers == 1: return 0
+        chat_id = channel_chat_id(update)
+        if chat_id is None: return CONTROL_PARTITION
+        return 1 + hash(chat_id) % (self.workers - 1)
+
+    def put(self, update: Dict[str, Any], block: bool = False) -> bool:
+        """
+        Met l'update dans la file de son worker ; False si elle est pleine (ou arrêtée).
+        block=True attend une place (ingestion par lots, sans rejet).
+        """
+        if self._stopped: return False
+        try:
+            self._queues[self.partition(update)].put((update, time.monotonic()), block=block)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.received += 1
+        return True
+
+    def join(self) -> None:
+        """Attend que toutes les updates déjà en file aient été traitées."""
+        for q in self._queues:
+            q.join()
+
+    @property
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def oldest_age(self) -> float:
+        """Âge (s) de la plus ancienne update encore en file."""
+        now = time.monotonic()
+        oldest = now
+        for q in self._queues:
+            with q.mutex:
+                head = q.queue[0] if q.queue else None
+            if head is not None and head[0] is not _STOP:
+                oldest = min(oldest, head[1])
+        return now - oldest
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'depth': self.depth,
+                'oldest_age_s': round(self.oldest_age(), 3),
+                'last_lag_s': round(self.last_lag, 3),
+                'max_lag_s': round(self.max_lag, 3),
+                'last_duration_s': round(self.last_duration, 3),
+                'received': self.received,
+                'processed': self.processed,
+                'rejected': self.rejected,
+                'errors': self.errors,
+            }
+        if self.workers > 1:
+            stats['workers'] = self.workers
+            stats['partition_depths'] = [q.qsize() for q in self._queues]
+        return stats
+
+    def close(self, timeout: Optional[float] = 10) -> None:
+        """Traite ce qui reste en file (dans la limite de `timeout`) puis arrête les workers."""
+        if self._stopped: return
+        self._stopped = True
+        for q in self._queues:
+            q.put((_STOP, time.monotonic()))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            if thread is threading.current_thread(): continue
+            thread.join(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def _run(self, q: 'queue.Queue[Tuple[Any, float]]') -> None:
+        while True:
+            update, enqueued_at = q.get()
+            if update is _STOP:
+                q.task_done()
+                break
+            started = time.monotonic()
+            failed = False
+            try:
+                self.handler(update)
+            except Exception as e:
+                failed = True
+                logger.error(f"❌ Erreur de traitement de l'update {update.get('update_id')}: {e}")
+            finished = time.monotonic()
+            with self._lock:
+                self.processed += 1
+                self.errors += failed
+                self.last_lag = started - enqueued_at
+                self.max_lag = max(self.max_lag, self.last_lag)
+                self.last_duration = finished - started
+            q.task_done()